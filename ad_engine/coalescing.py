@@ -0,0 +1,243 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from job_engine.cache import CacheStats
+
+
+class ResultCache:
+    """Exports of recently finished searches, kept for ttl seconds.
+
+    Bounded by both its number of entries and their total size, evicting
+    the least recently used first. An export larger than max_bytes on its
+    own isn't kept.
+    """
+    def __init__(self, max_entries: int = 64, max_bytes: int = 100_000_000, ttl: float = 300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self.size = 0
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        expires, body = entry
+        if expires < time.time():
+            self._delete(key)
+            self.stats.expired += 1
+            self.stats.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return body
+
+    def set(self, key: str, body: bytes):
+        if self.ttl <= 0 or len(body) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._delete(key)
+        self._entries[key] = (time.time() + self.ttl, body)
+        self.size += len(body)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            self._delete(next(iter(self._entries)))
+            self.stats.evictions += 1
+
+    def _delete(self, key: str):
+        _, body = self._entries.pop(key)
+        self.size -= len(body)
+
+
+class SearchFlight:
+    """One run of a search, followed by every identical request that arrives
+    while it runs.
+
+    The search either responds with a message, such as no jobs found, or
+    begins and publishes the chunks of its export. Chunks are kept until
+    the search ends, so a request that joins late still gets the export
+    from its first byte, and so it can be cached. Once the export grows
+    past max_bytes it is neither kept nor cached, and no more requests
+    join. From then on only chunks a follower has yet to send are kept.
+    """
+    def __init__(self, key: str, max_bytes: Optional[int] = None):
+        self.key = key
+        self.max_bytes = max_bytes
+        # Set to the message to respond with, or to None once the export begins
+        self.opened: "asyncio.Future[Optional[Dict[str, Any]]]" = asyncio.get_running_loop().create_future()
+        # Joiners that never wait on opened shouldn't leave its exception unretrieved
+        self.opened.add_done_callback(lambda future: future.cancelled() or future.exception())
+        self.chunks: List[bytes] = []
+        # Chunks no longer kept, chunks[0] is chunk number dropped of the export
+        self.dropped = 0
+        self.size = 0
+        self.buffering = True
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        # Requests waiting for the search to respond or begin
+        self.waiting = 0
+        # Requests following the export, by the number of the next chunk each sends
+        self._sent: Dict[object, int] = {}
+        self.task: Optional[asyncio.Task] = None
+        self._published = asyncio.Event()
+
+    def respond(self, message: Dict[str, Any]):
+        self.opened.set_result(message)
+
+    def begin(self):
+        self.opened.set_result(None)
+
+    @property
+    def followers(self) -> int:
+        return len(self._sent)
+
+    def publish(self, chunk: bytes):
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        if self.buffering and self.max_bytes is not None and self.size > self.max_bytes:
+            self.buffering = False
+        self._trim()
+        self._notify()
+
+    def _trim(self):
+        if self.buffering:
+            return
+        drop = min(self._sent.values(), default=self.dropped + len(self.chunks)) - self.dropped
+        if drop > 0:
+            del self.chunks[:drop]
+            self.dropped += drop
+
+    def finish(self):
+        self.finished = True
+        self._notify()
+
+    def fail(self, error: BaseException):
+        self.error = error
+        if not self.opened.done():
+            self.opened.set_exception(error)
+        self._notify()
+
+    def _notify(self):
+        # Wake everyone waiting and start a new event for the next chunk
+        self._published.set()
+        self._published = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[bytes]:
+        """The export's chunks, from the first, as they're published. When
+        the last follower goes before the export is done, the search is
+        cancelled.
+        """
+        # Counted once iterating starts, a response that is never sent never stops following
+        key = object()
+        self._sent[key] = 0
+        try:
+            if self.dropped:
+                raise RuntimeError("The start of the export is no longer kept")
+            while True:
+                while self._sent[key] < self.dropped + len(self.chunks):
+                    chunk = self.chunks[self._sent[key] - self.dropped]
+                    self._sent[key] += 1
+                    yield chunk
+                    self._trim()
+                if self.error is not None:
+                    raise self.error
+                if self.finished:
+                    return
+                await self._published.wait()
+        finally:
+            del self._sent[key]
+            self._trim()
+            self.abandon()
+
+    async def wait_opened(self) -> Optional[Dict[str, Any]]:
+        """The message the search responded with, or None once its export
+        begins. A request that leaves while waiting is no longer counted.
+        """
+        self.waiting += 1
+        try:
+            return await asyncio.shield(self.opened)
+        finally:
+            self.waiting -= 1
+            if not self.opened.done():
+                self.abandon()
+
+    def abandon(self):
+        """Cancel the search if nobody is waiting for or following it any more.
+        """
+        if not self._sent and not self.waiting and not self.finished and self.error is None and self.task is not None:
+            self.task.cancel()
+
+
+class SearchCoalescer:
+    """Runs identical searches once.
+
+    A request joins the search with the same key if one is running, and
+    the export of a finished search is served from the result cache until
+    it expires. run is given the new flight and returns whether its export
+    can be cached, a search that missed listings shouldn't be.
+    """
+    def __init__(self, cache: ResultCache):
+        self.cache = cache
+        self.flights: Dict[str, SearchFlight] = {}
+        self.started = 0
+        self.joined = 0
+
+    def join(self, key: str, run: Callable[[SearchFlight], Awaitable[bool]]) -> Tuple[SearchFlight, bool]:
+        """The flight for key, and whether it was already running.
+        """
+        flight = self.flights.get(key)
+        # An export too big to keep can't be followed from its start
+        joined = flight is not None and flight.buffering
+        if joined:
+            self.joined += 1
+        else:
+            flight = self.flights[key] = SearchFlight(key, self.cache.max_bytes)
+            flight.task = asyncio.create_task(self._run(flight, run))
+            self.started += 1
+        return flight, joined
+
+    async def _run(self, flight: SearchFlight, run: Callable[[SearchFlight], Awaitable[bool]]):
+        try:
+            cacheable = await run(flight)
+        except asyncio.CancelledError as e:
+            self._land(flight)
+            flight.fail(e)
+            raise
+        except Exception as e:
+            self._land(flight)
+            flight.fail(e)
+        else:
+            self._land(flight)
+            if cacheable and flight.buffering and flight.opened.result() is None:
+                self.cache.set(flight.key, b"".join(flight.chunks))
+            flight.finish()
+
+    def _land(self, flight: SearchFlight):
+        # Later requests start a new search, or are served from the cache
+        if self.flights.get(flight.key) is flight:
+            del self.flights[flight.key]
+
+    async def close(self):
+        tasks = [flight.task for flight in self.flights.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def info(self) -> Dict[str, Any]:
+        requests = self.started + self.joined + self.cache.stats.hits
+        return {
+            "searches_started": self.started,
+            "requests_joined": self.joined,
+            "cache": {**self.cache.stats.as_dict(), "entries": len(self.cache), "bytes": self.cache.size},
+            "in_flight": len(self.flights),
+            # Requests that didn't cost a search of their own
+            "shared_rate": (self.joined + self.cache.stats.hits) / requests if requests else 0.0,
+        }
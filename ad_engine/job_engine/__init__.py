@@ -1,6 +1,31 @@
 from job_engine.adzuna import AdzunaEngine
 from job_engine.indeed import IndeedEngine
 from job_engine.seek import SeekEngine
-from job_engine.engine import CaptchaException
+from job_engine.engine import CaptchaException, PageNotFoundException, RequestFailedException
+from job_engine.cache import DiskCache, ListingCache, MemoryCache
+from job_engine.dedup import ListingIndex
+from job_engine.extraction import Extractor, MissingFieldException, Rule
+from job_engine.listing_store import ListingStore
+from job_engine.metrics import MetricsRegistry, SearchTiming
+from job_engine.parsing import ParseExecutor
+from job_engine.politeness import AIMDPolicy, PolitenessController
+from job_engine.pool import PoolLimits, SessionPool
+from job_engine.records import ColumnBuilder, Record
+from job_engine.progress import SearchProgress
+from job_engine.resilience import CircuitBreaker, CircuitOpenException, FailureReport, RetryPolicy
+from job_engine.scheduler import HostLimits, RequestScheduler
+from job_engine.tasks import QueueWorker
+from job_engine.work_queue import RedisWorkQueue, SQLiteWorkQueue, WorkQueue, open_work_queue
 
-__all__ = ["AdzunaEngine", "IndeedEngine", "SeekEngine", "CaptchaException"]
\ No newline at end of file
+__all__ = [
+    "AdzunaEngine", "IndeedEngine", "SeekEngine",
+    "CaptchaException", "PageNotFoundException", "RequestFailedException",
+    "HostLimits", "RequestScheduler", "AIMDPolicy", "PolitenessController",
+    "WorkQueue", "SQLiteWorkQueue", "RedisWorkQueue", "open_work_queue", "QueueWorker",
+    "PoolLimits", "SessionPool",
+    "ParseExecutor", "Extractor", "Rule", "MissingFieldException",
+    "Record", "ColumnBuilder",
+    "ListingCache", "MemoryCache", "DiskCache",
+    "ListingIndex", "ListingStore", "SearchProgress", "SearchTiming", "MetricsRegistry",
+    "CircuitBreaker", "CircuitOpenException", "FailureReport", "RetryPolicy",
+]
@@ -1,13 +1,53 @@
 import asyncio
-from typing import Dict, List, Union
-from bs4 import BeautifulSoup
+import json
+from typing import TYPE_CHECKING, List, Tuple, Union
 import re
 
 from job_engine.engine import Scraper_Engine
+from job_engine.extraction import Attribute, Extractor, Rule, Strainer, string, text
+from job_engine.partition import Choice, Range
+from job_engine.records import Record
+from job_engine.schema import CATEGORY, DATE, SALARY
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+    from bs4.element import Tag
 
 # incl_all, incl_exact, incl_at_least_one, excl_words, incl_title, salary_lower, salary_higher, employment_hours, contract_type, results_pp
 # https://www.adzuna.com.au/search?adv=1&qwd={incl_all}&qph={incl_exact}&qor={incl_at_least_one}&qxl=excl_words&qtl=in_title&sf=5000&st=140000&cty=permanent&cti=full_time&w=Australia&pp=50&sb=date&sd=down
 
+def _table_row(trow: "Tag") -> Tuple[str, str]:
+    # Some of these are company links
+    return trow.find('th').string.replace(":","").strip(), trow.find('td').get_text().strip()
+
+def _table_rows(table: "Tag") -> List[Tuple[str, str]]:
+    # Only the rows of this table, not of any table inside it
+    return [_table_row(trow) for trow in table.find_all('tr') if trow.find_parent('table') is table]
+
+COUNT_EXTRACTOR = Extractor(
+    {'number_jobs': Rule('div.ui-search-heading span', read=string, required=True)},
+    parse_only=Strainer('div', class_='ui-search-heading'))
+LISTING_EXTRACTOR = Extractor(
+    {'listing_codes': Rule('div.ui-search-results div[data-aid]', read=Attribute('data-aid'), many=True)},
+    parse_only=Strainer('div', class_='ui-search-results'))
+DETAIL_EXTRACTOR = Extractor({
+        'title': Rule('h1', read=string),
+        'description': Rule('section.text-sm', read=text, required=True),
+        # Arbitary column data, from the job's details table, which comes first
+        'table': Rule('table', read=_table_rows, default=()),
+    },
+    parse_only=Strainer(['h1', 'section', 'table']))
+
+NO_RESULTS_RE = re.compile("No results found")
+LISTING_CODE_RE = re.compile(r"\d+")
+
+class AdzunaRecord(Record):
+    # The details table is open ended, these are the rows Adzuna usually shows.
+    # Any other rows go into Other details as a JSON object, so the streamed exports keep them too.
+    __slots__ = ()
+    columns = ('title', 'description', 'Company', 'Location', 'Contract type', 'Hours', 'Salary', 'Category', 'Date posted',
+               'Other details', 'url')
+
 class AdzunaEngine(Scraper_Engine):
     def __init__(self):
         self.api_url = 'https://www.adzuna.com.au/search?'
@@ -15,6 +55,8 @@ class AdzunaEngine(Scraper_Engine):
         self.job_number_per_page = 50
         self.max_number_jobs = 500
         self.page_query_option = "page"
+        self.max_concurrency = 8
+        self.requests_per_second = 10
         self.query_contents = {
             'adv' : 1, # Enables advanced search options
             'qwd' : None, # Incl all
@@ -32,38 +74,53 @@ class AdzunaEngine(Scraper_Engine):
             'sd' : 'down', # Asc or desc order
             'page' : 1
         }
+        # Already the default order, kept here so incremental searches don't depend on it
+        self.newest_first_query = {'sb': 'date', 'sd': 'down'}
+        # Adzuna won't page past max_number_jobs, bigger searches are split on these
+        self.partition_dimensions = [
+            Choice('cty', ['permanent', 'contract']),
+            Choice('cti', ['full_time', 'part_time']),
+            Range('sf', 'st', [0, 40000, 60000, 80000, 100000, 150000, None], step=5000),
+        ]
+        self.columns = list(AdzunaRecord.columns)
+        self.board_name = "Adzuna"
+        self.normalised_fields = {
+            'company': 'Company',
+            'location': 'Location',
+            'salary': 'Salary',
+            'contract_type': 'Contract type',
+            'category': 'Category',
+            'listing_date': 'Date posted',
+        }
+        self.column_types = {'Contract type': CATEGORY, 'Hours': CATEGORY, 'Salary': SALARY, 'Category': CATEGORY, 'Date posted': DATE}
+        self.count_extractor = COUNT_EXTRACTOR
+        self.listing_extractor = LISTING_EXTRACTOR
+        self.detail_extractor = DETAIL_EXTRACTOR
+        self.no_results_pattern = NO_RESULTS_RE
+        self.listing_code_re = LISTING_CODE_RE
         # Make sure we call the post init method
         self.__post_init__()
 
-    def get_number_jobs(self, soup: BeautifulSoup) -> int:
-        return int(float(soup.find("div", class_="ui-search-heading").find("span").string.replace(',','')))
-
-    def check_if_no_results(self, soup) -> bool:
-        if "No results found" in soup.get_text():
-            return True 
-        return False
-    
-    def get_listing_codes(self, soup: BeautifulSoup) -> List[str]:
-        return [int(child.attrs.get('data-aid', None)) for child in soup.find("div", class_="ui-search-results").find_all("div", attrs={"data-aid": re.compile(r"\d+")})]
+    def get_number_jobs(self, soup: "BeautifulSoup") -> int:
+        return int(float(self.count_extractor.extract(soup)['number_jobs'].replace(',','')))
 
-    def get_job_data(self, soup: BeautifulSoup, listing_code: Union[str, int]) -> Dict[str, str]:
-        data_dict = {}
-        data_dict['title'] = soup.find('h1').string
-        try:
-            data_dict['description'] = soup.find('section', class_='text-sm').text
-        except AttributeError as e:
-            print(AttributeError, soup)
-            raise AttributeError
+    def get_listing_codes(self, soup: "BeautifulSoup") -> List[str]:
+        return [int(code) for code in self.listing_extractor.extract(soup)['listing_codes'] if self.listing_code_re.search(code)]
 
-        # Arbitary column data 
-        table = soup.find('table')
-        for trow in table.find_all('tr'):
-            # Some of these are company links
-            data_dict[trow.find('th').string.replace(":","").strip()] = trow.find('td').get_text().strip()
+    def get_job_data(self, soup: "BeautifulSoup", listing_code: Union[str, int]) -> AdzunaRecord:
+        fields = self.detail_extractor.extract(soup)
+        record = AdzunaRecord(title=fields['title'], description=fields['description'])
+        other_details = {}
+        for heading, value in fields['table']:
+            if heading in AdzunaRecord._index:
+                record[heading] = value
+            else:
+                other_details[heading] = value
+        record['Other details'] = json.dumps(other_details) if other_details else None
 
         # Add a URL
-        data_dict['url'] = self.get_listing_uri(listing_code)
-        return data_dict
+        record['url'] = self.get_listing_uri(listing_code)
+        return record
 
 async def __test_main():
     async with AdzunaEngine() as ae:
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expired: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {**asdict(self), "hit_rate": self.hit_rate}
+
+
+class MemoryCache:
+    """Least recently used cache held in process memory.
+    """
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        expires, value = entry
+        if expires < time.time():
+            del self._entries[key]
+            self.stats.expired += 1
+            self.stats.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: float, expires: Optional[float] = None):
+        self._entries[key] = (expires or time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+
+class DiskCache:
+    """SQLite backed cache of JSON serialisable values, evicting the least
+    recently used entries past max_entries.
+
+    Its methods block on the disk. ListingCache calls them on threads, so
+    they share the connection under a lock.
+    """
+    def __init__(self, path: str, max_entries: int = 100000):
+        self.path = path
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires REAL, accessed REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        self._size = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def get_entry(self, key: str) -> Optional[Tuple[float, Any]]:
+        """Return the (expires, value) pair of key, for promotion into a faster tier.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+
+            now = time.time()
+            value, expires = row
+            if expires < now:
+                self._delete(key)
+                self.stats.expired += 1
+                self.stats.misses += 1
+                return None
+
+            self._db.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            self.stats.hits += 1
+        return expires, json.loads(value)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_entry(key)
+        return entry[1] if entry else None
+
+    def set(self, key: str, value: Any, ttl: float, expires: Optional[float] = None):
+        now = time.time()
+        text = json.dumps(value)
+        with self._lock:
+            exists = self._db.execute("SELECT 1 FROM cache WHERE key = ?", (key,)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", (key, text, expires or now + ttl, now))
+            if not exists:
+                self._size += 1
+
+            if self._size > self.max_entries:
+                overflow = self._size - self.max_entries
+                self._db.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)", (overflow,))
+                self._size -= overflow
+                self.stats.evictions += overflow
+
+    def _delete(self, key: str):
+        if self._db.execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount:
+            self._size -= 1
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ListingCache:
+    """Cache of parsed job listings keyed by their url.
+
+    Lookups go to the memory tier first and then to the optional disk
+    tier, promoting disk hits into memory. Writes go to both. On the event
+    loop use lookup and store, which go to the disk tier on a thread.
+    """
+    def __init__(self, memory: Optional[MemoryCache] = None, disk: Optional[DiskCache] = None):
+        self.memory = memory or MemoryCache()
+        self.disk = disk
+        self.stats = CacheStats()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        value = self.memory.get(url)
+        if value is None and self.disk is not None:
+            value = self._promote(url, self.disk.get_entry(url))
+        return self._found(value)
+
+    async def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        value = self.memory.get(url)
+        if value is None and self.disk is not None:
+            value = self._promote(url, await asyncio.to_thread(self.disk.get_entry, url))
+        return self._found(value)
+
+    def _promote(self, url: str, entry: Optional[Tuple[float, Any]]) -> Optional[Any]:
+        if entry is None:
+            return None
+        expires, value = entry
+        self.memory.set(url, value, 0, expires=expires)
+        return value
+
+    def _found(self, value: Optional[Any]) -> Optional[Dict[str, Any]]:
+        if value is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        # Callers are free to modify what they get back
+        return value.copy()
+
+    def set(self, url: str, value: Mapping[str, Any], ttl: float):
+        # Kept as it is in memory, a Record takes less of it than a dict
+        self.memory.set(url, value.copy(), ttl)
+        if self.disk is not None:
+            self.disk.set(url, dict(value), ttl)
+
+    async def store(self, url: str, value: Mapping[str, Any], ttl: float):
+        self.memory.set(url, value.copy(), ttl)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, url, dict(value), ttl)
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+    def info(self) -> Dict[str, Dict[str, float]]:
+        info = {"total": self.stats.as_dict(),
+                "memory": {**self.memory.stats.as_dict(), "entries": len(self.memory)}}
+        if self.disk is not None:
+            info["disk"] = {**self.disk.stats.as_dict(), "entries": len(self.disk)}
+        return info
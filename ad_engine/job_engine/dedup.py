@@ -0,0 +1,36 @@
+from typing import Hashable, Iterable, List, Set
+
+
+class ListingIndex:
+    """The listing codes already fetched or in flight during one search.
+
+    Listing pages can overlap, either because a board shuffles results
+    between page loads or because several queries cover the same jobs, so
+    every code goes through claim before its detail page is requested.
+    """
+    def __init__(self):
+        self._claimed: Set[Hashable] = set()
+        self.duplicates = 0
+
+    def __len__(self) -> int:
+        return len(self._claimed)
+
+    def __contains__(self, listing_code: Hashable) -> bool:
+        return listing_code in self._claimed
+
+    def claim(self, listing_code: Hashable) -> bool:
+        """Return True if the listing code is new to this search.
+        """
+        if listing_code in self._claimed:
+            self.duplicates += 1
+            return False
+        self._claimed.add(listing_code)
+        return True
+
+    def claim_all(self, listing_codes: Iterable[Hashable]) -> List[Hashable]:
+        """Return the listing codes that are new to this search, in order.
+        """
+        return [listing_code for listing_code in listing_codes if self.claim(listing_code)]
+
+    def stats(self):
+        return {"listings": len(self._claimed), "duplicates_dropped": self.duplicates}
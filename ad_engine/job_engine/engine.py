@@ -1,31 +1,102 @@
 import asyncio
+import copy
+import time
+import uuid
 import aiohttp
-from dataclasses import dataclass
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, replace
 from math import ceil
-from typing import Callable, Dict, Optional, List, Union
-from bs4 import BeautifulSoup
-import pandas as pd
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Optional, List, Pattern, Tuple, Type, TypeVar, Union
+from urllib.parse import urlencode
 
 from aiohttp import ClientSession
 
+from job_engine.cache import ListingCache
+from job_engine.dedup import ListingIndex
+from job_engine.extraction import Extractor
+from job_engine.listing_store import ListingStore
+from job_engine.metrics import CAPTCHAS, DROPPED_LISTINGS, FETCH_SECONDS, PARSE_SECONDS, REQUEST_ERRORS, REQUESTS_IN_FLIGHT, \
+    RESPONSE_BYTES, RESPONSES, SearchTiming
+from job_engine.parsing import ParseExecutor, parse_document
+from job_engine.partition import Dimension, Partition, plan_partitions
+from job_engine.politeness import PolitenessController
+from job_engine.pool import SessionPool
+from job_engine.progress import SearchProgress
+from job_engine.records import ColumnBuilder, Record
+from job_engine.schema import CATEGORY, DATE, SALARY, ColumnTypes
+from job_engine.resilience import CircuitBreaker, FailureReport, RetryPolicy
+from job_engine.scheduler import HostLimits, RequestScheduler, PRIORITY_DETAIL, PRIORITY_LISTING, host_of
+from job_engine.work_queue import DETAIL_TASK, LISTING_TASK, WorkQueue
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from bs4 import BeautifulSoup
+
+# The columns of a record once normalise_record has mapped it away from its board
+NORMALISED_COLUMNS = ['board', 'title', 'company', 'location', 'salary', 'contract_type', 'category', 'listing_date', 'description', 'url']
+NORMALISED_COLUMN_TYPES = {'board': CATEGORY, 'salary': SALARY, 'contract_type': CATEGORY, 'category': CATEGORY, 'listing_date': DATE}
+
+EngineType = TypeVar("EngineType", bound="Scraper_Engine")
+
+# The engine each board's searches are cloned from, see Scraper_Engine.from_template
+_templates: Dict[type, "Scraper_Engine"] = {}
+
+class NormalisedRecord(Record):
+    __slots__ = ()
+    columns = NORMALISED_COLUMNS
+
 class PageNotFoundException(Exception):
     pass
 
+class RequestFailedException(Exception):
+    pass
+
 # Define an exception for a captcha appearing
 class CaptchaException(Exception):
     pass
 
+# Boards now and then serve their error page with a 200
+ERROR_PAGE_TEXT = "Internal server error"
+
 @dataclass
 class Scraper_Engine:
     """Prototype class of the scraper engine which should be extended
     to individual sites.
 
     Prototype methods:
-        verify_page_contents: Checks with exceptions if there are failures
+        verify_page_contents: Checks with exceptions if there are failures, given the status code and soup
         check_if_no_jobs: Checks if there are no jobs on the page and returns true if so
         get_job_data: Get the job contents
         get_listing_codes: Take a soup and return the listing codes
 
+    Pages are read with the count, listing and detail extractors when an
+    engine declares them, which also limits how much of each page is
+    parsed. captcha_pattern and no_results_pattern are searched for in the
+    raw page text, before anything is parsed.
+
+    Engines can declare partition_dimensions, the query fields a search
+    too large for max_number_jobs can be split on, see plan_partitions.
+
+    Fetches and parses are counted in the metrics of job_engine.metrics,
+    labelled with the board and the stage (count, listing or detail) of
+    the page, and timed by phase in self.timing.
+
+    A search can also be run by workers in other processes, see
+    iter_queued_data. Workers rebuild the engine from its task_spec, and
+    whatever a listing page leaves on the engine for a listing's detail
+    page travels with the task, see detach_listing and attach_listing.
+
+    Engines also declare the columns of the records get_job_data returns,
+    which is the header of a streamed export, and normalised_fields, which
+    maps the NORMALISED_COLUMNS onto those columns. column_types gives
+    the type of the columns that aren't strings in the typed exports, see
+    job_engine.schema.
+
+    With a politeness controller attached, which should share the
+    engine's scheduler, the limits of the board's hosts follow how the
+    board copes rather than staying at max_concurrency and
+    requests_per_second, see job_engine.politeness.
+
     """
     api_url: str
     listing_url_template: str
@@ -35,9 +106,45 @@ class Scraper_Engine:
     max_number_jobs: int = 500
     headers: Optional[str] = None
     client_session: Optional[ClientSession] = None
+    session_pool: Optional[SessionPool] = None
     modify_query_for_page: Optional[Callable] = None
     verify_page_contents: Optional[Callable] = None
     check_if_no_results: Optional[Callable] = None
+    columns: Optional[List[str]] = None
+    max_concurrency: int = 10
+    requests_per_second: Optional[float] = None
+    scheduler: Optional[RequestScheduler] = None
+    parse_executor: Optional[ParseExecutor] = None
+    parser_backend: str = "html.parser"
+    cache: Optional[ListingCache] = None
+    cache_ttl: float = 24 * 60 * 60
+    listing_index: Optional[ListingIndex] = None
+    request_timeout: float = 30
+    retry_policy: Optional[RetryPolicy] = None
+    circuit_breaker: Optional[CircuitBreaker] = None
+    politeness: Optional[PolitenessController] = None
+    failures: Optional[FailureReport] = None
+    progress: Optional[SearchProgress] = None
+    concurrency_budget: Optional[asyncio.Semaphore] = None
+    board_name: Optional[str] = None
+    normalised_fields: Optional[Dict[str, str]] = None
+    column_types: Optional[ColumnTypes] = None
+    newest_first_query: Optional[Dict[str, str]] = None
+    partition_dimensions: Optional[List[Dimension]] = None
+    partitions: Optional[List[Partition]] = None
+    count_extractor: Optional[Extractor] = None
+    listing_extractor: Optional[Extractor] = None
+    detail_extractor: Optional[Extractor] = None
+    captcha_pattern: Optional[Pattern] = None
+    no_results_pattern: Optional[Pattern] = None
+    timing: Optional[SearchTiming] = None
+
+    # Attributes that can't leave the event loop's process
+    _runtime_attributes = ("client_session", "session_pool", "scheduler", "parse_executor", "cache", "listing_index", "circuit_breaker", "politeness", "failures", "progress", "concurrency_budget", "timing")
+    # Attributes a search changes as it runs, which every clone gets its own copy of
+    _per_search_attributes = ("query_contents", "partitions")
+    # What the board's constructor is called with to make its template
+    _template_args: Tuple = ()
 
     def __post_init__(self):
         """Called after the dataclass init method.
@@ -46,90 +153,642 @@ class Scraper_Engine:
             self.headers = {"User-Agent":"Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.97 Safari/537.36"}
         # Using int will truncate the result, so we will alwasy round down.
         self._max_pages = int(self.max_number_jobs/self.job_number_per_page)
+        if not self.retry_policy:
+            self.retry_policy = RetryPolicy()
 
         assert self.get_listing_codes, "You need to define the implementation of self.get_listing_codes"
         assert self.get_job_data, "You need to define the implementation of self.get_job_data"
 
+    @classmethod
+    def from_template(cls: Type[EngineType], **attributes) -> EngineType:
+        """A new engine for a search, cloned from one made the first time
+        the board was searched, with attributes set on it.
+        """
+        template = _templates.get(cls)
+        if template is None:
+            template = _templates[cls] = cls(*cls._template_args)
+        return template.clone(**attributes)
+
+    def clone(self: EngineType, **attributes) -> EngineType:
+        """A copy of this engine for another search, with attributes set on it.
+
+        The board's configuration, extractors and patterns are shared
+        rather than built again. Runtime attributes start over from their
+        defaults, and the per search ones are copied so the searches don't
+        change each other's.
+        """
+        # Straight into the instance dict, copy.copy would go through __getstate__
+        engine = object.__new__(type(self))
+        state = engine.__dict__
+        state.update(self.__dict__)
+        fields = self.__dataclass_fields__
+        for attribute in self._runtime_attributes:
+            if attribute in fields:
+                # Back to the class's default
+                state.pop(attribute, None)
+        for attribute in self._per_search_attributes:
+            if attribute in state:
+                state[attribute] = copy.copy(state[attribute])
+        state.update(attributes)
+        return engine
+
     async def __aenter__(self):
-        if not self.client_session:
-            self.client_session = aiohttp.ClientSession(headers=self.headers)
+        # With a session pool the engine borrows its connections, otherwise it opens its own for the search
+        if not self.client_session and not self.session_pool:
+            self.client_session = aiohttp.ClientSession(headers=self.headers, timeout=aiohttp.ClientTimeout(total=self.request_timeout))
+        if not self.scheduler:
+            self.scheduler = RequestScheduler()
+        if not self.circuit_breaker:
+            self.circuit_breaker = CircuitBreaker()
+        if not self.timing:
+            self.timing = SearchTiming()
+        # A shared scheduler keeps any limits that were already tuned for these hosts
+        limits = HostLimits(max_concurrency=self.max_concurrency, requests_per_second=self.requests_per_second)
+        for host in self.hosts():
+            if self.politeness:
+                # The controller sets the limits from here on, the pool holds as many connections as they can grow to
+                max_connections = self.politeness.track(host, limits).max_concurrency
+            else:
+                self.scheduler.configure(host, limits, overwrite=False)
+                max_connections = self.max_concurrency
+            if self.session_pool:
+                # No point holding more connections than the scheduler lets us use
+                self.session_pool.configure(
+                    host, replace(self.session_pool.default_limits, max_connections=max_connections), overwrite=False)
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         if self.client_session:
             await self.client_session.close()
 
-    def get_query_uri(self, query_contents: List[str]) -> str:
-        """If a query contents is not none, 
-        then we add it to the search.
+    def hosts(self) -> List[str]:
+        """The hosts the board's search and listing pages are served from.
         """
-        uri = self.api_url
-        for query_tuple in query_contents.items():
-            if query_tuple[1] is not None:
-                uri += f"{query_tuple[0]}={query_tuple[1]}&"
-        return uri
-    
+        return list(dict.fromkeys(host_of(url) for url in (self.api_url, self.listing_url_template)))
+
+    def query_base_uri(self, encode: bool = True) -> str:
+        """The board's search uri, which the query string is added to.
+        """
+        return self.api_url
+
+    def get_query_uri(self, query_contents: Dict[str, Any]) -> str:
+        """The search uri for query_contents, leaving out the options that
+        are None. The values are URL encoded, so search terms with spaces,
+        ampersands and the like stay in their own option.
+        """
+        return self.query_base_uri() + urlencode({option: value for option, value in query_contents.items() if value is not None})
+
+    def search_key(self) -> str:
+        """Identifies a search across runs, for the listing store. It keeps
+        the unencoded form uris had before get_query_uri encoded them, so
+        earlier runs are still found.
+        """
+        query = "".join(f"{option}={value}&" for option, value in self.query_contents.items() if value is not None)
+        return f"{self.board_name}:{self.query_base_uri(encode=False)}{query}"
+
+    def sort_newest_first(self):
+        """Ask the board for its newest listings first, which incremental searches rely on.
+        """
+        if self.newest_first_query:
+            self.query_contents.update(self.newest_first_query)
+
     def get_listing_uri(self, listing_code) -> str:
         return self.listing_url_template.format(listing_code=listing_code)
 
-    async def get_number_of_pages(self) -> int:
-        response = await self.client_session.get(self.get_query_uri(self.query_contents))
-        assert response.status == 200, "Request response code is not 200."
-        soup = BeautifulSoup(await response.text(), 'html.parser')
+    @asynccontextmanager
+    async def request_slot(self, url: str, priority: int = PRIORITY_DETAIL):
+        """Hold a scheduler slot for url, and a place in the concurrency
+        budget when this engine shares one with others.
 
-        if response.status == 404:
-            raise PageNotFoundException("Can't load the listings page, check the API url")
+        The budget is taken once the host's slot is, so a request waiting
+        on a slow or rate limited board doesn't hold a place another board
+        could use.
+        """
+        if self.concurrency_budget is None:
+            async with self.scheduler.slot(url, priority):
+                yield
+        else:
+            async with self.scheduler.slot(url, priority), self.concurrency_budget:
+                yield
+
+    async def fetch(self, url: str, priority: int = PRIORITY_DETAIL, stage: str = "detail", check_error_page: bool = False):
+        """GET a url through the scheduler, returning the response and its text.
+        The slot is held until the body has been read. stage labels the
+        request in the metrics and timing. With check_error_page, an error
+        page served with a 200 is told to the politeness controller as an
+        error rather than a response.
+
+        Timeouts, connection errors and the retry policy's status codes are
+        retried with backoff outside of the slot. Once out of attempts the
+        last error is raised, or the last response returned.
+        """
+        for attempt in range(self.retry_policy.attempts):
+            last_attempt = attempt + 1 == self.retry_policy.attempts
+            delay = None
+            trial = False
+            try:
+                async with self.request_slot(url, priority):
+                    # Checked in the slot, the circuit may have opened while we were queued
+                    trial = self.circuit_breaker.check()
+                    start = time.perf_counter()
+                    with REQUESTS_IN_FLIGHT.track(board=self.board_name):
+                        if self.client_session:
+                            response = await self.client_session.get(url)
+                        else:
+                            response = await self.session_pool.get(url, self.headers, self.request_timeout)
+                        # read keeps the body, so text doesn't read it again
+                        body = await response.read()
+                        text = await response.text()
+                    elapsed = time.perf_counter() - start
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                REQUEST_ERRORS.inc(board=self.board_name, error=type(e).__name__)
+                self.circuit_breaker.record_failure()
+                if self.politeness:
+                    self.politeness.record_error(host_of(url))
+                if last_attempt:
+                    raise
+            else:
+                FETCH_SECONDS.observe(elapsed, board=self.board_name, stage=stage)
+                RESPONSE_BYTES.observe(len(body), board=self.board_name, stage=stage)
+                RESPONSES.inc(board=self.board_name, status=response.status)
+                self.timing.add(f"{stage}_fetch", elapsed)
+                if self.politeness:
+                    if check_error_page and response.status == 200 and ERROR_PAGE_TEXT in text:
+                        self.politeness.record_error(host_of(url))
+                    else:
+                        self.politeness.record_response(host_of(url), response.status, elapsed)
+                if response.status not in self.retry_policy.retry_statuses:
+                    # A captcha comes with a 200, it's counted once the page is parsed rather than as a success
+                    if not self.is_captcha(text):
+                        self.circuit_breaker.record_success()
+                    return response, text
+
+                self.circuit_breaker.record_failure()
+                if last_attempt:
+                    return response, text
+                delay = self.retry_policy.retry_after(response.headers)
+            finally:
+                if trial:
+                    # Cancelled or broken before the trial's outcome was recorded, otherwise this is a no-op.
+                    # Left in flight, the circuit would refuse every request from now on.
+                    self.circuit_breaker.end_trial()
+
+            await asyncio.sleep(delay if delay is not None else self.retry_policy.backoff(attempt))
+
+    def is_captcha(self, text: str) -> bool:
+        return bool(self.captcha_pattern and self.captcha_pattern.search(text))
+
+    def check_raw_text(self, text: str):
+        if self.is_captcha(text):
+            self.record_captcha()
+            raise CaptchaException("Captcha present on page.")
+
+    def record_captcha(self):
+        CAPTCHAS.inc(board=self.board_name)
+        if self.politeness:
+            # The board as a whole is onto us, not just the host that served the page. Slowing
+            # down comes first, the circuit only opens once that hasn't helped
+            slowed_down = [self.politeness.record_captcha(host) for host in self.hosts()]
+            if any(slowed_down):
+                return
+        self.circuit_breaker.record_captcha()
+
+    async def parse(self, parse_func: Callable, text: str, *args, extractor: Optional[Extractor] = None, stage: str = "detail"):
+        """Run parse_func over the soup of text, on the parse executor if one is attached.
+        Only the parts of the page extractor reads are parsed.
+        """
+        self.check_raw_text(text)
+        parse_only = extractor.parse_only if extractor else None
+        start = time.perf_counter()
+        try:
+            if self.parse_executor:
+                return await self.parse_executor.run(parse_func, text, self.parser_backend, *args, parse_only=parse_only)
+            return parse_document(parse_func, text, self.parser_backend, *args, parse_only=parse_only)
+        except CaptchaException:
+            self.record_captcha()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            PARSE_SECONDS.observe(elapsed, board=self.board_name, stage=stage)
+            self.timing.add(f"{stage}_parse", elapsed)
 
+    # Attributes a worker needs to run this engine's pages, on top of the board's template
+    _task_attributes = ("api_url", "listing_url_template", "query_contents")
+
+    def task_spec(self) -> Dict[str, Any]:
+        """What a queue worker needs to build this engine from the board's
+        template, as JSON.
+        """
+        return {"engine": type(self).__name__,
+                "attributes": {attribute: getattr(self, attribute) for attribute in self._task_attributes}}
+
+    def detach_listing(self, listing_code) -> Optional[Dict[str, Any]]:
+        """Hand over what store_listing_page kept for a listing's detail page,
+        so another worker can fetch it.
+        """
+        return None
+
+    def attach_listing(self, listing_code, listing: Dict[str, Any]):
+        pass
+
+    def __getstate__(self):
+        # Engines are pickled when parsing on a process pool, so leave out anything bound to the event loop
+        state = self.__dict__.copy()
+        for attribute in self._runtime_attributes:
+            state.pop(attribute, None)
+        return state
+
+    def _parse_number_jobs(self, soup: "BeautifulSoup", status: int) -> int:
         if self.verify_page_contents: 
-            self.verify_page_contents(response, soup)
+            self.verify_page_contents(status, soup)
 
         if self.check_if_no_results: 
             if self.check_if_no_results(soup):
                 return 0
 
-        n_pages = ceil(self.get_number_jobs(soup) / self.job_number_per_page)
+        return self.get_number_jobs(soup)
+
+    async def count_jobs(self, query_contents: Optional[Dict[str, str]] = None) -> int:
+        """Number of jobs the board reports for a query, by default the engine's own.
+        """
+        response, text = await self.fetch(self.get_query_uri(query_contents or self.query_contents), PRIORITY_LISTING, "count")
+
+        if response.status == 404:
+            raise PageNotFoundException("Can't load the listings page, check the API url")
+        if response.status != 200:
+            raise RequestFailedException(f"Listings page request failed with status {response.status}")
+
+        # A captcha page could well say there's nothing to show
+        self.check_raw_text(text)
+        if self.no_results_pattern and self.no_results_pattern.search(text):
+            return 0
+
+        return await self.parse(self._parse_number_jobs, text, response.status, extractor=self.count_extractor, stage="count")
+
+    def pages_for(self, n_jobs: int) -> int:
+        n_pages = ceil(n_jobs / self.job_number_per_page)
 
         if n_pages > self._max_pages:
             return self._max_pages
-        
+
         return n_pages
+
+    async def get_number_of_pages(self) -> int:
+        return self.pages_for(await self.count_jobs())
+
+    async def plan_partitions(self) -> int:
+        """Split a search the board can't page all the way through into
+        sub-queries that each fit under max_number_jobs, using
+        partition_dimensions. iter_data then pages through every partition.
+
+        Returns the number of pages across the partitions, in place of
+        get_number_of_pages.
+        """
+        n_jobs = await self.count_jobs()
+        with self.timing.phase("plan"):
+            self.partitions = await plan_partitions(
+                self.count_jobs, self.query_contents, n_jobs, self.partition_dimensions or [], self.max_number_jobs)
+        return sum(self.pages_for(partition.n_jobs) for partition in self.partitions)
+
+    def listing_pages(self, number_pages: int):
+        """Yield (query, page_n, target) for the first number_pages listing
+        pages, across the partitions if the search has been partitioned.
+        target names the page in the failure report.
+        """
+        if not self.partitions:
+            for page_n in range(1, number_pages+1):
+                yield self.query_contents, page_n, page_n
+            return
+
+        for partition in self.partitions:
+            for page_n in range(1, self.pages_for(partition.n_jobs)+1):
+                if number_pages <= 0:
+                    return
+                number_pages -= 1
+                yield partition.query, page_n, f"{partition.label()} page {page_n}"
     
     def modify_query_for_page(self, query_contents, page_number, query_option):
         query_contents[query_option] = page_number 
         return query_contents
 
-    async def process_listing_page(self, page_n: Union[str, int], query_option: str) -> List[str]:
+    def read_listing_page(self, soup: "BeautifulSoup", status: int):
+        """Parse a listing page. This may run on the parse executor,
+        so it should not modify the engine.
+        """
+        if self.verify_page_contents: 
+            self.verify_page_contents(status, soup)
+
+        return self.get_listing_codes(soup)
+
+    def store_listing_page(self, page_data) -> List[str]:
+        """Take the result of read_listing_page back on the event loop
+        and return the listing codes.
+        """
+        return page_data
+
+    async def process_listing_page(self, page_n: Union[str, int], query_option: str,
+                                   query_contents: Optional[Dict[str, str]] = None) -> List[str]:
         """Process a single job listing page and return 
         a list of job listing codes (listing_code).
         """
-        modified_query = self.query_contents.copy()
+        modified_query = (query_contents or self.query_contents).copy()
         modified_query = self.modify_query_for_page(modified_query, page_n, query_option)
 
-        response = await self.client_session.get(self.get_query_uri(modified_query))
-        soup = BeautifulSoup(await response.text(), "html.parser")
+        response, text = await self.fetch(self.get_query_uri(modified_query), PRIORITY_LISTING, "listing")
+        if response.status != 200:
+            raise RequestFailedException(f"Listings page {page_n} request failed with status {response.status}")
+
+        return self.store_listing_page(await self.parse(self.read_listing_page, text, response.status, extractor=self.listing_extractor, stage="listing"))
 
+    def read_job_listing(self, soup: "BeautifulSoup", status: int, listing_code: str) -> Optional[Dict[str, str]]:
+        """Parse a job listing page. Like read_listing_page this may run
+        on the parse executor.
+        """
         if self.verify_page_contents: 
-            self.verify_page_contents(response, soup)
+            self.verify_page_contents(status, soup)
 
-        return self.get_listing_codes(soup)
+        return self.get_job_data(soup, listing_code)
+
+    def store_job_data(self, listing_code: str, job_data: Dict[str, str]) -> Dict[str, str]:
+        """Take the result of get_job_data back on the event loop.
+        """
+        return job_data
 
     async def process_job_listing(self, listing_code: str) -> Dict[str, str]:
-        response = await self.client_session.get(self.get_listing_uri(listing_code))
-        soup = BeautifulSoup(await response.text(), "html.parser")
+        listing_uri = self.get_listing_uri(listing_code)
+        if self.cache and (job_data := await self.cache.lookup(listing_uri)) is not None:
+            return self.store_job_data(listing_code, job_data)
+
+        response, text = await self.fetch(listing_uri, PRIORITY_DETAIL, "detail", check_error_page=True)
+
+        if response.status == 404:
+            raise PageNotFoundException("Job listing no longer exists")
+        if response.status != 200:
+            raise RequestFailedException(f"Job listing request failed with status {response.status}")
 
-        # Non fatal 404 error
-        if response.status == 404 or response.status == 500 or "Internal server error" in soup.get_text():
+        if ERROR_PAGE_TEXT in text:
+            raise RequestFailedException("Internal server error page")
+
+        job_data = await self.parse(self.read_job_listing, text, response.status, listing_code, extractor=self.detail_extractor)
+        if job_data is None:
             return
 
-        if self.verify_page_contents: 
-            self.verify_page_contents(response, soup)
+        if self.cache:
+            await self.cache.store(listing_uri, job_data, self.cache_ttl)
 
-        return self.get_job_data(soup, listing_code)
+        return self.store_job_data(listing_code, job_data)
 
-    async def collate_data(self, number_pages: int) -> pd.DataFrame:
-        job_listings = await asyncio.gather(*[self.process_listing_page(page_n, self.page_query_option) for page_n in range(1, number_pages+1)])
-        
-        listing_codes = [l for page_listings in job_listings for l in page_listings if l]
-        listing_data = await asyncio.gather(*[self.process_job_listing(listing_code) for listing_code in listing_codes])
+    def claim_listings(self, listing_codes: List) -> List:
+        """The listing codes of a listing page that are new to the search.
+        The others are counted as duplicates in the progress and metrics.
+        """
+        duplicates = self.listing_index.duplicates
+        new_codes = self.listing_index.claim_all(l for l in listing_codes if l)
+        dropped = self.listing_index.duplicates - duplicates
+        if dropped:
+            self.progress.duplicates_dropped += dropped
+            DROPPED_LISTINGS.inc(dropped, board=self.board_name, reason="duplicate")
+        return new_codes
+
+    async def iter_data(self, number_pages: int, listing_index: Optional[ListingIndex] = None) -> AsyncIterator[Dict[str, str]]:
+        """Yield each job listing as soon as its detail page has been processed.
+
+        Detail pages are queued as soon as the listing page they are on
+        completes, rather than after every listing page. Each listing code
+        is only fetched once per listing_index, which is kept on the engine
+        so the number of duplicates dropped can be reported afterwards.
+
+        When plan_partitions has run, the listing pages of every partition
+        are fetched and the index drops the listings they share.
+
+        A page that fails doesn't stop the run, it is recorded in
+        self.failures and the remaining listings are still yielded.
+        self.progress is kept up to date while the run goes on.
+        """
+        self.listing_index = listing_index if listing_index is not None else ListingIndex()
+        self.failures = FailureReport()
+        self.progress = SearchProgress(pages_total=number_pages)
+        # Task -> (stage, target) for the failure report
+        tasks = {
+            asyncio.ensure_future(self.process_listing_page(page_n, self.page_query_option, query)): ("listing_page", target)
+            for query, page_n, target in self.listing_pages(number_pages)}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    stage, target = tasks.pop(task)
+                    if stage == "listing_page":
+                        self.progress.pages_done += 1
+                    else:
+                        self.progress.listings_done += 1
+
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        self.failures.add(stage, target, e)
+                        self.progress.errors += 1
+                        if stage == "job_listing":
+                            DROPPED_LISTINGS.inc(board=self.board_name, reason=type(e).__name__)
+                        continue
+
+                    if stage == "listing_page":
+                        for listing_code in self.claim_listings(result):
+                            job_task = asyncio.ensure_future(self.process_job_listing(listing_code))
+                            tasks[job_task] = ("job_listing", listing_code)
+                            pending.add(job_task)
+                            self.progress.listings_total += 1
+                    elif result:
+                        yield result
+                    else:
+                        DROPPED_LISTINGS.inc(board=self.board_name, reason="no_data")
+        finally:
+            # The consumer went away or something failed, don't leave requests running
+            for task in pending:
+                task.cancel()
+
+    async def iter_new_data(self, number_pages: int, listing_store: ListingStore, snapshot: bool = False) -> AsyncIterator[Dict[str, str]]:
+        """Incremental version of iter_data for a search that has run before.
+
+        Listing pages are read in order, newest first, and paging stops at
+        the first page holding only listings this search has returned
+        before. Listings new to this search are yielded, fetched if the
+        store has never seen them and read from the store if another
+        search has. With snapshot, every other listing the search has ever
+        returned is yielded from the store afterwards. The store is read
+        and written off the event loop, once per listing page.
+        """
+        self.sort_newest_first()
+        search_key = self.search_key()
+        self.listing_index = ListingIndex()
+        self.failures = FailureReport()
+        self.progress = SearchProgress(pages_total=number_pages)
+        yielded = set()
+
+        tasks = {}
+        def queue_listing_page(page_n):
+            tasks[asyncio.ensure_future(self.process_listing_page(page_n, self.page_query_option))] = ("listing_page", page_n)
+
+        if number_pages:
+            queue_listing_page(1)
+        try:
+            # tasks only ever holds the tasks still running
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    stage, target = tasks.pop(task)
+                    failed = False
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        self.failures.add(stage, target, e)
+                        self.progress.errors += 1
+                        result = None
+                        failed = True
+                        if stage == "job_listing":
+                            DROPPED_LISTINGS.inc(board=self.board_name, reason=type(e).__name__)
+
+                    if stage == "listing_page":
+                        self.progress.pages_done += 1
+                        listing_codes = self.claim_listings(result or [])
+                        known_to_search = await asyncio.to_thread(
+                            listing_store.known_to_search, search_key, self.board_name, listing_codes)
+                        stored = await asyncio.to_thread(listing_store.records, self.board_name, listing_codes)
+
+                        from_store = []
+                        for listing_code in listing_codes:
+                            if str(listing_code) not in stored:
+                                tasks[asyncio.ensure_future(self.process_job_listing(listing_code))] = ("job_listing", listing_code)
+                                self.progress.listings_total += 1
+                            elif str(listing_code) not in known_to_search:
+                                # Fetched by another search, still new to this one
+                                from_store.append(str(listing_code))
+                                self.progress.listings_total += 1
+                                self.progress.listings_done += 1
+                        await asyncio.to_thread(listing_store.seen_all, search_key, self.board_name,
+                                                [listing_code for listing_code in listing_codes if str(listing_code) in stored])
 
-        return pd.DataFrame([listing for listing in listing_data if listing])
\ No newline at end of file
+                        # Stop at the first page with nothing new. A failed page tells us nothing, so carry on past it.
+                        if (result is None or any(str(l) not in known_to_search for l in listing_codes)) and target < number_pages:
+                            queue_listing_page(target + 1)
+                        for listing_code in from_store:
+                            yielded.add(listing_code)
+                            yield stored[listing_code]
+                    else:
+                        self.progress.listings_done += 1
+                        if result:
+                            await asyncio.to_thread(listing_store.seen, search_key, self.board_name, target, result)
+                            yielded.add(str(target))
+                            yield result
+                        elif not failed:
+                            DROPPED_LISTINGS.inc(board=self.board_name, reason="no_data")
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if snapshot:
+            for listing_code, record in await asyncio.to_thread(lambda: list(listing_store.search_records(search_key))):
+                if listing_code not in yielded:
+                    yield record
+
+    async def iter_queued_data(self, number_pages: int, work_queue: WorkQueue, poll_interval: float = 0.05,
+                               stall_timeout: float = 300) -> AsyncIterator[Dict[str, str]]:
+        """Version of iter_data whose pages are fetched and parsed by queue
+        workers, in other processes or on other machines.
+
+        Each listing page goes on work_queue as a task. As its listing codes
+        come back, every new one goes on as a detail page task, and the
+        records of those are yielded as they come back. Failures and
+        progress are kept as for iter_data. If no task comes back for
+        stall_timeout seconds, say because no worker is running, the tasks
+        still out are recorded as failed and the run ends.
+        """
+        search_id = uuid.uuid4().hex
+        spec = self.task_spec()
+        self.listing_index = ListingIndex()
+        self.failures = FailureReport()
+        self.progress = SearchProgress(pages_total=number_pages)
+        # Task id -> (stage, target) of the tasks still out, for the failure report
+        tasks = {}
+
+        def put_all(queued: List[Tuple[str, str, Dict[str, Any]]]):
+            for task_id, kind, payload in queued:
+                work_queue.put(search_id, task_id, kind, payload)
+
+        # The queue is a file or a server, so it's read and written off the event loop
+        listing_tasks = []
+        for query, page_n, target in self.listing_pages(number_pages):
+            task_id = f"{search_id}:{LISTING_TASK}:{target}"
+            listing_tasks.append((task_id, LISTING_TASK, {"engine": spec, "page_n": page_n, "query": query}))
+            tasks[task_id] = ("listing_page", target)
+
+        seq = 0
+        last_result = time.monotonic()
+        try:
+            await asyncio.to_thread(put_all, listing_tasks)
+            while tasks:
+                results = await asyncio.to_thread(work_queue.results, search_id, seq)
+                if not results:
+                    if time.monotonic() - last_result > stall_timeout:
+                        for stage, target in tasks.values():
+                            self.failures.add_error(stage, target, "WorkerTimeout", f"No task came back in {stall_timeout}s")
+                            self.progress.errors += 1
+                        return
+                    await asyncio.sleep(poll_interval)
+                    continue
+
+                last_result = time.monotonic()
+                for result in results:
+                    seq = result.seq
+                    if result.task_id not in tasks:
+                        continue
+                    stage, target = tasks.pop(result.task_id)
+                    if stage == "listing_page":
+                        self.progress.pages_done += 1
+                    else:
+                        self.progress.listings_done += 1
+
+                    if result.failed:
+                        self.failures.add_error(stage, target, result.error_type, result.error)
+                        self.progress.errors += 1
+                        if stage == "job_listing":
+                            DROPPED_LISTINGS.inc(board=self.board_name, reason=result.error_type)
+                        continue
+
+                    for phase, seconds in result.result.get("timing", {}).items():
+                        self.timing.add(phase, seconds)
+                    if stage == "listing_page":
+                        listings = dict(result.result["listings"])
+                        detail_tasks = []
+                        for listing_code in self.claim_listings(result.result["listing_codes"]):
+                            task_id = f"{search_id}:{DETAIL_TASK}:{listing_code}"
+                            detail_tasks.append((task_id, DETAIL_TASK,
+                                                 {"engine": spec, "listing_code": listing_code, "listing": listings.get(listing_code)}))
+                            tasks[task_id] = ("job_listing", listing_code)
+                            self.progress.listings_total += 1
+                        await asyncio.to_thread(put_all, detail_tasks)
+                    elif result.result["record"]:
+                        yield result.result["record"]
+                    else:
+                        DROPPED_LISTINGS.inc(board=self.board_name, reason="no_data")
+        finally:
+            # Over or abandoned, either way the workers can skip what's left. Called
+            # in place, as a search that is being cancelled can't wait on a thread
+            work_queue.cancel(search_id)
+
+    def normalise_record(self, record: Dict[str, str]) -> NormalisedRecord:
+        """Map a record from get_job_data onto the columns shared by every board.
+        """
+        normalised = NormalisedRecord()
+        normalised.values = [self.board_name] + [record.get(self.normalised_fields.get(column, column)) for column in NORMALISED_COLUMNS[1:]]
+        return normalised
+
+    async def collate_data(self, number_pages: int) -> "pd.DataFrame":
+        """Every listing in a DataFrame, with a column per entry of
+        self.columns, the same columns as the streamed exports.
+        """
+        builder = ColumnBuilder(self.columns or ())
+        async for listing in self.iter_data(number_pages):
+            builder.append(listing)
+        with self.timing.phase("dataframe"):
+            return builder.to_frame()
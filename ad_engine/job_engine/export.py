@@ -0,0 +1,208 @@
+import csv
+import io
+import json
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Union
+
+from job_engine.metrics import SearchTiming
+from job_engine.schema import ColumnTypes, arrow_schema, type_record, typed_frame
+
+
+class ExportUnavailableException(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    media_type: str
+    extension: str
+    # Columnar formats are written in one go once every record is in
+    columnar: bool = False
+
+
+EXPORT_FORMATS = {
+    "csv": ExportFormat("text/csv", "csv"),
+    "ndjson": ExportFormat("application/x-ndjson", "ndjson"),
+    "parquet": ExportFormat("application/vnd.apache.parquet", "parquet", columnar=True),
+    "arrow": ExportFormat("application/vnd.apache.arrow.file", "arrow", columnar=True),
+}
+
+# Text formats are compressed as they stream, the columnar ones compress their own columns
+COMPRESSIONS = {
+    "none": ("", None),
+    "gzip": (".gz", "application/gzip"),
+    "zstd": (".zst", "application/zstd"),
+}
+
+
+def _csv_line(writer: csv.DictWriter, buffer: io.StringIO, row: Dict[str, str]) -> str:
+    buffer.seek(0)
+    buffer.truncate()
+    writer.writerow(row)
+    return buffer.getvalue()
+
+
+async def stream_csv(records: AsyncIterator[Dict[str, str]], columns: List[str],
+                     timing: Optional[SearchTiming] = None) -> AsyncIterator[str]:
+    """Render records to CSV one row at a time.
+
+    The header comes from columns, so it can be sent before the first
+    record arrives. Keys outside of columns are dropped. The time spent
+    rendering is added to timing as the render phase.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    yield _csv_line(writer, buffer, dict(zip(columns, columns)))
+    async for record in records:
+        start = time.perf_counter()
+        line = _csv_line(writer, buffer, record)
+        if timing:
+            timing.add("render", time.perf_counter() - start)
+        yield line
+
+
+async def stream_ndjson(records: AsyncIterator[Dict[str, str]], columns: List[str], column_types: ColumnTypes,
+                        timing: Optional[SearchTiming] = None,
+                        report: Optional[Callable[[], Dict[str, Any]]] = None) -> AsyncIterator[str]:
+    """Render typed records as JSON, one line each, see schema.type_record.
+    With report, a last line holds {"report": report()} once the records are in.
+    """
+    async for record in records:
+        start = time.perf_counter()
+        # Dates go out in ISO format
+        line = json.dumps(type_record(record, columns, column_types), default=str) + "\n"
+        if timing:
+            timing.add("render", time.perf_counter() - start)
+        yield line
+    if report:
+        yield json.dumps({"report": report()}, default=str) + "\n"
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportUnavailableException("Parquet and Arrow exports need pyarrow installed")
+    return pyarrow
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ExportUnavailableException("zstd compression needs zstandard installed")
+    return zstandard
+
+
+def check_export(export_format: str, compression: str = "none", report: bool = False):
+    """Raise ExportUnavailableException if the export can't be made here,
+    so a search can be turned down before it starts.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ExportUnavailableException(f"Unknown export format {export_format}")
+    if report and export_format != "ndjson":
+        raise ExportUnavailableException("Only ndjson exports can end with the search's report")
+    if compression not in COMPRESSIONS:
+        raise ExportUnavailableException(f"Unknown compression {compression}")
+    if EXPORT_FORMATS[export_format].columnar:
+        _import_pyarrow()
+        if export_format == "arrow" and compression == "gzip":
+            raise ExportUnavailableException("Arrow files can't be compressed with gzip, use zstd")
+    elif compression == "zstd":
+        _import_zstandard()
+
+
+def export_media_type(export_format: str, compression: str = "none") -> str:
+    if EXPORT_FORMATS[export_format].columnar or compression == "none":
+        return EXPORT_FORMATS[export_format].media_type
+    return COMPRESSIONS[compression][1]
+
+
+def export_extension(export_format: str, compression: str = "none") -> str:
+    extension = EXPORT_FORMATS[export_format].extension
+    if EXPORT_FORMATS[export_format].columnar:
+        return extension
+    return extension + COMPRESSIONS[compression][0]
+
+
+def write_columnar(records: List[Dict[str, str]], columns: List[str], column_types: ColumnTypes,
+                   export_format: str, compression: str = "none", timing: Optional[SearchTiming] = None) -> bytes:
+    """Write typed records to a Parquet or Arrow IPC (Feather v2) file,
+    with the board's schema, see schema.arrow_schema.
+    """
+    pa = _import_pyarrow()
+    start = time.perf_counter()
+    df = typed_frame((type_record(record, columns, column_types) for record in records), columns, column_types)
+    table = pa.Table.from_pandas(df, schema=arrow_schema(columns, column_types), preserve_index=False)
+    if timing:
+        timing.add("dataframe", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    sink = pa.BufferOutputStream()
+    codec = None if compression == "none" else compression
+    if export_format == "parquet":
+        pa.parquet.write_table(table, sink, compression=codec or "none")
+    else:
+        with pa.ipc.new_file(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression=codec)) as writer:
+            writer.write_table(table)
+    if timing:
+        timing.add("render", time.perf_counter() - start)
+    return sink.getvalue().to_pybytes()
+
+
+def _compressor(compression: str):
+    if compression == "gzip":
+        # wbits of 31 writes a gzip header
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    return _import_zstandard().ZstdCompressor().compressobj()
+
+
+async def compress_stream(chunks: AsyncIterator[Union[str, bytes]], compression: str = "none",
+                          timing: Optional[SearchTiming] = None) -> AsyncIterator[bytes]:
+    """Encode chunks to UTF-8 and compress them as they arrive.
+    """
+    compressor = None if compression == "none" else _compressor(compression)
+    async for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        if compressor is None:
+            yield chunk
+            continue
+        start = time.perf_counter()
+        chunk = compressor.compress(chunk)
+        if timing:
+            timing.add("compress", time.perf_counter() - start)
+        # The compressor holds on to small chunks until it has a block's worth
+        if chunk:
+            yield chunk
+    if compressor is not None:
+        yield compressor.flush()
+
+
+async def stream_export(records: AsyncIterator[Dict[str, str]], columns: List[str], column_types: ColumnTypes,
+                        export_format: str = "csv", compression: str = "none",
+                        timing: Optional[SearchTiming] = None,
+                        report: Optional[Callable[[], Dict[str, Any]]] = None) -> AsyncIterator[bytes]:
+    """Render records in export_format, see EXPORT_FORMATS.
+
+    CSV is the records as the board gave them. The other formats are typed
+    with column_types: dates are parsed, salaries split into min, max and
+    period and categorical columns written as categories. CSV and NDJSON
+    stream a row at a time, gzip or zstd compressed as they go. Parquet and
+    Arrow are written once every record is in, using compression for
+    their columns. NDJSON can end with a report of the search, see
+    stream_ndjson.
+    """
+    if EXPORT_FORMATS[export_format].columnar:
+        yield write_columnar([record async for record in records], columns, column_types, export_format, compression, timing)
+        return
+
+    if export_format == "ndjson":
+        chunks = stream_ndjson(records, columns, column_types, timing, report)
+    else:
+        chunks = stream_csv(records, columns, timing)
+    async for chunk in compress_stream(chunks, compression, timing):
+        yield chunk
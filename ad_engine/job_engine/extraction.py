@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Union
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup, SoupStrainer
+    from bs4.element import Tag
+
+
+class MissingFieldException(Exception):
+    pass
+
+
+# Readers turn a matched element into a field value. They are module level
+# so an Extractor can be pickled over to a process pool.
+
+def text(element: "Tag") -> str:
+    return element.get_text()
+
+def stripped_text(element: "Tag") -> str:
+    return element.get_text().strip()
+
+def string(element: "Tag") -> Optional[str]:
+    return element.string
+
+@dataclass(frozen=True)
+class Attribute:
+    name: str
+
+    def __call__(self, element: "Tag") -> Optional[str]:
+        return element.get(self.name)
+
+
+@dataclass(frozen=True)
+class Rule:
+    """How to read one field off a page.
+
+    selector is a CSS selector. The first element it matches is passed to
+    read, or with many, every element it matches. A field that matches
+    nothing is default, unless it is required.
+    """
+    selector: str
+    read: Callable[["Tag"], Any] = stripped_text
+    many: bool = False
+    required: bool = False
+    default: Any = None
+
+
+class Strainer:
+    """The arguments of a bs4 SoupStrainer, which is only made once a page
+    is parsed, so importing the engines doesn't import bs4.
+    """
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+
+    def build(self) -> "SoupStrainer":
+        from bs4 import SoupStrainer
+
+        return SoupStrainer(*self.args, **self.kwargs)
+
+
+class Extractor:
+    """Reads a set of fields off a page in one walk of its tree.
+
+    The selectors are compiled once, the first time a page is read.
+    parse_only limits the soup to the parts of the page the rules look
+    at, see Scraper_Engine.parse, so most of the page is never turned
+    into tags.
+    """
+    def __init__(self, rules: Dict[str, Rule], parse_only: Optional[Union[Strainer, "SoupStrainer"]] = None):
+        self.rules = rules
+        self._parse_only = parse_only
+        self._patterns = None
+        self._any_rule = None
+
+    @property
+    def parse_only(self) -> Optional["SoupStrainer"]:
+        if isinstance(self._parse_only, Strainer):
+            self._parse_only = self._parse_only.build()
+        return self._parse_only
+
+    def _compile(self):
+        import soupsieve
+
+        self._patterns = {name: soupsieve.compile(rule.selector) for name, rule in self.rules.items()}
+        self._any_rule = soupsieve.compile(", ".join(rule.selector for rule in self.rules.values()))
+
+    def extract(self, soup: "BeautifulSoup") -> Dict[str, Any]:
+        if self._patterns is None:
+            self._compile()
+        if len(self.rules) == 1:
+            # Nothing to tell apart, and a single field can stop at its first match
+            (name, pattern), = self._patterns.items()
+            matched = {name: pattern.select(soup, limit=0 if self.rules[name].many else 1)}
+        else:
+            matched: Dict[str, List["Tag"]] = {name: [] for name in self.rules}
+            for found in self._any_rule.select(soup):
+                for name, pattern in self._patterns.items():
+                    if (self.rules[name].many or not matched[name]) and pattern.match(found):
+                        matched[name].append(found)
+
+        fields = {}
+        for name, rule in self.rules.items():
+            if rule.many:
+                fields[name] = [rule.read(found) for found in matched[name]]
+            elif matched[name]:
+                fields[name] = rule.read(matched[name][0])
+            elif rule.required:
+                raise MissingFieldException(f"Nothing on the page matches {rule.selector!r} for {name}")
+            else:
+                fields[name] = rule.default
+        return fields
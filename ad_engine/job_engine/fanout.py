@@ -0,0 +1,82 @@
+import asyncio
+import re
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from job_engine.engine import NORMALISED_COLUMN_TYPES, NORMALISED_COLUMNS, Scraper_Engine
+
+_whitespace_re = re.compile(r"\s+")
+
+# Marks the end of one engine's records on the merge queue
+_DONE = object()
+
+
+def dedup_key(record: Dict[str, str]) -> Tuple[str, str, str]:
+    """The same job posted on several boards should share this key.
+    """
+    return tuple(_whitespace_re.sub(" ", str(record.get(column) or "")).strip().lower() for column in ("title", "company", "location"))
+
+
+class FanOutSearch:
+    """Runs several engines at once and merges their records.
+
+    Every record is normalised to NORMALISED_COLUMNS, with the board it
+    came from as a column, and a job already seen on another board is
+    dropped. Records are yielded as soon as any engine produces them, so
+    the search takes as long as the slowest board.
+
+    iter_records picks which of an engine's records to search for, by
+    default engine.iter_data.
+    """
+    columns = NORMALISED_COLUMNS
+    column_types = NORMALISED_COLUMN_TYPES
+
+    def __init__(self, engines: List[Tuple[Scraper_Engine, int]],
+                 iter_records: Optional[Callable[[Scraper_Engine, int], AsyncIterator[Dict[str, str]]]] = None):
+        self.engines = engines
+        self.iter_records = iter_records or (lambda engine, n_pages: engine.iter_data(n_pages))
+        self.duplicates = 0
+
+    async def _drain(self, engine: Scraper_Engine, n_pages: int, queue: asyncio.Queue):
+        try:
+            async for record in self.iter_records(engine, n_pages):
+                await queue.put(engine.normalise_record(record))
+        except asyncio.CancelledError:
+            # Only cancelled once the consumer has stopped reading, nobody would make room for _DONE
+            raise
+        except BaseException:
+            await queue.put(_DONE)
+            raise
+        await queue.put(_DONE)
+
+    async def iter_data(self) -> AsyncIterator[Dict[str, str]]:
+        # Bounded, so a slow consumer holds the engines back rather than buffering their records
+        queue = asyncio.Queue(maxsize=100)
+        tasks = [asyncio.ensure_future(self._drain(engine, n_pages, queue)) for engine, n_pages in self.engines]
+        seen = set()
+        running = len(tasks)
+        try:
+            while running:
+                record = await queue.get()
+                if record is _DONE:
+                    running -= 1
+                    continue
+
+                key = dedup_key(record)
+                # Without any of the key fields there is nothing to match on
+                if any(key):
+                    if key in seen:
+                        self.duplicates += 1
+                        continue
+                    seen.add(key)
+                yield record
+
+            # Only raises if an engine failed outright, page failures are in each engine's report
+            for task in tasks:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def failures(self) -> Dict[str, Dict[str, object]]:
+        return {engine.board_name: engine.failures.as_dict() for engine, _ in self.engines if engine.failures}
@@ -1,17 +1,60 @@
 import re
 import asyncio
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
-from job_engine.engine import Scraper_Engine, CaptchaException
+from job_engine.engine import Scraper_Engine
+from job_engine.extraction import Attribute, Extractor, Rule, Strainer, string, text
+from job_engine.partition import Choice
+from job_engine.records import Record
+from job_engine.schema import CATEGORY, SALARY
+
+if TYPE_CHECKING:
+    from bs4.element import Tag
 
 
 # jobs?as_and=dvd&as_phr&as_any&as_not&as_ttl&as_cmp&jt=all&st&salary&radius=50&l&fromage=any&limit=10&sort&psf=advsrch&from=advancedsearch&
 
 # jobs?as_and=all_these&as_phr=exact_this&as_any=at_least_one&as_not=none_of&as_ttl=title_search&as_cmp=from_company&jt=fulltime&st=&salary=&radius=50&l=&fromage=any&limit=50&sort=&psf=advsrch&from=advancedsearch
 
+def _employer_and_location(r: "Tag") -> Tuple[Optional[str], Optional[str]]:
+    # Employer information (name + location)
+    employer = s.text if (s := r.find("a")) is not None else r.find('div', 'jobsearch-InlineCompanyRating').text
+    location = ' '.join([f.text for f in r.find('div', 'jobsearch-JobInfoHeader-subtitle').find_all('div', attrs={'class': None})])
+    return employer, location
+
+def _position_details(r: "Tag") -> List[str]:
+    return [span.text for span in r.find_all('span')]
+
+COUNT_EXTRACTOR = Extractor(
+    {'pages_text': Rule('#searchCountPages', required=True)},
+    parse_only=Strainer('div', id='searchCountPages'))
+LISTING_EXTRACTOR = Extractor(
+    {'listing_codes': Rule('a[id^="job_"]', read=Attribute('data-jk'), many=True)},
+    parse_only=Strainer('a', id=re.compile('^job_')))
+DETAIL_EXTRACTOR = Extractor({
+        'title': Rule('h1.jobsearch-JobInfoHeader-title', read=string, default=''),
+        'description': Rule('#jobDescriptionText', read=text, required=True),
+        'employer_and_location': Rule('div.jobsearch-CompanyInfoContainer', read=_employer_and_location, default=(None, None)),
+        'position_details': Rule('div.jobsearch-JobMetadataHeader-item', read=_position_details, default=[]),
+    },
+    # Just the elements the rules read. One strainer can't take an id or a class, so the description goes by
+    # its class here, and should Indeed rename it parse_document falls back to the full page and its id.
+    # The strainer sees the class attribute as one string, with the title's other classes in it.
+    parse_only=Strainer(class_=re.compile(r'(?:^|\s)jobsearch-(?:JobInfoHeader-title|CompanyInfoContainer|'
+                                          r'JobMetadataHeader-item|jobDescriptionText)(?:\s|$)')))
+
+PAGES_RE = re.compile("^Page ([0-9]*) of ([0-9]*) jobs")
+CAPTCHA_RE = re.compile("hCaptcha")
+NO_RESULTS_RE = re.compile("did not match any jobs")
+
+class IndeedRecord(Record):
+    __slots__ = ()
+    columns = ('title', 'description', 'employer', 'location', 'employment_type', 'salary', 'url')
+
 class IndeedEngine(Scraper_Engine):
     def __init__(self):
         # Test
-        self.pages_re = re.compile("^Page ([0-9]*) of ([0-9]*) jobs")
+        self.pages_re = PAGES_RE
         self.headers = {"User-Agent":"Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.97 Safari/537.36"}
         self.api_url = "https://au.indeed.com/jobs?"
         self.listing_url_template = "https://au.indeed.com/viewjob?jk={listing_code}"
@@ -28,66 +71,58 @@ class IndeedEngine(Scraper_Engine):
             'limit': 50, # Max page limit
             'start': 0, # n to start reading jobs from
         }
+        self.newest_first_query = {'sort': 'date'}
+        self.partition_dimensions = [Choice('jt', ['fulltime', 'parttime', 'casual', 'contract'])]
         self.page_query_option = "start"
+        self.columns = list(IndeedRecord.columns)
+        self.board_name = "Indeed"
+        self.normalised_fields = {
+            'company': 'employer',
+            'contract_type': 'employment_type',
+        }
+        self.column_types = {'employment_type': CATEGORY, 'salary': SALARY}
+        # Indeed is quick to serve a captcha, so keep the request rate low
+        self.max_concurrency = 4
+        self.requests_per_second = 2
+        # Indeed listings are edited more often than the other boards
+        self.cache_ttl = 6 * 60 * 60
+        self.count_extractor = COUNT_EXTRACTOR
+        self.listing_extractor = LISTING_EXTRACTOR
+        self.detail_extractor = DETAIL_EXTRACTOR
+        self.captcha_pattern = CAPTCHA_RE
+        self.no_results_pattern = NO_RESULTS_RE
         self.__post_init__()
 
     def get_number_jobs(self, soup):
-        pages_text = soup.find('div', id="searchCountPages").get_text().replace(",", "").strip()
+        pages_text = self.count_extractor.extract(soup)['pages_text'].replace(",", "")
         return int(self.pages_re.match(pages_text).group(2))
 
     def modify_query_for_page(self, query_contents, page_number, query_option):
         query_contents[query_option] = int(self.query_contents['limit'])*page_number
         return query_contents
 
-    def verify_page_contents(self, response, soup):
-        if "hCaptcha" in soup.get_text():
-            raise CaptchaException("hCaptcha block present on page.")
-    
-    def check_if_no_jobs(self, soup):
-        if "did not match any jobs" in soup.get_text():
-            return True 
-
     def get_listing_codes(self, soup):
-        jobs = soup.find_all('a', id=re.compile('^job_'))
-        return [j['data-jk'] for j in jobs]
+        return self.listing_extractor.extract(soup)['listing_codes']
 
     def get_job_data(self, soup, listing_code):
         # Collect the data
-        data_dict = {}
-
-        title = soup.find('h1', attrs={'class':'jobsearch-JobInfoHeader-title'})
-        if title is not None:
-            data_dict['title'] = title.string
-        else:
-            data_dict['title'] = ''
-
-        data_dict['description'] = soup.find('div', id="jobDescriptionText").get_text()
-
-        # Employer information (name + location)
-        r = soup.find('div', class_='jobsearch-CompanyInfoContainer')
-        if r is not None:
-            data_dict['employer'] = s.text if (s := r.find("a")) is not None else r.find('div', 'jobsearch-InlineCompanyRating').text
-            data_dict['location'] = ' '.join([f.text for f in r.find('div', 'jobsearch-JobInfoHeader-subtitle').find_all('div', attrs={'class': None})])
-        else:
-            data_dict['employer'] = None
-            data_dict['location'] = None
-        
+        fields = self.detail_extractor.extract(soup)
+        data_dict = IndeedRecord(title=fields['title'], description=fields['description'])
+        data_dict['employer'], data_dict['location'] = fields['employer_and_location']
+
         # Position details
         data_dict['employment_type'] = ""
         data_dict['salary'] = ""
 
-        if (r := soup.find('div', class_='jobsearch-JobMetadataHeader-item')) is not None:
-            pdetails = r.find_all('span')
-
-            if len(pdetails) == 1:
-                content = pdetails[0].text
-                if "$" in content: 
-                    data_dict['salary'] = pdetails[0].text
-                else:
-                    data_dict['employment_type'] = pdetails[0].text
-            elif len(pdetails) == 2:
-                data_dict['employment_type'] = pdetails[1].text.replace("-",'').strip()
-                data_dict['salary'] = pdetails[0].text
+        pdetails = fields['position_details']
+        if len(pdetails) == 1:
+            if "$" in pdetails[0]:
+                data_dict['salary'] = pdetails[0]
+            else:
+                data_dict['employment_type'] = pdetails[0]
+        elif len(pdetails) == 2:
+            data_dict['employment_type'] = pdetails[1].replace("-",'').strip()
+            data_dict['salary'] = pdetails[0]
 
         # Add a URL
         data_dict['url'] = self.get_listing_uri(listing_code)
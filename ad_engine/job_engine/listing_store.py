@@ -0,0 +1,116 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Set, Tuple
+
+
+class ListingStore:
+    """Persistent index of the listings seen by previous searches.
+
+    listings holds every listing per board, with when it was first and
+    last seen and the record itself. searches links a search (see
+    Scraper_Engine.search_key) to the listings it returned, so a repeated
+    search knows where the new listings end. A listing is only fetched
+    once, a changed listing isn't noticed.
+
+    Searches read and write the store from worker threads, one at a time.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS listings (
+                board TEXT, listing_code TEXT, first_seen REAL, last_seen REAL, record TEXT,
+                PRIMARY KEY (board, listing_code));
+            CREATE TABLE IF NOT EXISTS searches (
+                search_key TEXT, board TEXT, listing_code TEXT, first_seen REAL, last_seen REAL,
+                PRIMARY KEY (search_key, board, listing_code));
+        """)
+
+    def _select(self, query: str, params: tuple, listing_codes: Iterable) -> list:
+        listing_codes = [str(listing_code) for listing_code in listing_codes]
+        if not listing_codes:
+            return []
+        placeholders = ",".join("?" * len(listing_codes))
+        with self._lock:
+            return self._db.execute(query.format(placeholders=placeholders), params + tuple(listing_codes)).fetchall()
+
+    def known_to_search(self, search_key: str, board: str, listing_codes: Iterable) -> Set[str]:
+        """The listing codes this search has returned before.
+        """
+        rows = self._select(
+            "SELECT listing_code FROM searches WHERE search_key = ? AND board = ? AND listing_code IN ({placeholders})",
+            (search_key, board), listing_codes)
+        return {row[0] for row in rows}
+
+    def records(self, board: str, listing_codes: Iterable) -> Dict[str, Dict[str, Any]]:
+        """The stored records of whichever of listing_codes any search has seen on board.
+        """
+        rows = self._select(
+            "SELECT listing_code, record FROM listings WHERE board = ? AND listing_code IN ({placeholders})",
+            (board,), listing_codes)
+        return {listing_code: json.loads(record) for listing_code, record in rows}
+
+    def seen(self, search_key: str, board: str, listing_code, record: Mapping[str, Any] = None):
+        """Record that search returned the listing, storing its record if it was fetched.
+        """
+        if record is None:
+            self.seen_all(search_key, board, [listing_code])
+            return
+        now = time.time()
+        listing_code = str(listing_code)
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                # Named columns, files from before content_hash was dropped still have it
+                self._db.execute("""
+                    INSERT INTO listings (board, listing_code, first_seen, last_seen, record) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (board, listing_code) DO UPDATE SET last_seen = excluded.last_seen, record = excluded.record
+                """, (board, listing_code, now, now, json.dumps(dict(record), default=str)))
+                self._link(search_key, board, [listing_code], now)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def seen_all(self, search_key: str, board: str, listing_codes: Iterable):
+        """Record that search returned listings that are already stored, in one go.
+        """
+        listing_codes = [str(listing_code) for listing_code in listing_codes]
+        if not listing_codes:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany("UPDATE listings SET last_seen = ? WHERE board = ? AND listing_code = ?",
+                                     [(now, board, listing_code) for listing_code in listing_codes])
+                self._link(search_key, board, listing_codes, now)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _link(self, search_key: str, board: str, listing_codes: List[str], now: float):
+        self._db.executemany("""
+            INSERT INTO searches VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (search_key, board, listing_code) DO UPDATE SET last_seen = excluded.last_seen
+        """, [(search_key, board, listing_code, now, now) for listing_code in listing_codes])
+
+    def search_records(self, search_key: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Every (listing_code, record) the search has returned, newest first.
+        """
+        with self._lock:
+            rows = self._db.execute("""
+                SELECT listing_code, listings.record FROM searches JOIN listings USING (board, listing_code)
+                WHERE searches.search_key = ? ORDER BY searches.first_seen DESC
+            """, (search_key,)).fetchall()
+        for listing_code, record in rows:
+            yield listing_code, json.loads(record)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
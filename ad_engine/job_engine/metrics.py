@@ -0,0 +1,221 @@
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Fetches and parses take from a few milliseconds to the request timeout
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (1_000, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000, 500_000, 1_000_000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes the labels {self.label_names}, not {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]:
+        ...
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """A count that only goes up, per combination of labels.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """A value that goes up and down, such as the requests in flight.
+    """
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    @contextmanager
+    def track(self, **labels):
+        """Count what is running inside the block.
+        """
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Observations, such as latencies, counted into cumulative buckets.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # Per label key, the count in each bucket (not cumulative) and the sum
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * len(self.buckets)
+            self._sums[key] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def samples(self) -> Iterator[str]:
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(self._sums[key])}"
+            yield f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}"
+
+
+class MetricsRegistry:
+    """The metrics served at /metrics, rendered in the Prometheus text format.
+    """
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"A metric called {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+FETCH_SECONDS = REGISTRY.register(Histogram(
+    "ad_engine_fetch_seconds", "Time from sending a request to a board to having read its body.", ("board", "stage")))
+RESPONSE_BYTES = REGISTRY.register(Histogram(
+    "ad_engine_response_bytes", "Size of the bodies of board responses.", ("board", "stage"), BYTES_BUCKETS))
+PARSE_SECONDS = REGISTRY.register(Histogram(
+    "ad_engine_parse_seconds", "Time spent parsing a page, including any wait for the parse executor.", ("board", "stage")))
+RESPONSES = REGISTRY.register(Counter(
+    "ad_engine_responses_total", "Board responses by status code.", ("board", "status")))
+REQUEST_ERRORS = REGISTRY.register(Counter(
+    "ad_engine_request_errors_total", "Requests to a board that got no response, by error.", ("board", "error")))
+CAPTCHAS = REGISTRY.register(Counter(
+    "ad_engine_captchas_total", "Pages that came back as a captcha.", ("board",)))
+DROPPED_LISTINGS = REGISTRY.register(Counter(
+    "ad_engine_dropped_listings_total", "Listings found on a listing page that never made it into a result, by reason.", ("board", "reason")))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "ad_engine_requests_in_flight", "Requests to a board waiting on a response.", ("board",)))
+HOST_CONCURRENCY_LIMIT = REGISTRY.register(Gauge(
+    "ad_engine_host_concurrency_limit", "Requests a host may have in flight at once, as set by the politeness controller.", ("host",)))
+SEARCHES_IN_FLIGHT = REGISTRY.register(Gauge(
+    "ad_engine_searches_in_flight", "Searches streaming or running in the background.", ("endpoint",)))
+PHASE_SECONDS = REGISTRY.register(Histogram(
+    "ad_engine_search_phase_seconds", "Time a search spent in each phase, summed over its concurrent requests.", ("board", "phase")))
+
+
+class SearchTiming:
+    """Where the time of one search went, by phase.
+
+    Fetches and parses overlap, so a phase is the time summed across all
+    of its requests and the phases can add up to more than the search took.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    @contextmanager
+    def phase(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def observe(self, board: str):
+        """Add the phases to the phase histogram, once the search is over.
+        """
+        for phase, seconds in self.phases.items():
+            PHASE_SECONDS.observe(seconds, board=board, phase=phase)
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        timing = {phase: {"seconds": round(seconds, 4), "count": self.counts[phase]} for phase, seconds in self.phases.items()}
+        timing["total"] = {"seconds": round(self.elapsed(), 4), "count": 1}
+        return timing
+
+    def server_timing(self, prefix: Optional[str] = None) -> str:
+        """The phases as a Server-Timing header value, in milliseconds.
+        """
+        entries = [(phase, seconds) for phase, seconds in self.phases.items()] + [("total", self.elapsed())]
+        return ", ".join(f"{prefix + '-' if prefix else ''}{phase};dur={seconds * 1000:.1f}" for phase, seconds in entries)
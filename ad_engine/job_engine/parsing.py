@@ -0,0 +1,79 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from job_engine.extraction import MissingFieldException
+
+if TYPE_CHECKING:
+    from bs4 import SoupStrainer
+
+PARSER_BACKENDS = ("html.parser", "lxml")
+EXECUTOR_KINDS = ("thread", "process")
+
+
+def reads_text(parse_func: Callable) -> Callable:
+    """Mark parse_func as taking the page text rather than its soup, for
+    pages whose data can be read without building the document.
+    """
+    parse_func.reads_text = True
+    return parse_func
+
+
+def parse_document(parse_func: Callable, text: str, parser_backend: str, *args, parse_only: Optional["SoupStrainer"] = None) -> Any:
+    """Build the soup, of just the parse_only parts of the page if given,
+    and run parse_func over it. A parse_func marked with reads_text is
+    given the text as is.
+
+    A strainer only saves work, so when it leaves out a field a rule
+    requires, the page is parsed again in full before giving up on it.
+
+    This is the unit of work sent to the executor, so only the text goes
+    in and only whatever parse_func returns comes back.
+    """
+    if getattr(parse_func, "reads_text", False):
+        return parse_func(text, *args)
+    # Imported here so the API starts without bs4, it's only a lookup once loaded
+    from bs4 import BeautifulSoup
+
+    if parse_only is None:
+        return parse_func(BeautifulSoup(text, parser_backend), *args)
+    try:
+        return parse_func(BeautifulSoup(text, parser_backend, parse_only=parse_only), *args)
+    except MissingFieldException:
+        # The board may have changed the markup around the field the strainer picks out
+        return parse_func(BeautifulSoup(text, parser_backend), *args)
+
+
+class ParseExecutor:
+    """Runs page parsing off the event loop.
+
+    A thread pool keeps the loop responsive but still shares the GIL with
+    it. A process pool parses in parallel, at the cost of pickling the
+    engine and the page text for every call.
+    """
+    def __init__(self, kind: str = "thread", max_workers: Optional[int] = None):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown executor kind {kind!r}, expected one of {EXECUTOR_KINDS}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="parse")
+        return self._executor
+
+    async def run(self, parse_func: Callable, text: str, parser_backend: str, *args, parse_only: Optional["SoupStrainer"] = None) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, partial(parse_document, parse_func, text, parser_backend, *args, parse_only=parse_only))
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
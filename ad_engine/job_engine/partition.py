@@ -0,0 +1,118 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Union
+
+
+@dataclass
+class Partition:
+    """One sub-query of a partitioned search.
+
+    fields are the query fields the planner added to the original query,
+    query is the full query to page through and n_jobs is how many jobs
+    the board reported for it.
+    """
+    query: Dict[str, Any]
+    n_jobs: int
+    fields: Dict[str, Any] = field(default_factory=dict)
+
+    def label(self) -> str:
+        return "&".join(f"{key}={value}" for key, value in self.fields.items() if value is not None) or "all"
+
+
+@dataclass
+class Choice:
+    """Split on a query field that takes one of a fixed set of values,
+    such as a contract type. Skipped when the search already sets the field.
+    """
+    field: str
+    values: Sequence[Any]
+
+    def split(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if query.get(self.field) is not None:
+            return []
+        return [{self.field: value} for value in self.values]
+
+    def repeatable(self) -> bool:
+        return False
+
+
+@dataclass
+class Range:
+    """Split on a pair of from and to query fields, such as a salary band.
+
+    The first split uses edges, with None as an open end. A band that is
+    still too large is halved, down to bands step wide.
+    """
+    low_field: str
+    high_field: str
+    edges: Sequence[Optional[int]]
+    step: int
+
+    def split(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        low, high = query.get(self.low_field), query.get(self.high_field)
+        if low is None and high is None:
+            return [{self.low_field: a, self.high_field: b} for a, b in zip(self.edges, self.edges[1:])]
+        if low is None or high is None or high - low <= self.step:
+            return []
+        middle = low + (high - low) // 2 // self.step * self.step
+        if middle <= low:
+            middle = low + self.step
+        return [{self.low_field: low, self.high_field: middle}, {self.low_field: middle, self.high_field: high}]
+
+    def repeatable(self) -> bool:
+        return True
+
+
+Dimension = Union[Choice, Range]
+
+
+async def plan_partitions(
+        count_jobs: Callable[[Dict[str, Any]], Awaitable[int]],
+        query: Dict[str, Any],
+        n_jobs: int,
+        dimensions: Sequence[Dimension],
+        max_jobs: int) -> List[Partition]:
+    """Split query into sub-queries that each report no more than max_jobs.
+
+    dimensions are tried in order. A sub-query that is still too large is
+    split on the next dimension, or split again if the dimension is a Range.
+    Sub-queries can overlap, which the engine's listing index takes care of.
+    When the sub-queries add up to fewer jobs than their parent, the parent
+    is planned again on the dimensions after the one it was split on, as
+    listings missing the field (a job with no salary given, say) are only
+    reachable through it.
+    """
+    return await _plan(count_jobs, Partition(query, n_jobs), list(dimensions), max_jobs)
+
+
+async def _plan(count_jobs, partition: Partition, dimensions: List[Dimension], max_jobs: int) -> List[Partition]:
+    if partition.n_jobs <= max_jobs:
+        return [partition]
+
+    for i, dimension in enumerate(dimensions):
+        splits = dimension.split(partition.query)
+        if splits:
+            remaining = dimensions[i:] if dimension.repeatable() else dimensions[i + 1:]
+            later = dimensions[i + 1:]
+            break
+    else:
+        # Nothing left to split on, the board's pagination limit applies
+        return [partition]
+
+    queries = [{**partition.query, **split} for split in splits]
+    counts = await asyncio.gather(*[count_jobs(query) for query in queries], return_exceptions=True)
+
+    children = []
+    covered = 0
+    for query, split, n_jobs in zip(queries, splits, counts):
+        if isinstance(n_jobs, Exception):
+            continue
+        covered += n_jobs
+        if n_jobs:
+            children.append(Partition(query, n_jobs, {**partition.fields, **split}))
+
+    plans = [_plan(count_jobs, child, remaining, max_jobs) for child in children]
+    if covered < partition.n_jobs:
+        plans.insert(0, _plan(count_jobs, partition, later, max_jobs))
+    planned = await asyncio.gather(*plans)
+    return [child for child_partitions in planned for child in child_partitions]
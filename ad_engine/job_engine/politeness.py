@@ -0,0 +1,211 @@
+import sqlite3
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, Optional
+
+from job_engine.metrics import HOST_CONCURRENCY_LIMIT
+from job_engine.scheduler import HostLimits, RequestScheduler
+
+# Statuses that mean the board wants us to slow down
+OVERLOAD_STATUSES = (429, 500, 502, 503, 504)
+
+
+@dataclass
+class AIMDPolicy:
+    """How the politeness controller moves a host's limits.
+
+    Attributes:
+        window: Responses judged together before the limit is raised
+        increase: Concurrency added after a healthy window
+        decrease: What the concurrency is multiplied by on a 429, 5xx or an unhealthy window
+        max_error_rate: Share of a window's requests that may fail, timeouts and error pages included
+        latency_tolerance: How far over its baseline a window's mean latency may go
+        baseline_drift: How quickly the baseline latency follows a slower host, the baseline is the best latency seen
+        max_factor: The most the limits may grow to, as a multiple of the engine's own
+        captcha_grace: Seconds a host is held at the floor before another captcha means slowing down hasn't helped
+    """
+    window: int = 20
+    increase: float = 1
+    decrease: float = 0.5
+    max_error_rate: float = 0.1
+    latency_tolerance: float = 2.0
+    baseline_drift: float = 0.05
+    max_factor: float = 4
+    captcha_grace: float = 60
+
+
+@dataclass
+class _HostControl:
+    initial: HostLimits
+    concurrency: float
+    baseline_latency: Optional[float] = None
+    # When the limit last came down, responses to requests sent before it don't bring it down again
+    decreased_at: float = 0.0
+    # When the limit came down to one request at a time
+    floor_since: Optional[float] = None
+    responses: int = 0
+    errors: int = 0
+    latency: float = 0.0
+    increases: int = 0
+    decreases: int = 0
+    captchas: int = 0
+
+    def reset_window(self):
+        self.responses = 0
+        self.errors = 0
+        self.latency = 0.0
+
+
+class PolitenessController:
+    """Finds the highest request rate each host takes without pushing back.
+
+    An AIMD loop over the scheduler's per-host limits, starting from the
+    engine's own limits, or from what was learned on an earlier run when
+    there's a path to keep them in. After every window of healthy
+    responses the concurrency goes up by one, and the requests per second
+    along with it. A 429 or a 5xx brings it down by half straight away,
+    once per round trip, as do windows with too many errors or a mean
+    latency too far over the host's best. A captcha drops it to the
+    floor, and only once the host has been held there for captcha_grace
+    is another one reported as a sign the board won't be slowed down for.
+    The concurrency stays between one and the engine's times max_factor.
+    """
+    def __init__(self, scheduler: RequestScheduler, path: Optional[str] = None, policy: Optional[AIMDPolicy] = None):
+        self.scheduler = scheduler
+        self.policy = policy or AIMDPolicy()
+        self.path = path
+        self._hosts: Dict[str, _HostControl] = {}
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS limits (
+                    host TEXT PRIMARY KEY, concurrency REAL, baseline_latency REAL, updated REAL)""")
+
+    def track(self, host: str, limits: HostLimits) -> HostLimits:
+        """Take over the scheduler's limits for host, starting from limits
+        unless the host was learned before. Returns the most the limits
+        can grow to.
+        """
+        control = self._hosts.get(host)
+        if control is None:
+            control = self._hosts[host] = _HostControl(initial=limits, concurrency=limits.max_concurrency)
+            learned = self._db.execute(
+                "SELECT concurrency, baseline_latency FROM limits WHERE host = ?", (host,)).fetchone() if self._db else None
+            if learned:
+                control.concurrency = min(learned[0], self._ceiling(control))
+                control.baseline_latency = learned[1]
+            self._apply(host, control)
+        return self._scaled(control, self._ceiling(control))
+
+    def _ceiling(self, control: _HostControl) -> float:
+        return control.initial.max_concurrency * self.policy.max_factor
+
+    def _scaled(self, control: _HostControl, concurrency: float) -> HostLimits:
+        # The rate follows the concurrency, each slot gets the engine's rate per slot
+        initial = control.initial
+        rate = initial.requests_per_second * concurrency / initial.max_concurrency if initial.requests_per_second else None
+        return replace(initial, max_concurrency=max(1, int(concurrency)), requests_per_second=rate)
+
+    def _apply(self, host: str, control: _HostControl):
+        self.scheduler.configure(host, self._scaled(control, control.concurrency))
+        HOST_CONCURRENCY_LIMIT.set(int(control.concurrency), host=host)
+
+    def _save(self, host: str, control: _HostControl):
+        if self._db:
+            self._db.execute("INSERT OR REPLACE INTO limits VALUES (?, ?, ?, ?)",
+                             (host, control.concurrency, control.baseline_latency, time.time()))
+
+    def record_response(self, host: str, status: int, elapsed: float):
+        """A response from host, elapsed seconds after its request was sent.
+        """
+        control = self._hosts.get(host)
+        if control is None:
+            return
+        if status in OVERLOAD_STATUSES:
+            # Every request in flight when the host pushed back hears about it, only the first one counts
+            if time.monotonic() - elapsed >= control.decreased_at:
+                self._decrease(host, control, control.concurrency * self.policy.decrease)
+            return
+        control.responses += 1
+        control.latency += elapsed
+        self._judge_window(host, control)
+
+    def record_error(self, host: str):
+        """A request to host that timed out, didn't connect or came back as an error page.
+        """
+        control = self._hosts.get(host)
+        if control is None:
+            return
+        control.responses += 1
+        control.errors += 1
+        self._judge_window(host, control)
+
+    def record_captcha(self, host: str) -> bool:
+        """A captcha from host. Returns whether it was taken as a sign to
+        slow down, False if host isn't tracked or slowing down hasn't helped.
+        """
+        control = self._hosts.get(host)
+        if control is None:
+            return False
+        control.captchas += 1
+        self._decrease(host, control, 1)
+        if control.floor_since is None:
+            control.floor_since = time.monotonic()
+        # Requests sent before the drop can still come back as captchas
+        return time.monotonic() - control.floor_since < self.policy.captcha_grace
+
+    def _judge_window(self, host: str, control: _HostControl):
+        if control.responses < self.policy.window:
+            return
+        answered = control.responses - control.errors
+        mean_latency = control.latency / answered if answered else None
+        if mean_latency is not None:
+            if control.baseline_latency is None or mean_latency < control.baseline_latency:
+                control.baseline_latency = mean_latency
+            else:
+                control.baseline_latency += self.policy.baseline_drift * (mean_latency - control.baseline_latency)
+
+        if control.errors > self.policy.max_error_rate * control.responses or (
+                mean_latency is not None and mean_latency > self.policy.latency_tolerance * control.baseline_latency):
+            self._decrease(host, control, control.concurrency * self.policy.decrease)
+            return
+
+        control.reset_window()
+        if control.concurrency < self._ceiling(control):
+            control.concurrency = min(self._ceiling(control), control.concurrency + self.policy.increase)
+            control.increases += 1
+            control.floor_since = None
+            self._apply(host, control)
+            self._save(host, control)
+
+    def _decrease(self, host: str, control: _HostControl, concurrency: float):
+        control.reset_window()
+        control.decreased_at = time.monotonic()
+        concurrency = max(1.0, concurrency)
+        if concurrency < control.concurrency:
+            control.concurrency = concurrency
+            control.decreases += 1
+            if concurrency == 1:
+                control.floor_since = control.decreased_at
+            self._apply(host, control)
+            self._save(host, control)
+
+    def close(self):
+        if self._db:
+            self._db.close()
+
+    def info(self) -> Dict[str, Dict[str, object]]:
+        return {
+            host: {
+                "concurrency": control.concurrency,
+                "limits": vars(self._scaled(control, control.concurrency)),
+                "ceiling": self._ceiling(control),
+                "baseline_latency": control.baseline_latency,
+                "increases": control.increases,
+                "decreases": control.decreases,
+                "captchas": control.captchas,
+            }
+            for host, control in self._hosts.items()
+        }
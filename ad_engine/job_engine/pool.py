@@ -0,0 +1,125 @@
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+
+import aiohttp
+
+from job_engine.scheduler import host_of
+
+
+@dataclass
+class PoolLimits:
+    """Connection pool settings for a single host.
+
+    Attributes:
+        max_connections: Connections open to the host at once, best kept at the scheduler's max_concurrency
+        keepalive_timeout: Seconds an idle connection is kept open for reuse
+        dns_ttl: Seconds a DNS lookup is cached for, None to cache it for good
+        connect_timeout: Seconds allowed to get a connection, either from the pool or a new one
+    """
+    max_connections: int = 10
+    keepalive_timeout: float = 30
+    dns_ttl: Optional[int] = 300
+    connect_timeout: Optional[float] = 10
+
+
+@dataclass
+class PoolStats:
+    requests: int = 0
+    errors: int = 0
+    connections_created: int = 0
+    connections_reused: int = 0
+    connections_queued: int = 0
+    dns_cache_hits: int = 0
+    dns_cache_misses: int = 0
+
+
+class SessionPool:
+    """Long lived ClientSessions, one per host, shared by every engine.
+
+    Connections are kept alive and DNS lookups cached from one search to
+    the next, so a search only pays for a handshake when the pool has no
+    idle connection to the host. Each host has its own connector, so a
+    busy host can't hold every connection. Sessions are opened on first
+    use, in the running event loop, and closed by close.
+    """
+    def __init__(self, default_limits: Optional[PoolLimits] = None):
+        self.default_limits = default_limits or PoolLimits()
+        self._limits: Dict[str, PoolLimits] = {}
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._stats: Dict[str, PoolStats] = {}
+
+    def configure(self, host: str, limits: PoolLimits, overwrite: bool = True):
+        """Set the pool settings for a host. A session that is already open
+        keeps the settings it was opened with.
+        """
+        if host in self._limits and not overwrite:
+            return
+        self._limits[host] = limits
+
+    def limits(self, host: str) -> PoolLimits:
+        return self._limits.get(host, self.default_limits)
+
+    def session(self, url: str) -> aiohttp.ClientSession:
+        host = host_of(url)
+        session = self._sessions.get(host)
+        if session is None or session.closed:
+            session = self._sessions[host] = self._open(host)
+        return session
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None):
+        """session(url).get(url), with timeout seconds for the whole request.
+        """
+        limits = self.limits(host_of(url))
+        return self.session(url).get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout, connect=limits.connect_timeout))
+
+    def _open(self, host: str) -> aiohttp.ClientSession:
+        limits = self.limits(host)
+        connector = aiohttp.TCPConnector(
+            limit=limits.max_connections,
+            limit_per_host=limits.max_connections,
+            keepalive_timeout=limits.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=limits.dns_ttl)
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(connect=limits.connect_timeout),
+            trace_configs=[self._trace_config(self._stats.setdefault(host, PoolStats()))])
+
+    @staticmethod
+    def _trace_config(stats: PoolStats) -> aiohttp.TraceConfig:
+        def count(counter: str):
+            async def on_event(session, context, params):
+                setattr(stats, counter, getattr(stats, counter) + 1)
+            return on_event
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(count("requests"))
+        trace_config.on_request_exception.append(count("errors"))
+        trace_config.on_connection_create_end.append(count("connections_created"))
+        trace_config.on_connection_reuseconn.append(count("connections_reused"))
+        trace_config.on_connection_queued_start.append(count("connections_queued"))
+        trace_config.on_dns_cache_hit.append(count("dns_cache_hits"))
+        trace_config.on_dns_cache_miss.append(count("dns_cache_misses"))
+        return trace_config
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        stats = {}
+        for host, session in self._sessions.items():
+            connector = session.connector
+            host_stats = asdict(self._stats[host])
+            connections = host_stats["connections_created"] + host_stats["connections_reused"]
+            host_stats.update(asdict(self.limits(host)))
+            host_stats.update({
+                "open": not session.closed,
+                "reuse_rate": host_stats["connections_reused"] / connections if connections else 0.0,
+                # aiohttp doesn't expose these, so read them off the connector while it has them
+                "in_use": len(getattr(connector, "_acquired", ())) if connector else 0,
+                "idle": sum(len(idle) for idle in getattr(connector, "_conns", {}).values()) if connector else 0,
+            })
+            stats[host] = host_stats
+        return stats
+
+    async def close(self):
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
@@ -0,0 +1,18 @@
+from dataclasses import asdict, dataclass
+from typing import Dict
+
+
+@dataclass
+class SearchProgress:
+    """Counters of how far a run of Scraper_Engine.iter_data has got.
+    """
+    pages_total: int = 0
+    pages_done: int = 0
+    listings_total: int = 0
+    listings_done: int = 0
+    errors: int = 0
+    # Listings already found on another listing page of the search, see ListingIndex
+    duplicates_dropped: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return asdict(self)
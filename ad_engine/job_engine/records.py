@@ -0,0 +1,166 @@
+from collections.abc import MutableMapping
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+class _Missing:
+    # Pickled by name, so records from the parse executor's processes still hold this one
+    def __reduce__(self):
+        return "_MISSING"
+
+    def __repr__(self) -> str:
+        return "<missing>"
+
+
+# Marks a column the record has no value for, so it reads as missing, as it would from a dict
+_MISSING = _Missing()
+
+
+class Record(MutableMapping):
+    """A listing, readable and writable like the dict it replaces.
+
+    Subclasses fix their board's columns. A record keeps the values of
+    those columns in a list, in column order, and anything else in
+    extras, which is only made when needed. A record of ten columns takes
+    a fraction of the memory of a dict with the same keys.
+
+    Exports and DataFrames only keep the board's columns, so open ended
+    data, such as the other rows of Adzuna's details table, goes into one
+    of them as JSON rather than into extras.
+    """
+    __slots__ = ("values", "extras")
+    columns: Tuple[str, ...] = ()
+    _index: Dict[str, int] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.columns = tuple(cls.columns)
+        cls._index = {column: i for i, column in enumerate(cls.columns)}
+
+    def __init__(self, fields: Optional[Mapping[str, Any]] = None, **kwargs):
+        self.values = [_MISSING] * len(self.columns)
+        self.extras: Optional[Dict[str, Any]] = None
+        if fields:
+            self.update(fields)
+        if kwargs:
+            self.update(kwargs)
+
+    def __getitem__(self, key: str) -> Any:
+        i = self._index.get(key)
+        if i is not None:
+            value = self.values[i]
+            if value is not _MISSING:
+                return value
+        elif self.extras is not None and key in self.extras:
+            return self.extras[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any):
+        i = self._index.get(key)
+        if i is not None:
+            self.values[i] = value
+        elif self.extras is None:
+            self.extras = {key: value}
+        else:
+            self.extras[key] = value
+
+    def __delitem__(self, key: str):
+        i = self._index.get(key)
+        if i is not None and self.values[i] is not _MISSING:
+            self.values[i] = _MISSING
+        elif i is None and self.extras is not None and key in self.extras:
+            del self.extras[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for column, value in zip(self.columns, self.values):
+            if value is not _MISSING:
+                yield column
+        if self.extras:
+            yield from self.extras
+
+    def __len__(self) -> int:
+        return len(self.values) - self.values.count(_MISSING) + len(self.extras or ())
+
+    def get(self, key: str, default: Any = None) -> Any:
+        # Called for every column of every exported row, so skip the KeyError of the Mapping version
+        i = self._index.get(key)
+        if i is not None:
+            value = self.values[i]
+            return default if value is _MISSING else value
+        if self.extras is not None:
+            return self.extras.get(key, default)
+        return default
+
+    def copy(self) -> "Record":
+        record = type(self)()
+        record.values = self.values.copy()
+        record.extras = self.extras.copy() if self.extras is not None else None
+        return record
+
+    __copy__ = copy
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    def __getstate__(self):
+        return self.values, self.extras
+
+    def __setstate__(self, state):
+        self.values, self.extras = state
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.as_dict()!r})"
+
+
+class ColumnBuilder:
+    """Collects records column by column, for a DataFrame without a list of
+    dicts in between.
+
+    The DataFrame has the columns given, like the streamed exports, and
+    keys of a record outside of them are dropped. With no columns given
+    it takes a column for each key, in the order they come up, empty for
+    the records before it.
+    """
+    def __init__(self, columns: Iterable[str] = ()):
+        self._columns: Dict[str, List[Any]] = {column: [] for column in columns}
+        self._fixed = tuple(self._columns)
+        self.n_rows = 0
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def append(self, record: Mapping[str, Any]):
+        if not self._fixed:
+            self._append_keys(record)
+        elif isinstance(record, Record) and record.columns == self._fixed:
+            # The record's values are already in column order
+            for values, value in zip(self._columns.values(), record.values):
+                values.append(None if value is _MISSING else value)
+        else:
+            for column in self._fixed:
+                self._columns[column].append(record.get(column))
+        self.n_rows += 1
+
+    def _append_keys(self, record: Mapping[str, Any]):
+        for key, value in record.items():
+            values = self._columns.get(key)
+            if values is None:
+                values = self._columns[key] = [None] * self.n_rows
+            values.append(value)
+        # Columns this record didn't have
+        for values in self._columns.values():
+            if len(values) == self.n_rows:
+                values.append(None)
+
+    def extend(self, records: Iterable[Mapping[str, Any]]):
+        for record in records:
+            self.append(record)
+
+    def to_frame(self) -> "pd.DataFrame":
+        # pandas takes a while to import, so it waits until a DataFrame is needed
+        import pandas as pd
+
+        return pd.DataFrame(self._columns, columns=list(self._columns))
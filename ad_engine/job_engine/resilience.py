@@ -0,0 +1,152 @@
+import random
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+
+class CircuitOpenException(Exception):
+    pass
+
+
+@dataclass
+class RetryPolicy:
+    """How often and how long to wait before requesting a page again.
+
+    Attributes:
+        attempts: Total number of attempts, including the first
+        base_delay: Backoff before the first retry, doubled on every retry
+        max_delay: Cap on a single backoff, including one asked for with Retry-After
+        retry_statuses: Response codes worth another attempt
+    """
+    attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 60.0
+    retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504)
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter backoff for the given retry, counting from 0.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def retry_after(self, headers) -> Optional[float]:
+        """Seconds to wait according to a Retry-After header, if there is one.
+        """
+        value = headers.get("Retry-After") if headers else None
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(self.max_delay, max(0.0, delay))
+
+
+class CircuitBreaker:
+    """Stops traffic to a board once it starts failing.
+
+    The circuit opens after failure_threshold consecutive failed requests
+    or captcha_threshold captchas. While open every request is refused
+    until reset_timeout has passed, then a single trial request is let
+    through and its outcome closes or reopens the circuit.
+    """
+    def __init__(self, failure_threshold: int = 10, captcha_threshold: int = 1, reset_timeout: float = 300):
+        self.failure_threshold = failure_threshold
+        self.captcha_threshold = captcha_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.captchas = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def check(self) -> bool:
+        """Raise CircuitOpenException if a request should not be sent.
+        Returns whether the request is the half open circuit's trial, which
+        has to end with record_success, record_failure or end_trial.
+        """
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial_in_flight):
+            raise CircuitOpenException(f"Circuit open after {self.failures} failures and {self.captchas} captchas")
+        if state == "half_open":
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def end_trial(self):
+        """Let another request be the trial, when the trial was cancelled or
+        failed in a way that says nothing about the board.
+        """
+        self._trial_in_flight = False
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.captchas = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold or self.state == "half_open":
+            self._open()
+
+    def record_captcha(self):
+        self.captchas += 1
+        if self.captchas >= self.captcha_threshold or self.state == "half_open":
+            self._open()
+
+    def info(self) -> Dict[str, object]:
+        return {"state": self.state, "failures": self.failures, "captchas": self.captchas}
+
+
+@dataclass
+class Failure:
+    stage: str
+    target: str
+    error: str
+
+
+@dataclass
+class FailureReport:
+    """What went wrong during a run, so completed listings can still be
+    returned alongside it. Only the first max_details failures are kept
+    in full, the counts cover all of them.
+    """
+    max_details: int = 100
+    counts: Dict[str, int] = field(default_factory=dict)
+    failures: List[Failure] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return sum(self.counts.values())
+
+    def add(self, stage: str, target: str, error: BaseException):
+        self.add_error(stage, target, type(error).__name__, str(error))
+
+    def add_error(self, stage: str, target: str, error_type: str, message: str = ""):
+        """Record a failure by the name of its exception, for errors raised in
+        another process, such as by a queue worker.
+        """
+        self.counts[error_type] = self.counts.get(error_type, 0) + 1
+        if len(self.failures) < self.max_details:
+            self.failures.append(Failure(stage, str(target), message or error_type))
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "total": len(self),
+            "counts": dict(self.counts),
+            "failures": [vars(failure) for failure in self.failures],
+        }
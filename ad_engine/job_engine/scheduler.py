@@ -0,0 +1,193 @@
+import asyncio
+import heapq
+import itertools
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Lower numbers are served first. Listing pages feed the detail pages, so
+# they should never sit behind a queue of detail fetches.
+PRIORITY_LISTING = 0
+PRIORITY_DETAIL = 1
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc
+
+
+@dataclass
+class HostLimits:
+    """Limits applied to every request sent to a single host.
+
+    Attributes:
+        max_concurrency: Maximum number of requests in flight at once
+        requests_per_second: Token bucket refill rate, None for no rate limit
+        burst: Token bucket capacity
+    """
+    max_concurrency: int = 10
+    requests_per_second: Optional[float] = None
+    burst: int = 1
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = None
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        if self._updated is not None:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def update(self, rate: float, capacity: int = 1):
+        """Change the rate and capacity, keeping the tokens already taken.
+        """
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = min(self._tokens, self.capacity)
+
+    async def acquire(self):
+        # The lock keeps the tokens handed out in arrival order
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            self._refill(loop.time())
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill(loop.time())
+            self._tokens -= 1
+
+
+@dataclass
+class _HostState:
+    limits: HostLimits
+    bucket: Optional[TokenBucket] = None
+    in_flight: int = 0
+    waiters: List[Tuple[int, int, asyncio.Future]] = field(default_factory=list)
+    requests: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    max_queue_depth: int = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, fut in self.waiters if not fut.done())
+
+
+class RequestScheduler:
+    """Hands out request slots per host.
+
+    Each host gets a concurrency cap and an optional token bucket. When a
+    host is saturated, waiting requests are woken in priority order so
+    listing pages overtake queued detail pages.
+    """
+    def __init__(self, default_limits: Optional[HostLimits] = None):
+        self.default_limits = default_limits or HostLimits()
+        self._hosts: Dict[str, _HostState] = {}
+        self._counter = itertools.count()
+
+    def configure(self, host: str, limits: HostLimits, overwrite: bool = True):
+        """Set the limits for a host. Requests already in flight are unaffected.
+        A rate limited host keeps its token bucket, so new limits don't come
+        with a fresh burst of tokens.
+        """
+        if host in self._hosts:
+            if not overwrite:
+                return
+            state = self._hosts[host]
+            state.limits = limits
+            if state.bucket and limits.requests_per_second:
+                state.bucket.update(limits.requests_per_second, limits.burst)
+            else:
+                state.bucket = self._make_bucket(limits)
+            self._wake(state)
+        else:
+            self._hosts[host] = _HostState(limits=limits, bucket=self._make_bucket(limits))
+
+    def limits(self, host: str) -> HostLimits:
+        return self._state(host).limits
+
+    @staticmethod
+    def _make_bucket(limits: HostLimits) -> Optional[TokenBucket]:
+        if limits.requests_per_second:
+            return TokenBucket(limits.requests_per_second, limits.burst)
+        return None
+
+    def _state(self, host: str) -> _HostState:
+        if host not in self._hosts:
+            self.configure(host, HostLimits(**vars(self.default_limits)))
+        return self._hosts[host]
+
+    def _wake(self, state: _HostState):
+        while state.waiters and state.in_flight < state.limits.max_concurrency:
+            _, _, fut = heapq.heappop(state.waiters)
+            if not fut.done():
+                state.in_flight += 1
+                fut.set_result(None)
+
+    def _release(self, state: _HostState):
+        state.in_flight -= 1
+        self._wake(state)
+
+    async def acquire(self, host: str, priority: int = PRIORITY_DETAIL):
+        state = self._state(host)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        if state.in_flight < state.limits.max_concurrency and not state.queue_depth:
+            state.in_flight += 1
+        else:
+            fut = loop.create_future()
+            heapq.heappush(state.waiters, (priority, next(self._counter), fut))
+            state.max_queue_depth = max(state.max_queue_depth, state.queue_depth)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                # We may have been handed a slot in the same tick we were cancelled
+                if fut.done() and not fut.cancelled():
+                    self._release(state)
+                raise
+
+        try:
+            if state.bucket:
+                await state.bucket.acquire()
+        except asyncio.CancelledError:
+            self._release(state)
+            raise
+
+        waited = loop.time() - start
+        state.requests += 1
+        state.total_wait += waited
+        state.max_wait = max(state.max_wait, waited)
+
+    def release(self, host: str):
+        self._release(self._state(host))
+
+    @asynccontextmanager
+    async def slot(self, url: str, priority: int = PRIORITY_DETAIL):
+        """Hold a request slot for the host of url for the duration of the block.
+        """
+        host = host_of(url)
+        await self.acquire(host, priority)
+        try:
+            yield
+        finally:
+            self.release(host)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            host: {
+                "max_concurrency": state.limits.max_concurrency,
+                "requests_per_second": state.limits.requests_per_second,
+                "in_flight": state.in_flight,
+                "queue_depth": state.queue_depth,
+                "max_queue_depth": state.max_queue_depth,
+                "requests": state.requests,
+                "mean_wait": state.total_wait / state.requests if state.requests else 0.0,
+                "max_wait": state.max_wait,
+            }
+            for host, state in self._hosts.items()
+        }
@@ -0,0 +1,153 @@
+import re
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+from job_engine.records import ColumnBuilder
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Column types of the typed exports. Columns an engine doesn't list in
+# column_types are strings.
+STRING = "string"
+CATEGORY = "category"
+DATE = "date"
+SALARY = "salary"
+LIST = "list"
+
+ColumnTypes = Dict[str, str]
+
+# A salary column is exported as its text followed by these columns, prefixed with its name
+SALARY_PARTS = ("min", "max", "period")
+
+_ordinal_re = re.compile(r"(\d+)(?:st|nd|rd|th)\b", re.IGNORECASE)
+_date_formats = ("%d %B %Y", "%d %b %Y", "%d/%m/%Y")
+# A number is only an amount if it has a currency sign or a k after it, "38 hours" isn't a salary
+_amount_re = re.compile(r"(?:[$£€]\s*)(\d[\d,]*(?:\.\d+)?)(\s*k\b)?|(\d[\d,]*(?:\.\d+)?)(\s*k\b)", re.IGNORECASE)
+_periods = (
+    ("hour", re.compile(r"\b(?:hour|hourly|hr|ph)\b", re.IGNORECASE)),
+    ("day", re.compile(r"\b(?:day|daily)\b", re.IGNORECASE)),
+    ("week", re.compile(r"\b(?:week|weekly|pw)\b", re.IGNORECASE)),
+    ("month", re.compile(r"\b(?:month|monthly)\b", re.IGNORECASE)),
+    ("year", re.compile(r"\b(?:year|yearly|annum|annual|pa|p\.a)\b", re.IGNORECASE)),
+)
+_up_to_re = re.compile(r"\bup to\b", re.IGNORECASE)
+_from_re = re.compile(r"\b(?:from|starting at)\b", re.IGNORECASE)
+
+
+def parse_date(value: Any) -> Optional[date]:
+    """The date of a board's listing date, such as 14th December 2021 on
+    Adzuna or an ISO timestamp on Seek. None if it can't be read.
+    """
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    value = str(value).strip()
+    try:
+        # fromisoformat doesn't take a Z until 3.11
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).date()
+    except ValueError:
+        pass
+    value = _ordinal_re.sub(r"\1", value)
+    for date_format in _date_formats:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_salary(value: Any) -> Tuple[Optional[float], Optional[float], Optional[str]]:
+    """(min, max, period) of a salary as the boards write it, such as
+    $85,000 - $95,000 per annum or $80k - $90k + super. Amounts are as
+    written, per period, which is hour, day, week, month, year or None.
+    """
+    if not value:
+        return None, None, None
+    value = str(value)
+    amounts = []
+    for match in _amount_re.finditer(value):
+        number, thousands = (match.group(1), match.group(2)) if match.group(1) else (match.group(3), match.group(4))
+        amount = float(number.replace(",", ""))
+        amounts.append(amount * 1000 if thousands else amount)
+    if not amounts:
+        return None, None, None
+    period = next((name for name, pattern in _periods if pattern.search(value)), None)
+    if len(amounts) == 1 and _up_to_re.search(value):
+        return None, amounts[0], period
+    if len(amounts) == 1 and _from_re.search(value):
+        return amounts[0], None, period
+    return amounts[0], amounts[-1], period
+
+
+def typed_columns(columns: List[str], column_types: ColumnTypes) -> List[str]:
+    """The columns of a typed export, with the parts of each salary after it.
+    """
+    typed = []
+    for column in columns:
+        typed.append(column)
+        if column_types.get(column) == SALARY:
+            typed.extend(f"{column}_{part}" for part in SALARY_PARTS)
+    return typed
+
+
+def type_record(record: Dict[str, Any], columns: List[str], column_types: ColumnTypes) -> Dict[str, Any]:
+    """record with its dates parsed and its salaries split into their parts.
+    Keys outside of columns are dropped.
+    """
+    typed = {}
+    for column in columns:
+        value = record.get(column)
+        column_type = column_types.get(column, STRING)
+        if column_type == DATE:
+            value = parse_date(value)
+        elif column_type == LIST:
+            value = list(value) if isinstance(value, (list, tuple)) else ([] if value in (None, "") else [value])
+        elif value == "":
+            value = None
+        typed[column] = value
+        if column_type == SALARY:
+            typed.update(zip((f"{column}_{part}" for part in SALARY_PARTS), parse_salary(value)))
+    return typed
+
+
+def typed_frame(records: Iterable[Dict[str, Any]], columns: List[str], column_types: ColumnTypes) -> "pd.DataFrame":
+    """A DataFrame of typed records, with categoricals and datetime columns.
+    """
+    import pandas as pd
+
+    builder = ColumnBuilder(typed_columns(columns, column_types))
+    builder.extend(records)
+    df = builder.to_frame()
+    for column in columns:
+        column_type = column_types.get(column, STRING)
+        if column_type == CATEGORY:
+            df[column] = df[column].astype("category")
+        elif column_type == DATE:
+            df[column] = pd.to_datetime(df[column])
+        elif column_type == SALARY:
+            df[f"{column}_min"] = df[f"{column}_min"].astype("float64")
+            df[f"{column}_max"] = df[f"{column}_max"].astype("float64")
+            df[f"{column}_period"] = df[f"{column}_period"].astype("category")
+    return df
+
+
+def arrow_schema(columns: List[str], column_types: ColumnTypes):
+    """The pyarrow schema of a typed export, so every export of a board has
+    the same types, even for a column that is empty this time.
+    """
+    import pyarrow as pa
+
+    category = pa.dictionary(pa.int32(), pa.string())
+    arrow_types = {STRING: pa.string(), CATEGORY: category, DATE: pa.date32(), SALARY: pa.string(), LIST: pa.list_(pa.string())}
+    schema = []
+    for column in columns:
+        column_type = column_types.get(column, STRING)
+        schema.append(pa.field(column, arrow_types[column_type]))
+        if column_type == SALARY:
+            schema.extend([
+                pa.field(f"{column}_min", pa.float64()),
+                pa.field(f"{column}_max", pa.float64()),
+                pa.field(f"{column}_period", category)])
+    return pa.schema(schema)
@@ -1,47 +1,87 @@
 import asyncio
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Union
-from bs4 import BeautifulSoup
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
 import re
 import json 
+from urllib.parse import quote
 
-from job_engine.engine import Scraper_Engine
-
-@dataclass
-class JobData:
-    id: str
-    listingDate: str
-    title: str
-    short_description: str
-    bulletpoints: List[str]
-    company: str
-    location: str
-    area: str
-    contract_type: str
-    category: str
-    subcategory: str
-    salary: str
-    description: Optional[str] = None
-    url: Optional[str] = None
-
-    def as_dict(self):
-        """Return a dataframe happy version of the object.
-        """
-        return {
-            "listingDate": self.listingDate,
-            "title": self.title,
-            "short_description": self.short_description,
-            "bulletpoints": self.bulletpoints,
-            "company": self.company,
-            "location": self.location,
-            "area": self.area,
-            "contract_type": self.contract_type,
-            "category": self.category,
-            "subcategory": self.subcategory,
-            "salary": self.salary,
-            "description": self.description,
-            "url": self.url,
-        }
+from job_engine.engine import RequestFailedException, Scraper_Engine
+from job_engine.extraction import Extractor, Rule, Strainer, string
+from job_engine.parsing import parse_document, reads_text
+from job_engine.partition import Choice
+from job_engine.records import Record
+from job_engine.schema import CATEGORY, DATE, SALARY
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+class SeekRecord(Record):
+    """Made from the search results, with the description and url filled
+    in once the job's own page has been read.
+    """
+    __slots__ = ()
+    columns = ('listingDate', 'title', 'short_description', 'bulletpoints', 'company', 'location', 'area',
+               'contract_type', 'category', 'subcategory', 'salary', 'description', 'url')
+
+
+REDUX_DATA_MARKER = "window.SEEK_REDUX_DATA = "
+# The payload is javascript, which can leave a value undefined where JSON needs null.
+# Strings are matched too, so the word is left alone inside them.
+_undefined_value_re = re.compile(r'("[^"\\]*(?:\\.[^"\\]*)*")|\bundefined\b')
+LISTING_HREF_RE = re.compile(r"/job/([0-9]+)")
+# The apostrophe may come through as an entity
+NO_RESULTS_RE = re.compile(r"Sorry, we couldn(?:'|&#x27;|&#39;|&apos;|’)t find anything\.")
+
+_json_decoder = json.JSONDecoder()
+
+def _null_if_undefined(match: re.Match) -> str:
+    return match.group(1) or "null"
+
+def read_redux_data(text: str) -> Optional[Dict]:
+    """The SEEK_REDUX_DATA payload embedded in a Seek page, or None if there
+    isn't one. The payload is one line, so only that line is decoded and
+    the rest of the page is never parsed. Decoding stops at the end of the
+    object, so whatever follows it on the line, a semicolon or the closing
+    script tag of a minified page, is left alone.
+    """
+    start = text.find(REDUX_DATA_MARKER)
+    if start == -1:
+        return None
+    start += len(REDUX_DATA_MARKER)
+    end = text.find("\n", start)
+    payload = text[start:end if end != -1 else len(text)].lstrip()
+    if "undefined" in payload:
+        payload = _undefined_value_re.sub(_null_if_undefined, payload)
+    return _json_decoder.raw_decode(payload)[0]
+
+def jobs_from_redux_data(data: Dict) -> Dict[str, SeekRecord]:
+    """The jobs of a search results payload by their id, in order.
+    """
+    return {
+        job['id']: SeekRecord(
+            listingDate = job['listingDate'],
+            title = job['title'],
+            short_description = job['teaser'],
+            # Joined as Seek shows them, so it's a string in every export
+            bulletpoints = ' '.join(job['bulletPoints']),
+            company = job['advertiser']['description'],
+            location = job['location'],
+            area = job['area'],
+            contract_type = job['workType'],
+            category = job['classification']['description'],
+            subcategory = job['subClassification']['description'],
+            salary = job['salary'],
+            description = None,
+            url = None) for job in data['results']['results']['jobs']}
+
+COUNT_EXTRACTOR = Extractor(
+    {'number_jobs': Rule('strong[data-automation="totalJobsCount"]', read=string, required=True)},
+    parse_only=Strainer('strong', attrs={'data-automation': 'totalJobsCount'}))
+LISTING_EXTRACTOR = Extractor(
+    {'server_state': Rule('script[data-automation="server-state"]', read=string, required=True)},
+    parse_only=Strainer('script', attrs={'data-automation': 'server-state'}))
+DETAIL_EXTRACTOR = Extractor(
+    {'description': Rule('div[data-automation="jobAdDetails"]', required=True)},
+    parse_only=Strainer('div', attrs={'data-automation': 'jobAdDetails'}))
 
 
 class SeekEngine(Scraper_Engine):
@@ -51,63 +91,109 @@ class SeekEngine(Scraper_Engine):
         self.job_number_per_page = 22 
         self.max_number_jobs = 200 
         self.page_query_option = "page"
+        self.max_concurrency = 8
+        self.requests_per_second = 5
         self.search_term = search_term
         self.query_contents = {
             'page' : 1
         }
-        self.listing_href_regex = re.compile("\/job\/([0-9]+)")
+        self.newest_first_query = {'sortmode': 'ListedDate'}
+        # Full time, part time, contract/temp and casual
+        self.partition_dimensions = [Choice('worktype', [242, 243, 244, 245])]
+        self.listing_href_regex = LISTING_HREF_RE
         self.listing_data = {} 
-        self.find_data_automation_tag = lambda soup, tag: soup.find('div', attrs={"data-automation": str(tag)})
-        self.find_data_automation_script = lambda soup, tag: soup.find('script', attrs={"data-automation": str(tag)})
+        self.columns = list(SeekRecord.columns)
+        self.board_name = "Seek"
+        self.normalised_fields = {
+            'listing_date': 'listingDate',
+        }
+        self.column_types = {
+            'listingDate': DATE, 'area': CATEGORY, 'contract_type': CATEGORY,
+            'category': CATEGORY, 'subcategory': CATEGORY, 'salary': SALARY}
+        self.count_extractor = COUNT_EXTRACTOR
+        self.listing_extractor = LISTING_EXTRACTOR
+        self.detail_extractor = DETAIL_EXTRACTOR
+        self.no_results_pattern = NO_RESULTS_RE
         # Make sure we call the post init method
         self.__post_init__()
-    
-    def get_query_uri(self, query_contents: List[str]) -> str:
-        """If a query contents is not none, 
-        then we add it to the search.
-        """
-        uri = self.api_url.format(search_term=self.search_term.replace(" ", "-"))
-        for query_tuple in query_contents.items():
-            if query_tuple[1] is not None:
-                uri += f"{query_tuple[0]}={query_tuple[1]}&"
-        return uri
-
-    def get_number_jobs(self, soup: BeautifulSoup) -> int:
-        return int(float(soup.find("strong", attrs={'data-automation': 'totalJobsCount'}).string.replace(',','')))
-
-    def check_if_no_results(self, soup) -> bool:
-        if "Sorry, we couldn't find anything." in soup.get_text():
-            return True 
-        return False
-
-    def get_listing_codes(self, soup: BeautifulSoup) -> List[str]:
-        listing_string = ''.join([line.strip().replace("window.SEEK_REDUX_DATA = ", "").replace("undefined","null")[:-1]
-            for line in self.find_data_automation_script(soup, "server-state").string.split("\n") 
-            if "SEEK_REDUX_DATA" in line])
-        json_data = json.loads(listing_string) 
-        jobs_list = json_data['results']['results']['jobs']
-        self.listing_data.update({
-            job['id'] : JobData( 
-                id = job['id'],
-                listingDate = job['listingDate'],
-                title = job['title'],
-                short_description = job['teaser'],
-                bulletpoints = ' '.join(job['bulletPoints']),
-                company = job['advertiser']['description'],
-                location = job['location'],
-                area = job['area'],
-                contract_type = job['workType'],
-                category = job['classification']['description'],
-                subcategory = job['subClassification']['description'],
-                salary = job['salary']) for job in jobs_list})
-
-        return [job.id for job in self.listing_data.values()]
-
-    def get_job_data(self, soup: BeautifulSoup, listing_code: Union[str, int]) -> Dict[str, str]:
-        self.listing_data[listing_code].description = self.find_data_automation_tag(soup, 'jobAdDetails').get_text().strip()
-        self.listing_data[listing_code].url = self.get_listing_uri(listing_code)
-
-        return self.listing_data[listing_code].as_dict()
+
+    # The listing data only lives on the event loop side, see store_listing_page
+    _runtime_attributes = Scraper_Engine._runtime_attributes + ("listing_data",)
+    _per_search_attributes = Scraper_Engine._per_search_attributes + ("listing_data",)
+    _task_attributes = Scraper_Engine._task_attributes + ("search_term",)
+    _template_args = ("",)
+
+    def query_base_uri(self, encode: bool = True) -> str:
+        # Seek takes the search terms in the path, with dashes between them
+        search_term = self.search_term.replace(" ", "-")
+        return self.api_url.format(search_term=quote(search_term) if encode else search_term)
+
+    def get_number_jobs(self, soup: "BeautifulSoup") -> int:
+        return int(float(self.count_extractor.extract(soup)['number_jobs'].replace(',','')))
+
+    def get_listing_jobs(self, soup: "BeautifulSoup") -> Dict[str, SeekRecord]:
+        return jobs_from_redux_data(read_redux_data(self.listing_extractor.extract(soup)['server_state']))
+
+    def get_listing_codes(self, soup: "BeautifulSoup") -> List[str]:
+        return list(self.get_listing_jobs(soup))
+
+    # Search pages, and usually job pages, embed their data as SEEK_REDUX_DATA,
+    # so these read it straight from the page text. The soup versions above
+    # are the fallback.
+
+    @reads_text
+    def _parse_number_jobs(self, text: str, status: int) -> int:
+        data = read_redux_data(text)
+        if data is not None and (total := data.get('results', {}).get('totalCount')) is not None:
+            return int(total)
+        return parse_document(super()._parse_number_jobs, text, self.parser_backend, status, parse_only=self.count_extractor.parse_only)
+
+    @reads_text
+    def read_listing_page(self, text: str, status: int) -> Dict[str, SeekRecord]:
+        data = read_redux_data(text)
+        if data is None:
+            raise RequestFailedException("No SEEK_REDUX_DATA on the listings page")
+        # The search results already carry most of the job data, so hand all of it back
+        return jobs_from_redux_data(data)
+
+    def store_listing_page(self, page_data: Dict[str, SeekRecord]) -> List[str]:
+        self.listing_data.update(page_data)
+        return list(page_data)
+
+    def get_job_data(self, soup: "BeautifulSoup", listing_code: Union[str, int]) -> Dict[str, str]:
+        return {
+            "description": self.detail_extractor.extract(soup)['description'],
+            "url": self.get_listing_uri(listing_code),
+        }
+
+    @reads_text
+    def read_job_listing(self, text: str, status: int, listing_code: str) -> Dict[str, str]:
+        data = read_redux_data(text) or {}
+        content = (data.get('jobdetails', {}).get('result') or {}).get('content')
+        if content is None:
+            return parse_document(super().read_job_listing, text, self.parser_backend, status, listing_code,
+                                  parse_only=self.detail_extractor.parse_only)
+        from bs4 import BeautifulSoup
+
+        # Only the description itself is parsed, not the page around it
+        return {
+            "description": BeautifulSoup(content, self.parser_backend).get_text().strip(),
+            "url": self.get_listing_uri(listing_code),
+        }
+
+    def detach_listing(self, listing_code) -> Optional[Dict[str, Any]]:
+        record = self.listing_data.pop(listing_code, None)
+        return None if record is None else dict(record)
+
+    def attach_listing(self, listing_code, listing: Dict[str, Any]):
+        self.listing_data[listing_code] = SeekRecord(listing)
+
+    def store_job_data(self, listing_code: str, job_data: Dict[str, str]) -> SeekRecord:
+        # Each listing is only fetched once a search, so there's no need to hold on to it
+        record = self.listing_data.pop(listing_code)
+        record['description'] = job_data['description']
+        record['url'] = job_data['url']
+        return record
 
 async def __test_main():
     async with SeekEngine("aboriginal") as se:
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+from job_engine.adzuna import AdzunaEngine
+from job_engine.engine import PageNotFoundException, Scraper_Engine
+from job_engine.indeed import IndeedEngine
+from job_engine.seek import SeekEngine
+from job_engine.work_queue import DETAIL_TASK, LISTING_TASK, Task, WorkQueue
+
+logger = logging.getLogger(__name__)
+
+ENGINES = {engine.__name__: engine for engine in (AdzunaEngine, IndeedEngine, SeekEngine)}
+
+# A listing that is gone will still be gone on the next attempt
+PERMANENT_ERRORS = (PageNotFoundException,)
+
+
+def engine_from_spec(spec: Dict[str, Any]) -> Scraper_Engine:
+    """Rebuild the engine a search was run with, see Scraper_Engine.task_spec.
+    """
+    return ENGINES[spec["engine"]].from_template(**spec["attributes"])
+
+
+async def run_task(engine: Scraper_Engine, task: Task) -> Dict[str, Any]:
+    """Fetch and parse the page of task with engine, which should be entered.
+    Returns the task's result, along with the time spent per phase.
+    """
+    payload = task.payload
+    if task.kind == LISTING_TASK:
+        listing_codes = await engine.process_listing_page(payload["page_n"], engine.page_query_option, payload["query"])
+        # Pairs, since JSON would turn the codes into strings as keys
+        result = {"listing_codes": listing_codes,
+                  "listings": [[listing_code, engine.detach_listing(listing_code)] for listing_code in listing_codes]}
+    elif task.kind == DETAIL_TASK:
+        if payload.get("listing") is not None:
+            engine.attach_listing(payload["listing_code"], payload["listing"])
+        record = await engine.process_job_listing(payload["listing_code"])
+        result = {"record": dict(record) if record else None}
+    else:
+        raise ValueError(f"Unknown task kind {task.kind}")
+    result["timing"] = engine.timing.phases
+    return result
+
+
+class QueueWorker:
+    """Runs the listing and detail page tasks of searches started by the API
+    process, see Scraper_Engine.iter_queued_data.
+
+    concurrency tasks run at once, each with an engine built from its
+    spec and passed through prepare_engine, which attaches the worker's
+    scheduler, session pool and caches. While a task runs its lease is
+    extended, so only a worker that goes away loses it.
+    """
+    def __init__(self, work_queue: WorkQueue, prepare_engine: Callable[[Scraper_Engine], Scraper_Engine] = lambda engine: engine,
+                 concurrency: int = 16, poll_interval: float = 0.05, max_poll_interval: float = 1, purge_after: Optional[float] = 3600):
+        self.work_queue = work_queue
+        self.prepare_engine = prepare_engine
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.purge_after = purge_after
+        self.completed = 0
+        self.failed = 0
+        self._stopped: Optional[asyncio.Event] = None
+
+    async def run(self):
+        """Take tasks until stop is called. Once a minute, the leftovers of
+        searches that are over and haven't been collected from for
+        purge_after seconds are dropped.
+        """
+        self._stopped = asyncio.Event()
+        loops = [asyncio.create_task(self._loop()) for _ in range(self.concurrency)]
+        try:
+            while not self._stopped.is_set():
+                if self.purge_after:
+                    await asyncio.to_thread(self.work_queue.purge, self.purge_after)
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), 60)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for loop in loops:
+                loop.cancel()
+            await asyncio.gather(*loops, return_exceptions=True)
+
+    def stop(self):
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def _loop(self):
+        idle = self.poll_interval
+        while True:
+            # The queue is a file or a server, so it's read and written off the event loop
+            task = await asyncio.to_thread(self.work_queue.lease)
+            if task is None:
+                # Back off while the queue is empty
+                await asyncio.sleep(idle)
+                idle = min(idle * 2, self.max_poll_interval)
+                continue
+            idle = self.poll_interval
+            await self.handle(task)
+
+    async def _keep_lease(self, task: Task):
+        while True:
+            await asyncio.sleep(self.work_queue.lease_seconds / 3)
+            if not await asyncio.to_thread(self.work_queue.extend, task):
+                # Cancelled, or taken over by another worker. Finishing is harmless, the first result counts.
+                return
+
+    async def handle(self, task: Task):
+        start = time.perf_counter()
+        keep_lease = asyncio.create_task(self._keep_lease(task))
+        try:
+            async with self.prepare_engine(engine_from_spec(task.payload["engine"])) as engine:
+                result = await run_task(engine, task)
+        except asyncio.CancelledError as e:
+            # Shutting down, back on the queue for another worker. Called in place, a cancelled task can't wait on a thread
+            self.work_queue.fail(task, e, retry=True)
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.warning("%s task %s failed on attempt %s: %s", task.kind, task.id, task.attempts, str(e) or type(e).__name__)
+            await asyncio.to_thread(self.work_queue.fail, task, e, retry=not isinstance(e, PERMANENT_ERRORS))
+        else:
+            self.completed += 1
+            await asyncio.to_thread(self.work_queue.complete, task, result)
+            logger.debug("%s task %s done in %.3fs", task.kind, task.id, time.perf_counter() - start)
+        finally:
+            keep_lease.cancel()
+
+    def info(self) -> Dict[str, Any]:
+        return {"concurrency": self.concurrency, "completed": self.completed, "failed": self.failed}
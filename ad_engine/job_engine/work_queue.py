@@ -0,0 +1,501 @@
+import functools
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from job_engine.scheduler import PRIORITY_DETAIL, PRIORITY_LISTING
+
+LISTING_TASK = "listing"
+DETAIL_TASK = "detail"
+
+# Listing pages first, as for requests, since each one queues detail pages
+TASK_PRIORITIES = {LISTING_TASK: PRIORITY_LISTING, DETAIL_TASK: PRIORITY_DETAIL}
+
+
+class WorkQueueUnavailableException(Exception):
+    pass
+
+
+@dataclass
+class Task:
+    """A listing or detail page of a search, as handed to a worker.
+
+    The worker holds the task until lease_expires, or longer if it calls
+    extend. Once a lease runs out the task goes back on the queue for
+    another worker.
+    """
+    id: str
+    search_id: str
+    kind: str
+    payload: Dict[str, Any]
+    attempts: int = 0
+    lease_token: Optional[str] = None
+    lease_expires: Optional[float] = None
+
+
+@dataclass
+class TaskResult:
+    """What came of a task, read back by the process running the search.
+    error_type is the name of the exception a failed task raised last.
+    """
+    seq: int
+    task_id: str
+    result: Optional[Dict[str, Any]] = None
+    error_type: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def failed(self) -> bool:
+        return self.error_type is not None
+
+
+class WorkQueue(ABC):
+    """Tasks shared between the API process and any number of workers.
+
+    put is idempotent, a task that is already queued under its id isn't
+    queued again. Workers lease a task, and complete or fail it. Only the
+    first completion of a task counts, so a worker whose lease ran out
+    while it was still working can't deliver a result twice. A failed
+    task is retried after retry_delay, doubling each time, until it has
+    been tried max_attempts times. Results are read in the order they
+    came in, after the seq of the last one read. Putting tasks or reading
+    results keeps a search active, so purge leaves it alone while it is
+    still being collected.
+
+    Every method blocks on a file or a server, so code on an event loop
+    calls them through asyncio.to_thread, from as many threads as it likes.
+    """
+    def __init__(self, lease_seconds: float = 30, max_attempts: int = 3, retry_delay: float = 1):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+    @abstractmethod
+    def put(self, search_id: str, task_id: str, kind: str, payload: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def lease(self) -> Optional[Task]:
+        ...
+
+    @abstractmethod
+    def extend(self, task: Task) -> bool:
+        """Push back the end of task's lease, False if it has been lost.
+        """
+
+    @abstractmethod
+    def complete(self, task: Task, result: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def fail(self, task: Task, error: BaseException, retry: bool = True):
+        ...
+
+    @abstractmethod
+    def results(self, search_id: str, after: int = 0) -> List[TaskResult]:
+        ...
+
+    @abstractmethod
+    def cancel(self, search_id: str):
+        """Drop the tasks and results of a search that is over.
+        """
+
+    @abstractmethod
+    def purge(self, max_age: float):
+        """Drop the tasks and results of searches left behind by an API
+        process that went down, those with no task queued or leased that
+        haven't been active for max_age seconds.
+        """
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        ...
+
+    def close(self):
+        pass
+
+    def backoff(self, attempts: int) -> float:
+        return self.retry_delay * 2 ** max(attempts - 1, 0)
+
+
+def _locked(method):
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return locked
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """Work queue in a SQLite file, for workers on the same machine or
+    sharing its volume.
+
+    Threads share the one connection, taking turns so that one thread's
+    statements can't land in another's transaction.
+    """
+    def __init__(self, path: str, lease_seconds: float = 30, max_attempts: int = 3, retry_delay: float = 1):
+        super().__init__(lease_seconds, max_attempts, retry_delay)
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=10)
+        # Reentrant, purge cancels searches
+        self._lock = threading.RLock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY, search_id TEXT NOT NULL, kind TEXT NOT NULL, priority INTEGER NOT NULL,
+                payload TEXT NOT NULL, state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL, lease_token TEXT, lease_expires REAL, created REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (state, priority, available_at);
+            CREATE INDEX IF NOT EXISTS tasks_search ON tasks (search_id);
+            CREATE TABLE IF NOT EXISTS results (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT, search_id TEXT NOT NULL, task_id TEXT NOT NULL,
+                result TEXT, error_type TEXT, error TEXT, created REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS results_search ON results (search_id, seq);
+            CREATE TABLE IF NOT EXISTS searches (search_id TEXT PRIMARY KEY, active REAL NOT NULL);
+        """)
+
+    def _transaction(self):
+        # Taken before reading, so two workers can't lease the same task
+        self._db.execute("BEGIN IMMEDIATE")
+
+    def _add_result(self, search_id: str, task_id: str, result: Optional[Dict[str, Any]] = None,
+                    error_type: Optional[str] = None, error: Optional[str] = None):
+        self._db.execute("INSERT INTO results (search_id, task_id, result, error_type, error, created) VALUES (?, ?, ?, ?, ?, ?)",
+                         (search_id, task_id, None if result is None else json.dumps(result), error_type, error, time.time()))
+
+    def _touch(self, search_id: str):
+        self._db.execute("INSERT OR REPLACE INTO searches VALUES (?, ?)", (search_id, time.time()))
+
+    @_locked
+    def put(self, search_id: str, task_id: str, kind: str, payload: Dict[str, Any]):
+        now = time.time()
+        self._db.execute(
+            "INSERT OR IGNORE INTO tasks (id, search_id, kind, priority, payload, state, available_at, created) VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+            (task_id, search_id, kind, TASK_PRIORITIES[kind], json.dumps(payload), now, now))
+        self._touch(search_id)
+
+    @_locked
+    def lease(self) -> Optional[Task]:
+        now = time.time()
+        self._transaction()
+        try:
+            # The workers holding these went away, or stalled
+            for task_id, search_id, attempts in self._db.execute(
+                    "SELECT id, search_id, attempts FROM tasks WHERE state = 'leased' AND lease_expires < ?", (now,)).fetchall():
+                if attempts >= self.max_attempts:
+                    self._db.execute("UPDATE tasks SET state = 'failed', lease_token = NULL WHERE id = ?", (task_id,))
+                    self._add_result(search_id, task_id, error_type="LeaseExpired", error=f"No worker finished it in {attempts} attempts")
+                else:
+                    self._db.execute("UPDATE tasks SET state = 'queued', lease_token = NULL, available_at = ? WHERE id = ?", (now, task_id))
+
+            row = self._db.execute(
+                "SELECT id, search_id, kind, payload, attempts FROM tasks WHERE state = 'queued' AND available_at <= ? "
+                "ORDER BY priority, available_at LIMIT 1", (now,)).fetchone()
+            if row is None:
+                self._db.execute("COMMIT")
+                return None
+
+            task_id, search_id, kind, payload, attempts = row
+            token, expires = uuid.uuid4().hex, now + self.lease_seconds
+            self._db.execute("UPDATE tasks SET state = 'leased', attempts = ?, lease_token = ?, lease_expires = ? WHERE id = ?",
+                             (attempts + 1, token, expires, task_id))
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return Task(task_id, search_id, kind, json.loads(payload), attempts + 1, token, expires)
+
+    @_locked
+    def extend(self, task: Task) -> bool:
+        expires = time.time() + self.lease_seconds
+        updated = self._db.execute("UPDATE tasks SET lease_expires = ? WHERE id = ? AND state = 'leased' AND lease_token = ?",
+                                   (expires, task.id, task.lease_token)).rowcount
+        if updated:
+            task.lease_expires = expires
+        return bool(updated)
+
+    @_locked
+    def complete(self, task: Task, result: Dict[str, Any]):
+        self._transaction()
+        try:
+            # Whoever finishes first, the result is the same
+            if self._db.execute("UPDATE tasks SET state = 'done', lease_token = NULL WHERE id = ? AND state IN ('queued', 'leased')",
+                                (task.id,)).rowcount:
+                self._add_result(task.search_id, task.id, result)
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    @_locked
+    def fail(self, task: Task, error: BaseException, retry: bool = True):
+        self._transaction()
+        try:
+            # A worker that lost its lease doesn't get a say any more
+            if retry and task.attempts < self.max_attempts:
+                self._db.execute("UPDATE tasks SET state = 'queued', lease_token = NULL, available_at = ? WHERE id = ? AND lease_token = ?",
+                                 (time.time() + self.backoff(task.attempts), task.id, task.lease_token))
+            elif self._db.execute("UPDATE tasks SET state = 'failed', lease_token = NULL WHERE id = ? AND lease_token = ?",
+                                  (task.id, task.lease_token)).rowcount:
+                self._add_result(task.search_id, task.id, error_type=type(error).__name__, error=str(error))
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    @_locked
+    def results(self, search_id: str, after: int = 0) -> List[TaskResult]:
+        rows = self._db.execute(
+            "SELECT seq, task_id, result, error_type, error FROM results WHERE search_id = ? AND seq > ? ORDER BY seq",
+            (search_id, after)).fetchall()
+        # An empty poll doesn't need to count, the search has tasks out or nothing left to read
+        if rows:
+            self._touch(search_id)
+        return [TaskResult(seq, task_id, None if result is None else json.loads(result), error_type, error)
+                for seq, task_id, result, error_type, error in rows]
+
+    @_locked
+    def cancel(self, search_id: str):
+        self._db.execute("DELETE FROM tasks WHERE search_id = ?", (search_id,))
+        self._db.execute("DELETE FROM results WHERE search_id = ?", (search_id,))
+        self._db.execute("DELETE FROM searches WHERE search_id = ?", (search_id,))
+
+    @_locked
+    def purge(self, max_age: float):
+        idle = self._db.execute(
+            "SELECT search_id FROM searches WHERE active < ? AND NOT EXISTS ("
+            "SELECT 1 FROM tasks WHERE tasks.search_id = searches.search_id AND state IN ('queued', 'leased'))",
+            (time.time() - max_age,)).fetchall()
+        for search_id, in idle:
+            self.cancel(search_id)
+
+    @_locked
+    def stats(self) -> Dict[str, int]:
+        stats = {state: 0 for state in ("queued", "leased", "done", "failed")}
+        stats.update(self._db.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+        stats["results"] = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return stats
+
+    @_locked
+    def close(self):
+        self._db.close()
+
+
+# KEYS: task, ready queue, search's tasks, searches by when last active. ARGV: task id, search id, kind, payload, now
+_PUT_SCRIPT = """
+redis.call('ZADD', KEYS[4], ARGV[5], ARGV[2])
+if redis.call('EXISTS', KEYS[1]) == 1 then return 0 end
+redis.call('HSET', KEYS[1], 'search_id', ARGV[2], 'kind', ARGV[3], 'payload', ARGV[4], 'state', 'queued',
+           'attempts', 0, 'created', ARGV[5])
+redis.call('ZADD', KEYS[2], ARGV[5], ARGV[1])
+redis.call('SADD', KEYS[3], ARGV[1])
+return 1
+"""
+
+# KEYS: leased, ready queues by priority. ARGV: prefix, now, lease seconds, max attempts, token
+_LEASE_SCRIPT = """
+local prefix, now = ARGV[1], tonumber(ARGV[2])
+for _, task_id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now)) do
+    local key = prefix .. 'task:' .. task_id
+    redis.call('ZREM', KEYS[1], task_id)
+    local fields = redis.call('HMGET', key, 'attempts', 'kind', 'search_id')
+    if fields[1] then
+        if tonumber(fields[1]) >= tonumber(ARGV[4]) then
+            redis.call('HSET', key, 'state', 'failed', 'lease_token', '')
+            redis.call('SADD', prefix .. 'failed', task_id)
+            local seq = redis.call('INCR', prefix .. 'seq')
+            redis.call('RPUSH', prefix .. 'results:' .. fields[3], cjson.encode({seq, task_id, false, 'LeaseExpired',
+                'No worker finished it in ' .. fields[1] .. ' attempts', now}))
+        else
+            redis.call('HSET', key, 'state', 'queued', 'lease_token', '')
+            redis.call('ZADD', prefix .. 'ready:' .. fields[2], now, task_id)
+        end
+    end
+end
+for i = 2, #KEYS do
+    local task_id = redis.call('ZRANGEBYSCORE', KEYS[i], '-inf', now, 'LIMIT', 0, 1)[1]
+    if task_id then
+        local key = prefix .. 'task:' .. task_id
+        redis.call('ZREM', KEYS[i], task_id)
+        local attempts = redis.call('HINCRBY', key, 'attempts', 1)
+        local expires = now + tonumber(ARGV[3])
+        redis.call('HSET', key, 'state', 'leased', 'lease_token', ARGV[5])
+        redis.call('ZADD', KEYS[1], expires, task_id)
+        local fields = redis.call('HMGET', key, 'search_id', 'kind', 'payload')
+        return {task_id, fields[1], fields[2], fields[3], attempts, tostring(expires)}
+    end
+end
+return false
+"""
+
+# KEYS: task, leased. ARGV: task id, token, expires
+_EXTEND_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'state') ~= 'leased' or redis.call('HGET', KEYS[1], 'lease_token') ~= ARGV[2] then return 0 end
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+return 1
+"""
+
+# KEYS: task, leased, results, seq, done. ARGV: task id, result, now
+_COMPLETE_SCRIPT = """
+local state = redis.call('HGET', KEYS[1], 'state')
+if state ~= 'queued' and state ~= 'leased' then return 0 end
+redis.call('HSET', KEYS[1], 'state', 'done', 'lease_token', '')
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('SADD', KEYS[5], ARGV[1])
+redis.call('RPUSH', KEYS[3], cjson.encode({redis.call('INCR', KEYS[4]), ARGV[1], ARGV[2], false, false, tonumber(ARGV[3])}))
+return 1
+"""
+
+# KEYS: task, leased, ready queue, results, seq, failed. ARGV: task id, token, retry at or '' to give up, error type, error, now
+_FAIL_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'state') ~= 'leased' or redis.call('HGET', KEYS[1], 'lease_token') ~= ARGV[2] then return 0 end
+redis.call('ZREM', KEYS[2], ARGV[1])
+if ARGV[3] ~= '' then
+    redis.call('HSET', KEYS[1], 'state', 'queued', 'lease_token', '')
+    redis.call('ZADD', KEYS[3], ARGV[3], ARGV[1])
+else
+    redis.call('HSET', KEYS[1], 'state', 'failed', 'lease_token', '')
+    redis.call('SADD', KEYS[6], ARGV[1])
+    redis.call('RPUSH', KEYS[4], cjson.encode({redis.call('INCR', KEYS[5]), ARGV[1], false, ARGV[4], ARGV[5], tonumber(ARGV[6])}))
+end
+return 1
+"""
+
+
+class RedisWorkQueue(WorkQueue):
+    """Work queue on a Redis server, or anything that speaks its protocol
+    and runs its Lua scripts, for workers spread over several machines.
+
+    Every change is made by a script, so it happens at once for every
+    worker. Keys are prefixed with name, so queues can share a server.
+    """
+    def __init__(self, url: str, name: str = "ad_engine", lease_seconds: float = 30, max_attempts: int = 3,
+                 retry_delay: float = 1, client=None):
+        super().__init__(lease_seconds, max_attempts, retry_delay)
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise WorkQueueUnavailableException("The Redis work queue needs redis installed")
+            client = redis.Redis.from_url(url)
+        self._redis = client
+        self.prefix = f"{name}:"
+        self._put = client.register_script(_PUT_SCRIPT)
+        self._lease = client.register_script(_LEASE_SCRIPT)
+        self._extend = client.register_script(_EXTEND_SCRIPT)
+        self._complete = client.register_script(_COMPLETE_SCRIPT)
+        self._fail = client.register_script(_FAIL_SCRIPT)
+        # Search id -> (seq, index) of the last result read, so a poll only reads what came in since
+        self._read: Dict[str, Tuple[int, int]] = {}
+
+    def _key(self, *parts) -> str:
+        return self.prefix + ":".join(str(part) for part in parts)
+
+    def put(self, search_id: str, task_id: str, kind: str, payload: Dict[str, Any]):
+        self._put(keys=[self._key("task", task_id), self._key("ready", kind), self._key("search", search_id), self._key("searches")],
+                  args=[task_id, search_id, kind, json.dumps(payload), time.time()])
+
+    def lease(self) -> Optional[Task]:
+        token = uuid.uuid4().hex
+        ready = [self._key("ready", kind) for kind, _ in sorted(TASK_PRIORITIES.items(), key=lambda item: item[1])]
+        leased = self._lease(keys=[self._key("leased")] + ready,
+                             args=[self.prefix, time.time(), self.lease_seconds, self.max_attempts, token])
+        if not leased:
+            return None
+        task_id, search_id, kind, payload, attempts, expires = (value.decode() if isinstance(value, bytes) else value for value in leased)
+        return Task(task_id, search_id, kind, json.loads(payload), int(attempts), token, float(expires))
+
+    def extend(self, task: Task) -> bool:
+        expires = time.time() + self.lease_seconds
+        extended = self._extend(keys=[self._key("task", task.id), self._key("leased")], args=[task.id, task.lease_token, expires])
+        if extended:
+            task.lease_expires = expires
+        return bool(extended)
+
+    def complete(self, task: Task, result: Dict[str, Any]):
+        self._complete(keys=[self._key("task", task.id), self._key("leased"), self._key("results", task.search_id), self._key("seq"),
+                             self._key("done")],
+                       args=[task.id, json.dumps(result), time.time()])
+
+    def fail(self, task: Task, error: BaseException, retry: bool = True):
+        retry_at = time.time() + self.backoff(task.attempts) if retry and task.attempts < self.max_attempts else ""
+        self._fail(keys=[self._key("task", task.id), self._key("leased"), self._key("ready", task.kind),
+                         self._key("results", task.search_id), self._key("seq"), self._key("failed")],
+                   args=[task.id, task.lease_token, retry_at, type(error).__name__, str(error), time.time()])
+
+    def results(self, search_id: str, after: int = 0) -> List[TaskResult]:
+        # Results are pushed in seq order, so only the tail past the last one read is new
+        last_seq, start = self._read.get(search_id, (0, 0))
+        if after != last_seq:
+            start = 0
+        entries = self._redis.lrange(self._key("results", search_id), start, -1)
+        results = []
+        for entry in entries:
+            seq, task_id, result, error_type, error, _ = json.loads(entry)
+            if seq > after:
+                results.append(TaskResult(seq, task_id, json.loads(result) if result else None, error_type or None, error or None))
+        if entries:
+            self._read[search_id] = (json.loads(entries[-1])[0], start + len(entries))
+            self._redis.zadd(self._key("searches"), {search_id: time.time()})
+        return results
+
+    def cancel(self, search_id: str):
+        task_ids = [task_id.decode() if isinstance(task_id, bytes) else task_id
+                    for task_id in self._redis.smembers(self._key("search", search_id))]
+        pipeline = self._redis.pipeline()
+        for task_id in task_ids:
+            pipeline.delete(self._key("task", task_id))
+            pipeline.zrem(self._key("leased"), task_id)
+            pipeline.srem(self._key("done"), task_id)
+            pipeline.srem(self._key("failed"), task_id)
+            for kind in TASK_PRIORITIES:
+                pipeline.zrem(self._key("ready", kind), task_id)
+        pipeline.delete(self._key("search", search_id), self._key("results", search_id))
+        pipeline.zrem(self._key("searches"), search_id)
+        pipeline.execute()
+        self._read.pop(search_id, None)
+
+    def purge(self, max_age: float):
+        for search_id in self._redis.zrangebyscore(self._key("searches"), "-inf", time.time() - max_age):
+            search_id = search_id.decode() if isinstance(search_id, bytes) else search_id
+            pipeline = self._redis.pipeline()
+            for task_id in self._redis.smembers(self._key("search", search_id)):
+                pipeline.hget(self._key("task", task_id.decode() if isinstance(task_id, bytes) else task_id), "state")
+            states = [state.decode() if isinstance(state, bytes) else state for state in pipeline.execute()]
+            if "queued" not in states and "leased" not in states:
+                self.cancel(search_id)
+
+    def stats(self) -> Dict[str, int]:
+        pipeline = self._redis.pipeline()
+        for kind in TASK_PRIORITIES:
+            pipeline.zcard(self._key("ready", kind))
+        pipeline.zcard(self._key("leased"))
+        pipeline.scard(self._key("done"))
+        pipeline.scard(self._key("failed"))
+        for search_id in self._redis.zrange(self._key("searches"), 0, -1):
+            pipeline.llen(self._key("results", search_id.decode() if isinstance(search_id, bytes) else search_id))
+        counts = pipeline.execute()
+        queued = sum(counts[:len(TASK_PRIORITIES)])
+        leased, done, failed = counts[len(TASK_PRIORITIES):len(TASK_PRIORITIES) + 3]
+        return {"queued": queued, "leased": leased, "done": done, "failed": failed,
+                "results": sum(counts[len(TASK_PRIORITIES) + 3:])}
+
+    def close(self):
+        self._redis.close()
+
+
+def open_work_queue(url: str, **options) -> WorkQueue:
+    """The work queue at url, sqlite:///path/to/file.sqlite or redis://host:port/db.
+    """
+    scheme = urlparse(url).scheme
+    if scheme == "sqlite":
+        return SQLiteWorkQueue(url[len("sqlite:///"):], **options)
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisWorkQueue(url, **options)
+    raise WorkQueueUnavailableException(f"Unknown work queue {url}, use sqlite:///path or redis://host")
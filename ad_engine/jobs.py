@@ -0,0 +1,175 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, Optional
+
+from job_engine import SearchProgress
+from job_engine.export import export_extension
+
+
+class JobQueueFullException(Exception):
+    pass
+
+
+@dataclass
+class SearchJob:
+    """A search queued through the jobs API.
+
+    While the job runs, engine is the engine doing the work and its
+    progress is read straight from it. Once the job ends the progress and
+    failures are copied over and the engine is let go.
+    """
+    id: str
+    params: Dict[str, Any]
+    status: str = "queued"
+    message: Optional[str] = None
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    progress: Dict[str, int] = field(default_factory=lambda: SearchProgress().as_dict())
+    failures: Optional[Dict[str, Any]] = None
+    timing: Optional[Dict[str, Dict[str, float]]] = None
+    engine: Any = None
+
+    def attach(self, engine):
+        self.engine = engine
+
+    def detach(self):
+        if self.engine is not None:
+            if self.engine.progress is not None:
+                self.progress = self.engine.progress.as_dict()
+            if self.engine.failures is not None:
+                self.failures = self.engine.failures.as_dict()
+            if self.engine.timing is not None:
+                self.timing = self.engine.timing.as_dict()
+            self.engine = None
+
+    def info(self) -> Dict[str, Any]:
+        progress, failures, timing = self.progress, self.failures, self.timing
+        if self.engine is not None:
+            if self.engine.progress is not None:
+                progress = self.engine.progress.as_dict()
+            if self.engine.failures is not None:
+                failures = self.engine.failures.as_dict()
+            if self.engine.timing is not None:
+                timing = self.engine.timing.as_dict()
+        return {
+            "id": self.id,
+            "status": self.status,
+            "message": self.message,
+            "params": self.params,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "progress": progress,
+            "failures": failures,
+            "timing": timing,
+        }
+
+
+class JobManager:
+    """Runs queued searches on a fixed number of worker tasks.
+
+    run_search is called with the job and an open binary file to write the
+    export to, named for the job's export format. The export and the job's metadata are kept in results_dir,
+    so finished jobs can still be downloaded after a restart.
+    """
+    def __init__(self, run_search: Callable[[SearchJob, BinaryIO], Awaitable[None]], results_dir: str,
+                 workers: int = 2, max_queued: int = 100):
+        self.run_search = run_search
+        self.results_dir = results_dir
+        self.workers = workers
+        self.max_queued = max_queued
+        self.jobs: Dict[str, SearchJob] = {}
+        # Made in start, so it belongs to the server's event loop
+        self._queue: Optional["asyncio.Queue[SearchJob]"] = None
+        self._worker_tasks = []
+
+    def result_path(self, job: SearchJob) -> str:
+        # Jobs queued before the export formats were added are CSV
+        extension = export_extension(job.params.get("format", "csv"), job.params.get("compression", "none"))
+        return os.path.join(self.results_dir, f"{job.id}.{extension}")
+
+    def _metadata_path(self, job_id: str) -> str:
+        return os.path.join(self.results_dir, f"{job_id}.json")
+
+    def _save(self, job: SearchJob):
+        path = self._metadata_path(job.id)
+        with open(path + ".tmp", "w") as f:
+            json.dump(job.info(), f)
+        os.replace(path + ".tmp", path)
+
+    def _load(self):
+        for filename in os.listdir(self.results_dir):
+            if not filename.endswith(".json"):
+                continue
+            with open(os.path.join(self.results_dir, filename)) as f:
+                info = json.load(f)
+            job = SearchJob(**{key: value for key, value in info.items() if key in SearchJob.__dataclass_fields__})
+            if job.status in ("queued", "running"):
+                # We went down before it finished
+                job.status = "failed"
+                job.message = "Interrupted by a restart"
+                self._save(job)
+            self.jobs[job.id] = job
+
+    async def start(self):
+        os.makedirs(self.results_dir, exist_ok=True)
+        self._load()
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def submit(self, params: Dict[str, Any]) -> SearchJob:
+        job = SearchJob(id=uuid.uuid4().hex, params=params)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFullException(f"There are already {self._queue.qsize()} searches queued")
+        self.jobs[job.id] = job
+        self._save(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[SearchJob]:
+        return self.jobs.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: SearchJob):
+        job.status = "running"
+        job.started = time.time()
+        self._save(job)
+
+        path = self.result_path(job)
+        try:
+            with open(path + ".tmp", "wb") as output:
+                await self.run_search(job, output)
+            os.replace(path + ".tmp", path)
+            job.status = "done"
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.message = "Cancelled on shutdown"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.message = str(e) or type(e).__name__
+        finally:
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+            job.detach()
+            job.finished = time.time()
+            self._save(job)
@@ -1,10 +1,25 @@
-from fastapi import FastAPI
-from fastapi.responses import StreamingResponse, RedirectResponse
-from typing import Optional, Literal, Union
-import io
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse, RedirectResponse
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional, Literal, Union
+from contextlib import AsyncExitStack
+import asyncio
+import logging
+import aiohttp
 from datetime import date
 
-from job_engine import AdzunaEngine, IndeedEngine, SeekEngine, CaptchaException
+from job_engine import AdzunaEngine, IndeedEngine, SeekEngine, CaptchaException, RequestScheduler, ParseExecutor, \
+    PoolLimits, SessionPool, \
+    ListingCache, MemoryCache, DiskCache, ListingStore, CircuitBreaker, CircuitOpenException, PageNotFoundException, \
+    RequestFailedException
+from job_engine.export import ExportUnavailableException, check_export, export_extension, export_media_type, stream_export
+from job_engine.fanout import FanOutSearch
+from job_engine.metrics import REGISTRY, SEARCHES_IN_FLIGHT
+from job_engine.politeness import AIMDPolicy, PolitenessController
+from job_engine.work_queue import WorkQueue, open_work_queue
+from coalescing import ResultCache, SearchCoalescer, SearchFlight
+from jobs import JobManager, JobQueueFullException, SearchJob
+from settings import settings
 
 app = FastAPI(
     title="Job board scraper",
@@ -16,92 +31,552 @@ app = FastAPI(
     }
 )
 
+logger = logging.getLogger(__name__)
+
+# Shared between requests so the per-host limits hold across concurrent searches
+scheduler = RequestScheduler()
+# Keeps connections to the boards open from one search to the next
+session_pool: Optional[SessionPool] = None
+# One per board, so a board that is blocking us is left alone by every search
+circuit_breakers = {}
+parse_executor: Optional[ParseExecutor] = None
+listing_cache: Optional[ListingCache] = None
+listing_store: Optional[ListingStore] = None
+# Full searches go to worker.py processes through this, when one is configured
+work_queue: Optional[WorkQueue] = None
+# Identical /search calls share one scrape, and its export for a while after
+search_coalescer: Optional[SearchCoalescer] = None
+# Tunes the scheduler's limits for each board to what it currently accepts
+politeness: Optional[PolitenessController] = None
+
+@app.on_event("startup")
+async def startup():
+    global session_pool, parse_executor, listing_cache, listing_store, work_queue, search_coalescer, politeness
+    session_pool = SessionPool(PoolLimits(
+        keepalive_timeout=settings.pool_keepalive_timeout,
+        dns_ttl=settings.pool_dns_ttl,
+        connect_timeout=settings.pool_connect_timeout))
+    if settings.parse_executor != 'none':
+        parse_executor = ParseExecutor(settings.parse_executor, settings.parse_workers)
+    listing_cache = ListingCache(
+        MemoryCache(settings.cache_memory_entries),
+        DiskCache(settings.cache_disk_path, settings.cache_disk_entries) if settings.cache_disk_path else None)
+    listing_store = ListingStore(settings.listing_store_path)
+    if settings.work_queue_url:
+        work_queue = open_work_queue(
+            settings.work_queue_url, lease_seconds=settings.work_queue_lease_seconds, max_attempts=settings.work_queue_max_attempts)
+    search_coalescer = SearchCoalescer(ResultCache(
+        settings.search_cache_entries, settings.search_cache_bytes, settings.search_cache_ttl))
+    if settings.adaptive_politeness:
+        politeness = PolitenessController(scheduler, settings.politeness_path, AIMDPolicy(
+            max_factor=settings.politeness_max_factor, captcha_grace=settings.politeness_captcha_grace))
+
+@app.on_event("shutdown")
+async def shutdown():
+    if search_coalescer:
+        await search_coalescer.close()
+    if session_pool:
+        await session_pool.close()
+    if parse_executor:
+        parse_executor.shutdown()
+    if listing_cache:
+        listing_cache.close()
+    if listing_store:
+        listing_store.close()
+    if work_queue:
+        work_queue.close()
+    if politeness:
+        politeness.close()
+
+def use_shared_resources(engine):
+    """Attach the app wide resources to a freshly built engine.
+    """
+    engine.scheduler = scheduler
+    engine.session_pool = session_pool
+    engine.parse_executor = parse_executor
+    engine.parser_backend = settings.parser_backend
+    engine.cache = listing_cache
+    engine.circuit_breaker = circuit_breakers.setdefault(type(engine).__name__, CircuitBreaker())
+    engine.politeness = politeness
+    return engine
+
+def build_engine(
+        job_board: str,
+        search_just_title_or_title_and_description: str,
+        search_terms: str,
+        results_must_include_every_term: str):
+    """Generate a new engine instance for the board with the search terms in its query.
+    Engines are cloned from the board's template rather than built from scratch.
+    """
+    if job_board == 'Adzuna':
+        engine = AdzunaEngine.from_template()
+
+        # This is where we define how the search search_terms are matched to the jobs in the adzuna database
+        if search_just_title_or_title_and_description == 'just_title':
+            engine.query_contents['qtl'] = search_terms
+        elif results_must_include_every_term == 'true':
+            engine.query_contents['qph'] = search_terms
+        else:
+            engine.query_contents['qor'] = search_terms
+
+    elif job_board == 'Indeed':
+        engine = IndeedEngine.from_template()
+
+        # This is where we define how the search search_terms are matched to the jobs in the indeed database
+        if search_just_title_or_title_and_description == 'just_title':
+            engine.query_contents['as_ttl'] = search_terms
+        elif results_must_include_every_term == 'true':
+            engine.query_contents['as_and'] = search_terms
+        else:
+            engine.query_contents['as_any'] = search_terms
+
+    elif job_board == 'Seek':
+        # Seek only takes the search terms in the path
+        engine = SeekEngine.from_template(search_term=search_terms)
+
+    return use_shared_resources(engine)
+
+# Errors that mean the board can't be searched right now, rather than a bug
+SEARCH_ERRORS = (CaptchaException, CircuitOpenException, PageNotFoundException, RequestFailedException,
+    aiohttp.ClientError, asyncio.TimeoutError)
+
+async def enter_search(exit_stack: AsyncExitStack, engine, exhaustive: bool = False):
+    """Enter engine on exit_stack and return it along with its number of pages.
+    With exhaustive, the search is partitioned so it isn't cut off at the board's page limit.
+    """
+    engine = await exit_stack.enter_async_context(engine)
+    if exhaustive:
+        return engine, await engine.plan_partitions()
+    return engine, await engine.get_number_of_pages()
+
+async def open_search(exit_stack: AsyncExitStack, concurrency_budget: Optional[asyncio.Semaphore] = None,
+        exhaustive: bool = False, **search_parameters):
+    """Build a new engine for the search and enter it, see enter_search.
+    """
+    engine = build_engine(**search_parameters)
+    engine.concurrency_budget = concurrency_budget
+    return await enter_search(exit_stack, engine, exhaustive)
+
+# full: every listing. new: only listings not returned by an earlier run of the same search.
+# snapshot: the new listings followed by every listing earlier runs returned.
+SearchMode = Literal['full', 'new', 'snapshot']
+
+def iter_search(engine, n_pages: int, mode: SearchMode = 'full'):
+    if mode == 'full' and work_queue:
+        return engine.iter_queued_data(
+            n_pages, work_queue, settings.work_queue_poll_interval, settings.work_queue_stall_timeout)
+    if mode == 'full':
+        return engine.iter_data(n_pages)
+    return engine.iter_new_data(n_pages, listing_store, snapshot=mode == 'snapshot')
+
+# csv is the listings as the board shows them, the others are typed, see stream_export
+ExportType = Literal['csv', 'ndjson', 'parquet', 'arrow']
+# Compresses csv and ndjson as they stream, and the columns of parquet and arrow files
+ExportCompression = Literal['none', 'gzip', 'zstd']
+
+def search_report(engine) -> Dict[str, Any]:
+    """What a finished search missed, how far it got and where its time went, for the end of its export.
+    """
+    return {"failures": engine.failures.as_dict() if engine.failures is not None else None,
+            "progress": engine.progress.as_dict() if engine.progress is not None else None,
+            "timing": engine.timing.as_dict()}
+
+async def stream_engine_export(engine, n_pages: int, exit_stack: AsyncExitStack, mode: SearchMode = 'full',
+        export_format: ExportType = 'csv', compression: ExportCompression = 'none', log_timing: bool = False,
+        report: bool = False):
+    """Stream the engine's listings in export_format, closing the engine once the stream ends.
+    With report, an ndjson export ends with the search's report.
+    """
+    async with exit_stack:
+        with SEARCHES_IN_FLIGHT.track(endpoint="search"):
+            async for chunk in stream_export(
+                    iter_search(engine, n_pages, mode), engine.columns, engine.column_types, export_format, compression, engine.timing,
+                    (lambda: search_report(engine)) if report else None):
+                yield chunk
+
+        # The rows have already been sent, so unless there's a report all we can do is log what was missed
+        if engine.failures:
+            logger.warning("%s search finished with failures: %s", type(engine).__name__, engine.failures.as_dict())
+        if engine.progress is not None and engine.progress.duplicates_dropped:
+            logger.info("%s search dropped %s duplicate listings", type(engine).__name__, engine.progress.duplicates_dropped)
+        engine.timing.observe(engine.board_name)
+        if log_timing:
+            logger.info("%s search timing: %s", type(engine).__name__, engine.timing.as_dict())
+
+async def stream_fanout_export(fanout: FanOutSearch, exit_stack: AsyncExitStack,
+        export_format: ExportType = 'csv', compression: ExportCompression = 'none', log_timing: bool = False):
+    """Stream the merged listings of a fan out search in export_format, closing its engines once the stream ends.
+    """
+    async with exit_stack:
+        with SEARCHES_IN_FLIGHT.track(endpoint="fanout"):
+            async for chunk in stream_export(fanout.iter_data(), fanout.columns, fanout.column_types, export_format, compression):
+                yield chunk
+
+        if failures := fanout.failures():
+            logger.warning("Fan out search finished with failures: %s", failures)
+        for engine, _ in fanout.engines:
+            if engine.progress is not None and engine.progress.duplicates_dropped:
+                logger.info("%s search dropped %s duplicate listings", type(engine).__name__, engine.progress.duplicates_dropped)
+            engine.timing.observe(engine.board_name)
+            if log_timing:
+                logger.info("%s search timing: %s", type(engine).__name__, engine.timing.as_dict())
+
+def coalescing_key(engine, exhaustive: bool, export_format: ExportType, compression: ExportCompression) -> str:
+    """Identifies a search and its export, whatever the case or spacing of its terms.
+    """
+    return f"{engine.search_key().casefold()}|exhaustive={exhaustive}|{export_format}|{compression}"
+
+async def run_shared_search(flight: SearchFlight, engine, exhaustive: bool,
+        export_format: ExportType = 'csv', compression: ExportCompression = 'none') -> bool:
+    """Run a search for every request following flight. Returns whether its
+    export can be cached, which it can't be if any listings were missed.
+    """
+    exit_stack = AsyncExitStack()
+    try:
+        engine, n_pages = await enter_search(exit_stack, engine, exhaustive)
+    except SEARCH_ERRORS as e:
+        await exit_stack.aclose()
+        flight.respond({"status" : False,
+            "message" : str(e) or type(e).__name__})
+        return False
+    except BaseException:
+        await exit_stack.aclose()
+        raise
+
+    if n_pages == 0:
+        await exit_stack.aclose()
+        flight.respond({"status" : False,
+            "message" : "No jobs found for that query"})
+        return False
+
+    flight.begin()
+    async for chunk in stream_engine_export(engine, n_pages, exit_stack, 'full', export_format, compression):
+        flight.publish(chunk)
+    return not engine.failures
+
+async def run_search_job(job: SearchJob, output):
+    """Run a search queued through the jobs API, writing its export to output.
+    """
+    search_parameters = dict(job.params)
+    mode = search_parameters.pop('mode', 'full')
+    exhaustive = search_parameters.pop('exhaustive', False) and mode == 'full'
+    export_format = search_parameters.pop('format', 'csv')
+    compression = search_parameters.pop('compression', 'none')
+    async with AsyncExitStack() as exit_stack:
+        engine, n_pages = await open_search(exit_stack, exhaustive=exhaustive, **search_parameters)
+        job.attach(engine)
+        if n_pages == 0:
+            job.message = "No jobs found for that query"
+        with SEARCHES_IN_FLIGHT.track(endpoint="jobs"):
+            async for chunk in stream_export(
+                    iter_search(engine, n_pages, mode), engine.columns, engine.column_types, export_format, compression, engine.timing):
+                output.write(chunk)
+        engine.timing.observe(engine.board_name)
+
+def export_filename(export_format: ExportType = 'csv', compression: ExportCompression = 'none') -> str:
+    return "export_jobs_" + str(date.today().strftime('%Y-%m-%d')) + "." + export_extension(export_format, compression)
+
+job_manager = JobManager(run_search_job, settings.jobs_dir, settings.job_workers, settings.job_queue_size)
+
+@app.on_event("startup")
+async def start_job_manager():
+    await job_manager.start()
+
+@app.on_event("shutdown")
+async def stop_job_manager():
+    await job_manager.stop()
+
 @app.get("/", include_in_schema=False)
 async def docs_redirect():
     return RedirectResponse(url='/docs')
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Fetch latency, parse time, response sizes, error counts and the
+    requests in flight per board, in the Prometheus text format.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats/scheduler")
+async def scheduler_stats():
+    """Per-host concurrency, queue depth and wait times of the request scheduler.
+    """
+    return scheduler.stats()
+
+@app.get("/stats/pools")
+async def pool_stats():
+    """Per-host connection reuse, DNS cache hits and open connections of the session pool.
+    """
+    return session_pool.stats()
+
+@app.get("/stats/work_queue")
+async def work_queue_stats():
+    """Tasks on the work queue by state, when searches are run by workers.
+    """
+    if not work_queue:
+        return {"status" : False,
+            "message" : "No work queue, searches run in this process"}
+    return work_queue.stats()
+
+@app.get("/stats/cache")
+async def cache_stats():
+    """Hit and miss counts of the listing cache.
+    """
+    return listing_cache.info()
+
+@app.get("/stats/search_cache")
+async def search_cache_stats():
+    """Searches started, requests that joined a running search and hits on
+    the cache of finished exports.
+    """
+    return search_coalescer.info()
+
+@app.get("/stats/circuit_breakers")
+async def circuit_breaker_stats():
+    """State of each board's circuit breaker.
+    """
+    return {board: breaker.info() for board, breaker in circuit_breakers.items()}
+
+@app.get("/stats/politeness")
+async def politeness_stats():
+    """The limits the politeness controller has settled on for each host,
+    and how often it raised and lowered them.
+    """
+    if not politeness:
+        return {"status" : False,
+            "message" : "Adaptive politeness is off, the engines' own limits apply"}
+    return politeness.info()
+
 @app.get("/search")
 async def job_search(
         job_board: Literal['Adzuna', 'Indeed', 'Seek'] = 'Adzuna',
         search_just_title_or_title_and_description: Literal['just_title', 'title_and_description'] =  'just_title',
         search_terms: str = 'Aboriginal Politics',
-        results_must_include_every_term: Literal['true', 'false'] = 'false'
+        results_must_include_every_term: Literal['true', 'false'] = 'false',
+        mode: SearchMode = 'full',
+        exhaustive: bool = False,
+        timing: bool = False,
+        format: ExportType = 'csv',
+        compression: ExportCompression = 'none',
+        report: bool = False
 ):
-    if job_board == 'Adzuna':
-        # Generate a new adzuna_engine instance
-        async with AdzunaEngine() as adzuna_engine: 
-
-            if search_just_title_or_title_and_description == 'just_title':
-                # This is where we define how the search search_terms are matched to the jobs in the adzuna database
-                adzuna_engine.query_contents['qtl'] = search_terms
-            else:
-                # This is where we define how the search search_terms are matched to the jobs in the adzuna database
-                if results_must_include_every_term == 'true':
-                    # This is where we define how the search search_terms are matched to the jobs in the adzuna database
-                    adzuna_engine.query_contents['qph'] = search_terms
-                else:
-                    # This is where we define how the search search_terms are matched to the jobs in the adzuna database
-                    adzuna_engine.query_contents['qor'] = search_terms
-
-            # Pagination
-            n_pages = await adzuna_engine.get_number_of_pages()
-
-            # No captcha systems to speak of here.
-            if n_pages == 0:
-                return {
-                    "status" : False,
-                    "message" : "No jobs found for that query"
-                }
-
-            # Run the queries
-            output_df = await adzuna_engine.collate_data(n_pages)
+    """Search a job board and return its listings as CSV.
 
-    elif job_board == 'Indeed':
-        # Generate a new adzuna_engine instance
-        async with IndeedEngine() as indeed_engine:
-
-            if search_just_title_or_title_and_description == 'just_title':
-                # This is where we define how the search search_terms are matched to the jobs in the adzuna database
-                indeed_engine.query_contents['as_ttl'] = search_terms
-            else:
-                # This is where we define how the search search_terms are matched to the jobs in the adzuna database
-                if results_must_include_every_term == 'true':
-                    # This is where we define how the search search_terms are matched to the jobs in the adzuna database
-                    indeed_engine.query_contents['as_and'] = search_terms
-                else:
-                    # This is where we define how the search search_terms are matched to the jobs in the adzuna database
-                    indeed_engine.query_contents['as_any'] = search_terms
-
-
-            # Pagination
-            try:
-                n_pages = await indeed_engine.get_number_of_pages()
-            except CaptchaException as e:
-                return {"status" : False,
-                    "message" : str(e)}
-
-            if n_pages == 0:
-                return {"status" : False,
-                    "message" : "No jobs found for that query"}
-
-            # Run the queries
-            output_df = await indeed_engine.collate_data(n_pages)
+    With mode new, only listings this search hasn't returned before are
+    fetched, and paging stops once a page holds nothing new. With mode
+    snapshot, those are followed by every listing earlier runs returned.
 
-    elif job_board == 'Seek':
+    Boards stop paging after a few hundred listings. With exhaustive, a
+    larger search is split into sub-queries, by contract type or salary
+    band for example, that each fit under that limit. The incremental
+    modes stop early anyway, so exhaustive only applies to mode full.
+
+    With timing, the time spent counting the jobs and planning the search
+    is sent in a Server-Timing header. The headers go out before the rows,
+    so the time spent on the rest of the search is logged once it ends,
+    and is in the report when there is one.
+
+    Identical full searches made while one is running join it rather than
+    scraping the board again, and a finished export is served again for a
+    few minutes. The X-Search-Cache header says which: miss, joined or hit.
+    Timed searches are always run on their own.
+
+    format picks another export: ndjson, parquet or an arrow (feather)
+    file. These are typed, with dates parsed, salaries split into min, max
+    and period columns and categorical columns such as contract type
+    stored as categories. compression gzips or zstd compresses csv and
+    ndjson as they stream, and the columns of parquet and arrow files.
 
-        async with SeekEngine(search_terms) as seek_engine:
+    With report, an ndjson export ends with one more line, a "report"
+    object holding the failures that cost listings, the search's progress
+    and the time it spent per phase. Reported searches are always run on
+    their own.
+    """
+    try:
+        check_export(format, compression, report)
+    except ExportUnavailableException as e:
+        return {"status" : False,
+            "message" : str(e)}
 
-            n_pages = await seek_engine.get_number_of_pages()
+    # Boards ignore the spacing of the terms, so the cache can too
+    search_terms = " ".join(search_terms.split())
+    if settings.search_coalescing and mode == 'full' and not timing and not report:
+        return await coalesced_search(
+            build_engine(
+                job_board=job_board,
+                search_just_title_or_title_and_description=search_just_title_or_title_and_description,
+                search_terms=search_terms,
+                results_must_include_every_term=results_must_include_every_term),
+            exhaustive, format, compression)
 
-            if n_pages == 0:
-                return {"status" : False,
-                    "message" : "No jobs found for that query"}
+    # The engine has to outlive this handler, it is closed by the response stream
+    exit_stack = AsyncExitStack()
+    try:
+        engine, n_pages = await open_search(
+            exit_stack,
+            exhaustive=exhaustive and mode == 'full',
+            job_board=job_board,
+            search_just_title_or_title_and_description=search_just_title_or_title_and_description,
+            search_terms=search_terms,
+            results_must_include_every_term=results_must_include_every_term)
+    except SEARCH_ERRORS as e:
+        await exit_stack.aclose()
+        return {"status" : False,
+            "message" : str(e) or type(e).__name__}
+    except BaseException:
+        await exit_stack.aclose()
+        raise
 
-            output_df = await seek_engine.collate_data(n_pages)
+    if n_pages == 0:
+        await exit_stack.aclose()
+        response = JSONResponse({"status" : False,
+            "message" : "No jobs found for that query"})
+        if timing:
+            response.headers["Server-Timing"] = engine.timing.server_timing()
+        return response
 
-    # Return a data stream
-    response = StreamingResponse(io.StringIO(output_df.to_csv(index=False)), media_type="text/csv")
+    # Return a data stream, rows are sent as each listing is scraped
+    response = StreamingResponse(
+        stream_engine_export(engine, n_pages, exit_stack, mode, format, compression, timing, report),
+        media_type=export_media_type(format, compression))
     # Edit the headers so its a download
-    response.headers["Content-Disposition"] = "attachment; filename=export_jobs_" + str(date.today().strftime('%Y-%m-%d')) + ".csv"
+    response.headers["Content-Disposition"] = "attachment; filename=" + export_filename(format, compression)
+    if timing:
+        response.headers["Server-Timing"] = engine.timing.server_timing()
+
+    return response
+
+async def coalesced_search(engine, exhaustive: bool, export_format: ExportType, compression: ExportCompression):
+    """Respond to a /search from the result cache, by following the identical
+    search that is running or by starting one.
+    """
+    key = coalescing_key(engine, exhaustive, export_format, compression)
+    headers = {"Content-Disposition": "attachment; filename=" + export_filename(export_format, compression)}
+    body = search_coalescer.cache.get(key)
+    if body is not None:
+        return Response(body, media_type=export_media_type(export_format, compression), headers={**headers, "X-Search-Cache": "hit"})
+
+    flight, joined = search_coalescer.join(
+        key, lambda flight: run_shared_search(flight, engine, exhaustive, export_format, compression))
+    message = await flight.wait_opened()
+    if message is not None:
+        return message
+    return StreamingResponse(flight.follow(), media_type=export_media_type(export_format, compression),
+        headers={**headers, "X-Search-Cache": "joined" if joined else "miss"})
+
+@app.get("/search/fanout")
+async def fanout_search(
+        job_boards: List[Literal['Adzuna', 'Indeed', 'Seek']] = Query(['Adzuna', 'Indeed', 'Seek']),
+        search_just_title_or_title_and_description: Literal['just_title', 'title_and_description'] =  'just_title',
+        search_terms: str = 'Aboriginal Politics',
+        results_must_include_every_term: Literal['true', 'false'] = 'false',
+        mode: SearchMode = 'full',
+        exhaustive: bool = False,
+        timing: bool = False,
+        format: ExportType = 'csv',
+        compression: ExportCompression = 'none'
+):
+    """Search several job boards at once and return their listings as a
+    single CSV, with the board as a column and jobs posted on more than one
+    board only listed once. mode, exhaustive, timing, format and compression
+    work as they do for /search, with each board's timings prefixed by its name.
+    """
+    try:
+        check_export(format, compression)
+    except ExportUnavailableException as e:
+        return {"status" : False,
+            "message" : str(e)}
+
+    # Shared by every board, on top of each board's own limits
+    concurrency_budget = asyncio.Semaphore(settings.fanout_concurrency)
+    exit_stack = AsyncExitStack()
+    try:
+        searches = await asyncio.gather(*[
+            open_search(
+                exit_stack,
+                concurrency_budget,
+                exhaustive=exhaustive and mode == 'full',
+                job_board=job_board,
+                search_just_title_or_title_and_description=search_just_title_or_title_and_description,
+                search_terms=search_terms,
+                results_must_include_every_term=results_must_include_every_term)
+            for job_board in dict.fromkeys(job_boards)], return_exceptions=True)
+    except BaseException:
+        await exit_stack.aclose()
+        raise
+
+    # A board that can't be searched right now shouldn't hold back the others
+    engines, messages = [], []
+    for job_board, search in zip(dict.fromkeys(job_boards), searches):
+        if isinstance(search, SEARCH_ERRORS):
+            messages.append(f"{job_board}: {str(search) or type(search).__name__}")
+        elif isinstance(search, BaseException):
+            await exit_stack.aclose()
+            raise search
+        elif search[1] > 0:
+            engines.append(search)
+
+    if not engines:
+        await exit_stack.aclose()
+        return {"status" : False,
+            "message" : "; ".join(messages) or "No jobs found for that query"}
+    if messages:
+        logger.warning("Fan out search skipped boards: %s", messages)
+
+    fanout = FanOutSearch(engines, lambda engine, n_pages: iter_search(engine, n_pages, mode))
+    response = StreamingResponse(
+        stream_fanout_export(fanout, exit_stack, format, compression, timing),
+        media_type=export_media_type(format, compression))
+    response.headers["Content-Disposition"] = "attachment; filename=" + export_filename(format, compression)
+    if timing:
+        response.headers["Server-Timing"] = ", ".join(engine.timing.server_timing(engine.board_name) for engine, _ in engines)
+
+    return response
+
+class SearchParameters(BaseModel):
+    job_board: Literal['Adzuna', 'Indeed', 'Seek'] = 'Adzuna'
+    search_just_title_or_title_and_description: Literal['just_title', 'title_and_description'] =  'just_title'
+    search_terms: str = 'Aboriginal Politics'
+    results_must_include_every_term: Literal['true', 'false'] = 'false'
+    mode: SearchMode = 'full'
+    exhaustive: bool = False
+    format: ExportType = 'csv'
+    compression: ExportCompression = 'none'
+
+def get_job_or_404(job_id: str) -> SearchJob:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No job with that id")
+    return job
+
+@app.post("/jobs", status_code=202)
+async def submit_job(search: SearchParameters):
+    """Queue a search to run in the background. Poll /jobs/{job_id} for its
+    progress and download the export from /jobs/{job_id}/result once it is done.
+    """
+    try:
+        check_export(search.format, search.compression)
+    except ExportUnavailableException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        job = job_manager.submit(search.dict())
+    except JobQueueFullException as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"id": job.id, "status": job.status}
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Status and progress of a queued search.
+    """
+    return get_job_or_404(job_id).info()
 
-    return response
\ No newline at end of file
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    """Download the export of a finished search.
+    """
+    job = get_job_or_404(job_id)
+    if job.status != "done":
+        return JSONResponse(status_code=409, content={"status": False, "message": f"Job is {job.status}", "job_status": job.status})
+    export_format, compression = job.params.get('format', 'csv'), job.params.get('compression', 'none')
+    return FileResponse(job_manager.result_path(job), media_type=export_media_type(export_format, compression),
+        filename=export_filename(export_format, compression))
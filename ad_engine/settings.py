@@ -0,0 +1,60 @@
+from typing import Literal, Optional
+
+from pydantic import BaseSettings
+
+
+class Settings(BaseSettings):
+    """Deployment settings, read from AD_ENGINE_* environment variables.
+    """
+    # Where to parse pages: on the event loop, on a thread pool or on a process pool
+    parse_executor: Literal['none', 'thread', 'process'] = 'none'
+    parse_workers: Optional[int] = None
+    parser_backend: Literal['html.parser', 'lxml'] = 'html.parser'
+
+    # Connections kept open to each board between searches. The number of connections follows the board's concurrency.
+    pool_keepalive_timeout: float = 30
+    pool_dns_ttl: Optional[int] = 300
+    pool_connect_timeout: Optional[float] = 10
+
+    # Cache of parsed listing pages, the disk tier is only used when a path is given
+    cache_memory_entries: int = 10000
+    cache_disk_path: Optional[str] = None
+    cache_disk_entries: int = 100000
+
+    # Each board's limits rise while it answers quickly and back off on 429s, 5xx and captchas, up to politeness_max_factor
+    # times the engine's own. What was learned is kept in politeness_path, if there is one, for the next start.
+    # A captcha only opens a board's circuit once it has been held at one request at a time for politeness_captcha_grace seconds.
+    adaptive_politeness: bool = True
+    politeness_path: Optional[str] = 'politeness.sqlite'
+    politeness_max_factor: float = 4
+    politeness_captcha_grace: float = 60
+
+    # Identical /search calls join the one running, and finished exports are served again for search_cache_ttl seconds
+    search_coalescing: bool = True
+    search_cache_ttl: float = 300
+    search_cache_entries: int = 64
+    search_cache_bytes: int = 100_000_000
+
+    # Requests in flight at once across every board of a /search/fanout call
+    fanout_concurrency: int = 24
+
+    # Background searches submitted to /jobs
+    jobs_dir: str = 'job_results'
+    job_workers: int = 2
+    job_queue_size: int = 100
+
+    # With a queue, full searches are split into page tasks for worker.py processes, sqlite:///path or redis://host:port/db
+    work_queue_url: Optional[str] = None
+    work_queue_lease_seconds: float = 30
+    work_queue_max_attempts: int = 3
+    work_queue_poll_interval: float = 0.05
+    work_queue_stall_timeout: float = 300
+
+    # Listings returned by earlier searches, used by the incremental search modes
+    listing_store_path: str = 'listing_index.sqlite'
+
+    class Config:
+        env_prefix = "AD_ENGINE_"
+
+
+settings = Settings()
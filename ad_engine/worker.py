@@ -0,0 +1,99 @@
+"""Run the listing and detail page tasks of searches queued on
+AD_ENGINE_WORK_QUEUE_URL by the API. Start as many as you like, on as
+many machines as can reach the queue.
+
+    python worker.py [--concurrency 16] [--metrics-port 9100]
+"""
+import argparse
+import asyncio
+import logging
+import signal
+from typing import Optional
+
+from aiohttp import web
+
+from job_engine import CircuitBreaker, DiskCache, ListingCache, MemoryCache, ParseExecutor, PoolLimits, RequestScheduler, \
+    SessionPool
+from job_engine.metrics import REGISTRY
+from job_engine.politeness import AIMDPolicy, PolitenessController
+from job_engine.tasks import QueueWorker
+from job_engine.work_queue import open_work_queue
+from settings import settings
+
+logger = logging.getLogger("worker")
+
+
+async def serve_metrics(port: int) -> web.AppRunner:
+    """Serve this worker's fetch and parse metrics at /metrics, as the API does.
+    """
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=REGISTRY.render(), content_type="text/plain", headers={"X-Prometheus-Version": "0.0.4"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", port).start()
+    return runner
+
+
+async def main(concurrency: int, metrics_port: Optional[int] = None):
+    if not settings.work_queue_url:
+        raise SystemExit("Set AD_ENGINE_WORK_QUEUE_URL to the queue the API puts its searches on")
+
+    # The worker's own versions of the API's shared resources, see main.use_shared_resources
+    scheduler = RequestScheduler()
+    session_pool = SessionPool(PoolLimits(
+        keepalive_timeout=settings.pool_keepalive_timeout,
+        dns_ttl=settings.pool_dns_ttl,
+        connect_timeout=settings.pool_connect_timeout))
+    parse_executor = ParseExecutor(settings.parse_executor, settings.parse_workers) if settings.parse_executor != 'none' else None
+    listing_cache = ListingCache(
+        MemoryCache(settings.cache_memory_entries),
+        DiskCache(settings.cache_disk_path, settings.cache_disk_entries) if settings.cache_disk_path else None)
+    circuit_breakers = {}
+    politeness = PolitenessController(
+        scheduler, settings.politeness_path,
+        AIMDPolicy(max_factor=settings.politeness_max_factor, captcha_grace=settings.politeness_captcha_grace)) if settings.adaptive_politeness else None
+
+    def prepare_engine(engine):
+        engine.scheduler = scheduler
+        engine.session_pool = session_pool
+        engine.parse_executor = parse_executor
+        engine.parser_backend = settings.parser_backend
+        engine.cache = listing_cache
+        engine.circuit_breaker = circuit_breakers.setdefault(type(engine).__name__, CircuitBreaker())
+        engine.politeness = politeness
+        return engine
+
+    work_queue = open_work_queue(
+        settings.work_queue_url, lease_seconds=settings.work_queue_lease_seconds, max_attempts=settings.work_queue_max_attempts)
+    worker = QueueWorker(work_queue, prepare_engine, concurrency)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, worker.stop)
+    runner = await serve_metrics(metrics_port) if metrics_port else None
+
+    logger.info("Taking tasks from %s, %s at a time", settings.work_queue_url, concurrency)
+    try:
+        await worker.run()
+    finally:
+        logger.info("Stopping after %s", worker.info())
+        if runner:
+            await runner.cleanup()
+        await session_pool.close()
+        if parse_executor:
+            parse_executor.shutdown()
+        listing_cache.close()
+        work_queue.close()
+        if politeness:
+            politeness.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=16, help="Tasks run at once")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    asyncio.run(main(args.concurrency, args.metrics_port))
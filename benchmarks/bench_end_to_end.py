@@ -0,0 +1,206 @@
+"""End to end benchmarks of Scraper_Engine.collate_data and the /search
+endpoint against the mock board.
+
+The mock board runs in its own process so it doesn't compete with the
+code being measured for the event loop.
+
+    python benchmarks/bench_end_to_end.py [--jobs 500] [--latency 0.02] [--output results.json]
+"""
+import argparse
+import asyncio
+import csv
+import io
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import aiohttp
+
+from common import BENCHMARK_DIR, latency_summary, peak_rss_mb, write_results
+from mock_board import point_engine
+
+# Benchmark the scraping, not the listing cache. Must be set before main is imported.
+os.environ.setdefault("AD_ENGINE_CACHE_MEMORY_ENTRIES", "0")
+
+from job_engine import AdzunaEngine, IndeedEngine, SeekEngine
+
+ENGINES = {"Adzuna": AdzunaEngine, "Indeed": IndeedEngine, "Seek": lambda: SeekEngine("aboriginal")}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock_board(args) -> (subprocess.Popen, str):
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, os.path.join(BENCHMARK_DIR, "mock_board.py"), "--port", str(port), "--jobs", str(args.jobs),
+        "--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return process, f"http://127.0.0.1:{port}"
+
+
+async def wait_until_up(base_url: str, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(base_url + "/__stats"):
+                    return
+            except aiohttp.ClientError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+
+async def board_requests(base_url: str) -> int:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(base_url + "/__stats") as response:
+            return (await response.json())["total"]
+
+
+def tune_engine(engine, base_url: str, args):
+    """Point the engine at the mock board and apply the limits being benchmarked.
+    """
+    point_engine(engine, base_url)
+    engine.max_concurrency = args.concurrency
+    engine.requests_per_second = args.requests_per_second
+    return engine
+
+
+def request_timer(durations: List[float]) -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, context, params):
+        context.start = asyncio.get_running_loop().time()
+
+    async def on_request_end(session, context, params):
+        durations.append(asyncio.get_running_loop().time() - context.start)
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    return trace
+
+
+async def bench_collate_data(board: str, base_url: str, args) -> Dict[str, float]:
+    engine = tune_engine(ENGINES[board](), base_url, args)
+    durations = []
+    engine.client_session = aiohttp.ClientSession(headers=engine.headers, trace_configs=[request_timer(durations)])
+
+    requests_before = await board_requests(base_url)
+    start = time.perf_counter()
+    async with engine:
+        n_pages = await engine.get_number_of_pages()
+        df = await engine.collate_data(n_pages)
+    elapsed = time.perf_counter() - start
+    requests = await board_requests(base_url) - requests_before
+
+    return {
+        "seconds": elapsed,
+        "pages": n_pages,
+        "listings": len(df),
+        "requests": requests,
+        "failures": len(engine.failures),
+        "requests_per_second": requests / elapsed,
+        "listings_per_second": len(df) / elapsed,
+        "request_latency": latency_summary(durations),
+    }
+
+
+async def bench_search_endpoint(board: str, base_url: str, args) -> Dict[str, float]:
+    import uvicorn
+    import main
+
+    build_engine = main.build_engine
+    main.build_engine = lambda **search_parameters: tune_engine(build_engine(**search_parameters), base_url, args)
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    try:
+        while not server.started:
+            await asyncio.sleep(0.05)
+
+        latencies, first_bytes, rows = [], [], 0
+        semaphore = asyncio.Semaphore(args.search_concurrency)
+
+        async def search(session):
+            nonlocal rows
+            async with semaphore:
+                start = time.perf_counter()
+                async with session.get(f"http://127.0.0.1:{port}/search", params={"job_board": board}) as response:
+                    first_chunk = await response.content.readany()
+                    first_bytes.append(time.perf_counter() - start)
+                    body = first_chunk + await response.read()
+                latencies.append(time.perf_counter() - start)
+                # Descriptions span lines, so count CSV records rather than lines
+                rows += max(0, sum(1 for _ in csv.reader(io.StringIO(body.decode()))) - 1)
+
+        requests_before = await board_requests(base_url)
+        start = time.perf_counter()
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None)) as session:
+            await asyncio.gather(*[search(session) for _ in range(args.search_requests)])
+        elapsed = time.perf_counter() - start
+        requests = await board_requests(base_url) - requests_before
+    finally:
+        main.build_engine = build_engine
+        server.should_exit = True
+        await server_task
+
+    return {
+        "seconds": elapsed,
+        "searches": args.search_requests,
+        "concurrency": args.search_concurrency,
+        "rows": rows,
+        "requests": requests,
+        "requests_per_second": requests / elapsed,
+        "listings_per_second": rows / elapsed,
+        "search_latency": latency_summary(latencies),
+        "time_to_first_byte": latency_summary(first_bytes),
+    }
+
+
+async def run(args) -> Dict[str, object]:
+    process, base_url = start_mock_board(args)
+    try:
+        await wait_until_up(base_url)
+        results = {"parameters": vars(args)}
+        for board in args.boards:
+            results[f"collate_data.{board}"] = await bench_collate_data(board, base_url, args)
+            print(f"collate_data {board}: {results[f'collate_data.{board}']}")
+        if args.search_requests:
+            for board in args.boards:
+                results[f"search.{board}"] = await bench_search_endpoint(board, base_url, args)
+                print(f"/search {board}: {results[f'search.{board}']}")
+        results["peak_rss_mb"] = peak_rss_mb()
+        return results
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boards", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--jobs", type=int, default=500, help="Listings the mock board returns per search")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds the mock board takes to respond")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=32, help="Per-host request concurrency")
+    parser.add_argument("--requests-per-second", type=float, default=None, help="Per-host rate limit, unlimited by default")
+    parser.add_argument("--search-requests", type=int, default=4, help="/search calls per board, 0 to skip")
+    parser.add_argument("--search-concurrency", type=int, default=2)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print("Results written to", write_results("end_to_end", results, args.output))
+
+
+if __name__ == "__main__":
+    main()
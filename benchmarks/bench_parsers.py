@@ -0,0 +1,82 @@
+"""Microbenchmarks of each engine's page parsers over the fixture pages.
+
+Each case times one of the engine's page readers on a fixture page, the
+work Scraper_Engine.parse does per page: building the soup, limited to
+what the engine's extractor reads, and reading the fields off it. Readers
+that work on the page text skip the soup.
+
+    python benchmarks/bench_parsers.py [--iterations 200] [--output results.json]
+"""
+import argparse
+import time
+from typing import Callable, Dict
+
+from common import latency_summary, peak_rss_mb, write_results
+from mock_board import listing_code, render_detail_page, render_search_page
+
+from job_engine import AdzunaEngine, IndeedEngine, SeekEngine
+from job_engine.parsing import PARSER_BACKENDS, parse_document
+
+ENGINES = {"adzuna": AdzunaEngine, "indeed": IndeedEngine, "seek": lambda: SeekEngine("aboriginal")}
+PAGE_SIZES = {"adzuna": 50, "indeed": 50, "seek": 22}
+
+
+def available_backends():
+    backends = []
+    for backend in PARSER_BACKENDS:
+        try:
+            parse_document(lambda soup: soup, "<html></html>", backend)
+        except Exception:
+            continue
+        backends.append(backend)
+    return backends
+
+
+def time_case(func: Callable[[], object], iterations: int) -> Dict[str, float]:
+    func()  # warm up
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    summary = latency_summary(durations)
+    summary["ops_per_second"] = iterations / sum(durations)
+    return summary
+
+
+def run(iterations: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for board, make_engine in ENGINES.items():
+        engine = make_engine()
+        search_page = render_search_page(board, 1000, range(PAGE_SIZES[board]))
+        code = listing_code(board, 1)
+        detail_page = render_detail_page(board, code)
+        for backend in available_backends():
+            engine.parser_backend = backend
+            results[f"{board}.read_listing_page.{backend}"] = time_case(
+                lambda: parse_document(engine.read_listing_page, search_page, backend, 200,
+                                       parse_only=engine.listing_extractor.parse_only), iterations)
+            results[f"{board}.read_job_listing.{backend}"] = time_case(
+                lambda: parse_document(engine.read_job_listing, detail_page, backend, 200, code,
+                                       parse_only=engine.detail_extractor.parse_only), iterations)
+            results[f"{board}.number_jobs.{backend}"] = time_case(
+                lambda: parse_document(engine._parse_number_jobs, search_page, backend, 200,
+                                       parse_only=engine.count_extractor.parse_only), iterations)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+    for case, summary in results.items():
+        print(f"{case:45} {summary['ops_per_second']:10.1f} ops/s  p50 {summary['p50_ms']:7.3f} ms  p99 {summary['p99_ms']:7.3f} ms")
+    results["peak_rss_mb"] = peak_rss_mb()
+    print("Results written to", write_results("parsers", results, args.output))
+
+
+if __name__ == "__main__":
+    main()
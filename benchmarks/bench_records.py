@@ -0,0 +1,121 @@
+"""Memory taken by the listings of a search, per thousand listings.
+
+Each board's records are made the way a search makes them, by parsing
+the fixture listing and detail pages, without the network. Then, with
+tracemalloc, this measures:
+
+- records: what the records hold on to beyond their values, as returned
+  by get_job_data and as the dicts they replace
+- collate: the peak of collecting the records into a DataFrame. Records
+  go into collate_data's ColumnBuilder one at a time, as iter_data
+  yields them, where a list of dicts had to be held whole for
+  pd.DataFrame. The values are shared, so this is the containers alone.
+
+    python benchmarks/bench_records.py [--listings 1000] [--max-kb-per-thousand 1500] [--output results.json]
+
+Exits with an error when the peak of collate_data's builder goes over
+--max-kb-per-thousand.
+"""
+import argparse
+import sys
+import tracemalloc
+from typing import Callable, Dict, Iterable, List
+
+import pandas as pd
+
+from common import peak_rss_mb, write_results
+from mock_board import render_detail_page, render_search_page
+
+from job_engine import AdzunaEngine, IndeedEngine, SeekEngine
+from job_engine.parsing import parse_document
+from job_engine.records import ColumnBuilder
+
+ENGINES = {"adzuna": AdzunaEngine, "indeed": IndeedEngine, "seek": lambda: SeekEngine("aboriginal")}
+PAGE_SIZES = {"adzuna": 50, "indeed": 50, "seek": 22}
+
+
+def make_records(board: str, n_listings: int) -> List:
+    engine = ENGINES[board]()
+    records = []
+    for start in range(0, n_listings, PAGE_SIZES[board]):
+        numbers = range(start, min(start + PAGE_SIZES[board], n_listings))
+        page = render_search_page(board, n_listings, numbers)
+        codes = engine.store_listing_page(parse_document(engine.read_listing_page, page, "html.parser", 200,
+                                                         parse_only=engine.listing_extractor.parse_only))
+        for code in codes:
+            job_data = parse_document(engine.read_job_listing, render_detail_page(board, code), "html.parser", 200, code,
+                                      parse_only=engine.detail_extractor.parse_only)
+            records.append(engine.store_job_data(code, job_data))
+    return records
+
+
+def retained_kb(build: Callable[[], object]) -> float:
+    """kB still allocated once build has returned, with its result kept alive.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / 1024
+
+
+def peak_kb(build: Callable[[], object]) -> float:
+    """kB allocated at the peak of build, over what was allocated before it.
+    """
+    build()  # so pandas' one off allocations aren't counted
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    build()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return (peak - before) / 1024
+
+
+def build_frame(records: Iterable, columns: List[str]) -> pd.DataFrame:
+    builder = ColumnBuilder(columns)
+    builder.extend(records)
+    return builder.to_frame()
+
+
+def run(n_listings: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    per_thousand = 1000 / n_listings
+    for board in ENGINES:
+        columns = ENGINES[board]().columns
+        records = make_records(board, n_listings)
+        # Copies of the containers, made as they're needed
+        results[board] = {
+            "listings": len(records),
+            "records_kb_per_thousand": per_thousand * retained_kb(lambda: [record.copy() for record in records]),
+            "dicts_kb_per_thousand": per_thousand * retained_kb(lambda: [dict(record) for record in records]),
+            "collate_peak_kb_per_thousand": per_thousand * peak_kb(lambda: build_frame((record.copy() for record in records), columns)),
+            "dataframe_from_dicts_peak_kb_per_thousand": per_thousand * peak_kb(lambda: pd.DataFrame([dict(record) for record in records])),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=1000)
+    parser.add_argument("--max-kb-per-thousand", type=float, default=1500)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    results = run(args.listings)
+    over_budget = []
+    for board, summary in results.items():
+        print(f"{board:8} records {summary['records_kb_per_thousand']:8.1f} kB  dicts {summary['dicts_kb_per_thousand']:8.1f} kB  "
+              f"collate peak {summary['collate_peak_kb_per_thousand']:8.1f} kB  "
+              f"DataFrame(dicts) peak {summary['dataframe_from_dicts_peak_kb_per_thousand']:8.1f} kB  per 1000 listings")
+        if summary["collate_peak_kb_per_thousand"] > args.max_kb_per_thousand:
+            over_budget.append(board)
+    results["peak_rss_mb"] = peak_rss_mb()
+    print("Results written to", write_results("records", results, args.output))
+    if over_budget:
+        sys.exit(f"collate_data peak over {args.max_kb_per_thousand} kB per 1000 listings for {', '.join(over_budget)}")
+
+
+if __name__ == "__main__":
+    main()
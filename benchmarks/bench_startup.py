@@ -0,0 +1,107 @@
+"""How long the API takes to start, and to set up each search.
+
+- import: the median time of a cold `import main`, each in a new
+  interpreter, and which of the heavy dependencies it loaded. bs4 and
+  pandas are only imported once a page is parsed or a DataFrame is made,
+  the time that takes is reported as deferred.
+- engines: microseconds to make each board's engine for a search, by
+  calling its constructor and by cloning its template as build_engine
+  does, and to build a query uri.
+
+    python benchmarks/bench_startup.py [--runs 5] [--max-import-seconds 1.0] [--output results.json]
+
+Exits with an error when the median import goes over --max-import-seconds.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict
+
+from common import REPO_DIR, peak_rss_mb, write_results
+
+from job_engine import AdzunaEngine, IndeedEngine, SeekEngine
+
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "bs4", "soupsieve"]
+
+_IMPORT_MAIN = f"""
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter() - start
+loaded = [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+start = time.perf_counter()
+import bs4, soupsieve, pandas
+deferred = time.perf_counter() - start
+print(json.dumps({{"import_seconds": imported, "deferred_seconds": deferred,
+                  "loaded": loaded}}))
+"""
+
+
+def cold_import() -> Dict[str, Any]:
+    return json.loads(subprocess.run(
+        [sys.executable, "-c", _IMPORT_MAIN], cwd=os.path.join(REPO_DIR, "ad_engine"),
+        capture_output=True, text=True, check=True).stdout.splitlines()[-1])
+
+
+def measure_import(runs: int) -> Dict[str, Any]:
+    cold_import()  # so the first run isn't the one compiling bytecode
+    samples = [cold_import() for _ in range(runs)]
+    return {
+        "runs": runs,
+        "import_median_ms": 1000 * statistics.median(sample["import_seconds"] for sample in samples),
+        "deferred_median_ms": 1000 * statistics.median(sample["deferred_seconds"] for sample in samples),
+        "heavy_modules_loaded": samples[0]["loaded"],
+    }
+
+
+def per_call_us(make: Callable[[], object], number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        make()
+    return 1e6 * (time.perf_counter() - start) / number
+
+
+def measure_engines(number: int = 2000) -> Dict[str, Dict[str, float]]:
+    boards = {
+        "adzuna": (AdzunaEngine, {}),
+        "indeed": (IndeedEngine, {}),
+        "seek": (SeekEngine, {"search_term": "data scientist"}),
+    }
+    results = {}
+    for board, (engine_class, attributes) in boards.items():
+        construct = (lambda: engine_class(attributes["search_term"])) if attributes else engine_class
+        engine = engine_class.from_template(**attributes)
+        results[board] = {
+            "constructor_us": per_call_us(construct, number),
+            "from_template_us": per_call_us(lambda: engine_class.from_template(**attributes), number),
+            "query_uri_us": per_call_us(lambda: engine.get_query_uri(engine.query_contents), number),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-seconds", type=float, default=1.0)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    results = {"import": measure_import(args.runs), "engines": measure_engines()}
+    summary = results["import"]
+    print(f"import main {summary['import_median_ms']:8.1f} ms  deferred {summary['deferred_median_ms']:8.1f} ms  "
+          f"heavy modules loaded: {', '.join(summary['heavy_modules_loaded']) or 'none'}")
+    for board, timings in results["engines"].items():
+        print(f"{board:8} constructor {timings['constructor_us']:7.1f} us  from_template {timings['from_template_us']:7.1f} us  "
+              f"query uri {timings['query_uri_us']:6.1f} us")
+    results["peak_rss_mb"] = peak_rss_mb()
+    print("Results written to", write_results("startup", results, args.output))
+    if summary["import_median_ms"] > 1000 * args.max_import_seconds:
+        sys.exit(f"import main took {summary['import_median_ms']:.0f} ms, over {args.max_import_seconds} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+
+# The app imports job_engine as a top level package from inside ad_engine
+sys.path.insert(0, os.path.join(REPO_DIR, "ad_engine"))
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    """Summarise a list of durations in seconds as milliseconds.
+    """
+    return {
+        "count": len(values),
+        "mean_ms": 1000 * sum(values) / len(values) if values else 0.0,
+        "p50_ms": 1000 * percentile(values, 50),
+        "p99_ms": 1000 * percentile(values, 99),
+        "max_ms": 1000 * max(values) if values else 0.0,
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far. ru_maxrss is in kB on Linux and bytes on macOS.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def write_results(name: str, results: Dict[str, Any], output: str = None) -> str:
+    """Write results to JSON along with enough context to compare runs.
+    """
+    output = output or os.path.join(RESULTS_DIR, f"{name}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    document = {
+        "benchmark": name,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(document, f, indent=2)
+    return output
@@ -0,0 +1,224 @@
+"""A local stand in for the Adzuna, Indeed and Seek job boards.
+
+Serves the pages in fixtures/ for a catalogue of generated listings, with
+configurable latency and error rates. Run it on its own with
+
+    python benchmarks/mock_board.py --port 8765 --jobs 500 --latency 0.05
+
+and point an engine at it with point_engine.
+"""
+import argparse
+import asyncio
+import os
+import random
+from string import Template
+from typing import Dict, List, Optional, Sequence
+
+from aiohttp import web
+
+from common import BENCHMARK_DIR
+
+FIXTURE_DIR = os.path.join(BENCHMARK_DIR, "fixtures")
+BOARDS = ("adzuna", "indeed", "seek")
+
+
+def _load_fixtures() -> Dict[str, Dict[str, Template]]:
+    fixtures = {}
+    for board in BOARDS:
+        board_dir = os.path.join(FIXTURE_DIR, board)
+        fixtures[board] = {
+            os.path.splitext(filename)[0] + ("_json" if filename.endswith(".json") else ""): Template(open(os.path.join(board_dir, filename)).read())
+            for filename in os.listdir(board_dir)
+        }
+    return fixtures
+
+
+FIXTURES = _load_fixtures()
+
+
+def listing_code(board: str, n: int) -> str:
+    if board == "adzuna":
+        return str(1000000000 + n)
+    if board == "indeed":
+        return f"{0x5eed0000 + n:016x}"
+    return str(50000000 + n)
+
+
+def job_attributes(n: int) -> Dict[str, object]:
+    """The filterable fields of listing n, the same on every board.
+    """
+    return {
+        "cty": ("permanent", "contract", None)[n % 3],
+        "cti": ("full_time", "part_time")[n // 3 % 2],
+        # Every fifth job doesn't give a salary
+        "salary": None if n % 5 == 0 else 30000 + n * 7919 % 170000,
+        "jt": ("fulltime", "parttime", "casual", "contract")[n % 4],
+        "worktype": 242 + n % 4,
+    }
+
+
+def matches(n: int, query) -> bool:
+    """Whether listing n passes the filters the engines partition searches on.
+    """
+    attributes = job_attributes(n)
+    for field in ("cty", "cti", "jt", "worktype"):
+        if query.get(field) and str(attributes[field]) != query[field]:
+            return False
+    if query.get("sf") or query.get("st"):
+        salary = attributes["salary"]
+        if salary is None or salary < int(query.get("sf") or 0) or (query.get("st") and salary > int(query["st"])):
+            return False
+    return True
+
+
+def render_search_page(board: str, total_jobs: int, numbers: Sequence[int]) -> str:
+    """The search results page of board showing the listings numbered numbers.
+    """
+    templates = FIXTURES[board]
+    results = "\n".join(templates["search_item"].substitute(code=listing_code(board, n), n=n) for n in numbers)
+    if board == "seek":
+        jobs = ", ".join(templates["search_item_json"].substitute(code=listing_code(board, n), n=n).strip() for n in numbers)
+        redux_data = '{"results": {"results": {"jobs": [' + jobs + ']}, "totalCount": ' + str(total_jobs) + '}}'
+        return templates["search"].substitute(count=total_jobs, results=results, redux_data=redux_data)
+    return templates["search"].substitute(count=f"{total_jobs:,}", results=results)
+
+
+def render_detail_page(board: str, code: str) -> str:
+    return FIXTURES[board]["detail"].substitute(code=code)
+
+
+def point_engine(engine, base_url: str):
+    """Send an engine's requests to a mock board at base_url instead of the real site.
+    """
+    board = type(engine).__name__.replace("Engine", "").lower()
+    engine.api_url, engine.listing_url_template = {
+        "adzuna": (f"{base_url}/adzuna/search?", f"{base_url}/adzuna/details/{{listing_code}}"),
+        "indeed": (f"{base_url}/indeed/jobs?", f"{base_url}/indeed/viewjob?jk={{listing_code}}"),
+        "seek": (f"{base_url}/seek/{{search_term}}-jobs?", f"{base_url}/seek/job/{{listing_code}}"),
+    }[board]
+    return engine
+
+
+class MockBoard:
+    """aiohttp application serving every board from one catalogue of jobs.
+
+    Searches can be filtered on the fields of job_attributes, as the
+    engines do when they partition a search.
+
+    Args:
+        jobs: Number of listings each board reports for an unfiltered search
+        latency: Seconds added to every response
+        jitter: Upper bound of a random delay added on top of latency
+        error_rate: Fraction of requests answered with one of error_statuses
+        error_statuses: Status codes to fail with
+        retry_after: Retry-After header sent with 429 and 503 errors
+        seed: Seed for the latency and error choices
+    """
+    def __init__(self, jobs: int = 500, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_statuses: Sequence[int] = (503, 404), retry_after: Optional[str] = "0", seed: int = 0):
+        self.jobs = jobs
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_statuses = list(error_statuses)
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.requests: Dict[str, int] = {}
+        self.errors = 0
+        self._runner: Optional[web.AppRunner] = None
+        self._matching: Dict[tuple, List[int]] = {}
+
+    @web.middleware
+    async def _simulate_network(self, request: web.Request, handler):
+        if request.path == "/__stats":
+            return await handler(request)
+
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        self.requests[route] = self.requests.get(route, 0) + 1
+
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            status = self.random.choice(self.error_statuses)
+            headers = {"Retry-After": self.retry_after} if status in (429, 503) and self.retry_after is not None else {}
+            return web.Response(status=status, headers=headers, text="Internal server error" if status >= 500 else "Not found")
+
+        return await handler(request)
+
+    def _page(self, board: str, request: web.Request, first: int, per_page: int) -> web.Response:
+        filters = tuple(sorted((key, value) for key, value in request.query.items() if key in ("cty", "cti", "sf", "st", "jt", "worktype")))
+        if (self.jobs, filters) not in self._matching:
+            self._matching[self.jobs, filters] = [n for n in range(self.jobs) if matches(n, dict(filters))]
+        numbers = self._matching[self.jobs, filters]
+        return web.Response(text=render_search_page(board, len(numbers), numbers[max(0, first):first + per_page]), content_type="text/html")
+
+    async def adzuna_search(self, request: web.Request) -> web.Response:
+        per_page = int(request.query.get("pp", 50))
+        return self._page("adzuna", request, (int(request.query.get("page", 1)) - 1) * per_page, per_page)
+
+    async def indeed_search(self, request: web.Request) -> web.Response:
+        return self._page("indeed", request, int(request.query.get("start", 0)), int(request.query.get("limit", 50)))
+
+    async def seek_search(self, request: web.Request) -> web.Response:
+        return self._page("seek", request, (int(request.query.get("page", 1)) - 1) * 22, 22)
+
+    async def adzuna_detail(self, request: web.Request) -> web.Response:
+        return web.Response(text=render_detail_page("adzuna", request.match_info["code"]), content_type="text/html")
+
+    async def indeed_detail(self, request: web.Request) -> web.Response:
+        return web.Response(text=render_detail_page("indeed", request.query["jk"]), content_type="text/html")
+
+    async def seek_detail(self, request: web.Request) -> web.Response:
+        return web.Response(text=render_detail_page("seek", request.match_info["code"]), content_type="text/html")
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"requests": self.requests, "total": sum(self.requests.values()), "errors": self.errors})
+
+    def make_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._simulate_network])
+        app.add_routes([
+            web.get("/adzuna/search", self.adzuna_search),
+            web.get("/adzuna/details/{code}", self.adzuna_detail),
+            web.get("/indeed/jobs", self.indeed_search),
+            web.get("/indeed/viewjob", self.indeed_detail),
+            web.get("/seek/{term}-jobs", self.seek_search),
+            web.get("/seek/job/{code}", self.seek_detail),
+            web.get("/__stats", self.stats),
+        ])
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve in the running event loop and return the base url.
+        """
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        host, port = self._runner.addresses[0][:2]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--jobs", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-statuses", type=int, nargs="+", default=[503, 404])
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    board = MockBoard(args.jobs, args.latency, args.jitter, args.error_rate, args.error_statuses, seed=args.seed)
+    web.run_app(board.make_app(), host=args.host, port=args.port)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app imports job_engine as a top level package from inside ad_engine
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ad_engine"))
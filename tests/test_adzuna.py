@@ -0,0 +1,52 @@
+import asyncio
+import csv
+import io
+import json
+
+from job_engine import AdzunaEngine
+from job_engine.export import stream_export
+from job_engine.parsing import parse_document
+
+DETAIL_PAGE = """<html><body>
+<h1>Youth worker</h1>
+<section class="text-sm">Work with young people.</section>
+<table>
+<tr><th>Company:</th><td>Example Organisation</td></tr>
+<tr><th>Salary:</th><td>$85,000 per annum</td></tr>
+<tr><th>Extra row:</th><td>Something Adzuna added</td></tr>
+</table>
+</body></html>"""
+
+
+def read_detail_page():
+    engine = AdzunaEngine()
+    return engine, parse_document(engine.read_job_listing, DETAIL_PAGE, "html.parser", 200, "123",
+                                  parse_only=engine.detail_extractor.parse_only)
+
+
+async def _collect(chunks):
+    return b"".join([chunk async for chunk in chunks])
+
+
+async def _records(*records):
+    for record in records:
+        yield record
+
+
+def test_known_rows_fill_their_columns():
+    _, record = read_detail_page()
+    assert record['Company'] == 'Example Organisation'
+    assert record['Salary'] == '$85,000 per annum'
+    assert record['url'] == 'https://www.adzuna.com.au/details/123'
+
+
+def test_other_rows_make_it_into_streamed_exports():
+    engine, record = read_detail_page()
+    assert json.loads(record['Other details']) == {'Extra row': 'Something Adzuna added'}
+
+    body = asyncio.run(_collect(stream_export(_records(record), engine.columns, engine.column_types, "csv")))
+    row = next(csv.DictReader(io.StringIO(body.decode())))
+    assert json.loads(row['Other details']) == {'Extra row': 'Something Adzuna added'}
+
+    body = asyncio.run(_collect(stream_export(_records(record), engine.columns, engine.column_types, "ndjson")))
+    assert json.loads(json.loads(body)['Other details']) == {'Extra row': 'Something Adzuna added'}
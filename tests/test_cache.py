@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+from job_engine import AdzunaEngine, DiskCache, ListingCache, MemoryCache
+
+
+def test_memory_cache_evicts_the_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", 1, 60)
+    cache.set("b", 2, 60)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3, 60)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats.evictions == 1
+
+
+def test_memory_cache_expires_entries():
+    cache = MemoryCache()
+    cache.set("a", 1, -1)
+    cache.set("b", 2, 60)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert len(cache) == 1
+    assert cache.stats.as_dict() == {"hits": 1, "misses": 1, "evictions": 0, "expired": 1, "hit_rate": 0.5}
+
+
+def test_disk_cache_evicts_the_least_recently_used_and_expires(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.set("a", {"title": "a"}, 60)
+    time.sleep(0.01)
+    cache.set("b", {"title": "b"}, 60)
+    time.sleep(0.01)
+    assert cache.get("a") == {"title": "a"}
+    time.sleep(0.01)
+
+    cache.set("c", {"title": "c"}, 60)
+
+    assert cache.get("b") is None
+    assert len(cache) == 2
+    assert cache.stats.evictions == 1
+
+    cache.set("a", {"title": "a"}, -1)
+    assert cache.get("a") is None
+    assert len(cache) == 1
+    assert cache.stats.expired == 1
+    cache.close()
+
+
+def test_disk_cache_keeps_entries_across_restarts(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = DiskCache(path)
+    cache.set("https://www.adzuna.com.au/details/1", {"title": "Developer"}, 60)
+    cache.close()
+
+    cache = DiskCache(path)
+    assert len(cache) == 1
+    assert cache.get("https://www.adzuna.com.au/details/1") == {"title": "Developer"}
+    cache.close()
+
+
+def test_disk_hits_are_promoted_into_memory_with_their_expiry(tmp_path):
+    disk = DiskCache(str(tmp_path / "cache.sqlite"))
+    disk.set("url", {"title": "Developer"}, 60)
+    expires, _ = disk.get_entry("url")
+    cache = ListingCache(MemoryCache(), disk)
+
+    assert asyncio.run(cache.lookup("url")) == {"title": "Developer"}
+    assert cache.memory._entries["url"][0] == expires
+    assert cache.get("url") == {"title": "Developer"}
+
+    info = cache.info()
+    assert (info["memory"]["hits"], info["memory"]["misses"]) == (1, 1)
+    assert (info["disk"]["hits"], info["total"]["hits"]) == (2, 2)
+    cache.close()
+
+
+def test_what_the_cache_returns_can_be_modified(tmp_path):
+    cache = ListingCache(MemoryCache(), DiskCache(str(tmp_path / "cache.sqlite")))
+    asyncio.run(cache.store("url", {"title": "Developer"}, 60))
+
+    asyncio.run(cache.lookup("url"))["title"] = "Changed"
+
+    assert cache.get("url") == {"title": "Developer"}
+    assert cache.disk.get("url") == {"title": "Developer"}
+    cache.close()
+
+
+def test_listings_are_cached_under_the_same_key_by_every_search():
+    cache = ListingCache()
+    first, second = AdzunaEngine(), AdzunaEngine()
+    first.query_contents = {**first.query_contents, "q": "python"}
+    second.query_contents = {**second.query_contents, "q": "data engineer", "page": 3}
+    assert first.get_listing_uri(1234) == second.get_listing_uri("1234")
+
+    async def process(engine):
+        engine.cache = cache
+        # A cache miss would need a client session to fetch the listing
+        engine.client_session = None
+        return await engine.process_job_listing(1234)
+
+    asyncio.run(cache.store(first.get_listing_uri(1234), {"title": "Developer"}, 60))
+    assert asyncio.run(process(first)) == asyncio.run(process(second)) == {"title": "Developer"}
@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest
+
+from coalescing import ResultCache, SearchCoalescer
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2, max_bytes=100, ttl=60)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    assert cache.get("a") == b"1"
+    cache.set("c", b"3")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    assert cache.stats.evictions == 1
+
+
+def test_result_cache_bounds_its_size():
+    cache = ResultCache(max_entries=10, max_bytes=10, ttl=60)
+    cache.set("big", b"x" * 11)
+    assert cache.get("big") is None
+    cache.set("a", b"x" * 6)
+    cache.set("b", b"x" * 6)
+    assert cache.get("a") is None
+    assert cache.size == 6
+
+
+def test_result_cache_expires_entries():
+    cache = ResultCache(ttl=60)
+    cache.set("a", b"1")
+    cache._entries["a"] = (0, b"1")
+    assert cache.get("a") is None
+    assert cache.stats.expired == 1
+
+
+async def _follow(flight):
+    return b"".join([chunk async for chunk in flight.follow()])
+
+
+def test_identical_searches_share_one_run_and_its_export():
+    async def run():
+        coalescer = SearchCoalescer(ResultCache())
+        runs = 0
+
+        async def search(flight):
+            nonlocal runs
+            runs += 1
+            flight.begin()
+            for chunk in (b"a,", b"b,", b"c"):
+                flight.publish(chunk)
+                await asyncio.sleep(0.01)
+            return True
+
+        first, joined_first = coalescer.join("key", search)
+        await asyncio.sleep(0.015)
+        # Joins late, still gets the export from its first byte
+        second, joined_second = coalescer.join("key", search)
+        bodies = await asyncio.gather(_follow(first), _follow(second))
+        return runs, joined_first, joined_second, bodies, coalescer
+
+    runs, joined_first, joined_second, bodies, coalescer = asyncio.run(run())
+    assert runs == 1
+    assert (joined_first, joined_second) == (False, True)
+    assert bodies == [b"a,b,c", b"a,b,c"]
+    assert coalescer.cache.get("key") == b"a,b,c"
+    assert coalescer.info()["requests_joined"] == 1
+
+
+def test_search_is_cancelled_when_its_last_follower_leaves():
+    async def run():
+        coalescer = SearchCoalescer(ResultCache())
+
+        async def search(flight):
+            flight.begin()
+            flight.publish(b"a")
+            await asyncio.sleep(60)
+            return True
+
+        flight, _ = coalescer.join("key", search)
+        follower = asyncio.create_task(_follow(flight))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        await asyncio.gather(flight.task, return_exceptions=True)
+        return flight, coalescer
+
+    flight, coalescer = asyncio.run(run())
+    assert flight.task.cancelled()
+    assert coalescer.flights == {}
+    assert coalescer.cache.get("key") is None
+
+
+def test_failed_search_reaches_every_follower_and_isnt_cached():
+    async def run():
+        coalescer = SearchCoalescer(ResultCache())
+
+        async def search(flight):
+            flight.begin()
+            flight.publish(b"a")
+            await asyncio.sleep(0.01)
+            raise RuntimeError("board went away")
+
+        first, _ = coalescer.join("key", search)
+        second, _ = coalescer.join("key", search)
+        results = await asyncio.gather(_follow(first), _follow(second), return_exceptions=True)
+        return results, coalescer
+
+    results, coalescer = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert coalescer.cache.get("key") is None
+
+
+def test_export_too_big_to_keep_is_streamed_but_not_kept_or_joined():
+    async def run():
+        coalescer = SearchCoalescer(ResultCache(max_bytes=4))
+        release = asyncio.Event()
+
+        async def search(flight):
+            flight.begin()
+            for chunk in (b"ab", b"cd", b"ef", b"gh"):
+                flight.publish(chunk)
+                await asyncio.sleep(0.01)
+            await release.wait()
+            return True
+
+        flight, _ = coalescer.join("key", search)
+        body = []
+
+        async def follow():
+            async for chunk in flight.follow():
+                body.append(chunk)
+                if len(body) == 4:
+                    release.set()
+
+        follower = asyncio.create_task(follow())
+        await asyncio.sleep(0.035)
+        # Only what the follower has yet to send is kept
+        held = len(flight.chunks)
+        late, joined = coalescer.join("key", search)
+        late.task.cancel()
+        await follower
+        return held, joined, late is flight, b"".join(body), coalescer
+
+    held, joined, same_flight, body, coalescer = asyncio.run(run())
+    assert held <= 1
+    assert not joined and not same_flight
+    assert body == b"abcdefgh"
+    assert coalescer.cache.get("key") is None
+
+
+def test_search_is_cancelled_when_its_only_request_leaves_before_following():
+    async def run():
+        coalescer = SearchCoalescer(ResultCache())
+
+        async def search(flight):
+            await asyncio.sleep(60)
+
+        flight, _ = coalescer.join("key", search)
+        waiter = asyncio.create_task(flight.wait_opened())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, flight.task, return_exceptions=True)
+        return flight
+
+    assert asyncio.run(run()).task.cancelled()
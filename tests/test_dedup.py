@@ -0,0 +1,24 @@
+from job_engine import AdzunaEngine, ListingIndex, SearchProgress
+from job_engine.metrics import DROPPED_LISTINGS
+
+
+def test_claim_keeps_the_first_of_each_listing():
+    index = ListingIndex()
+    assert index.claim_all([1, 2, 2, 3]) == [1, 2, 3]
+    assert index.claim_all([3, 4]) == [4]
+    assert 4 in index
+    assert index.stats() == {"listings": 4, "duplicates_dropped": 2}
+
+
+def test_duplicates_are_counted_in_the_progress_and_metrics():
+    engine = AdzunaEngine()
+    engine.listing_index = ListingIndex()
+    engine.progress = SearchProgress(pages_total=2)
+    dropped_before = DROPPED_LISTINGS.value(board=engine.board_name, reason="duplicate")
+
+    assert engine.claim_listings([1, 2, None, 3]) == [1, 2, 3]
+    assert engine.claim_listings([3, 4, 1]) == [4]
+
+    assert engine.progress.duplicates_dropped == 2
+    assert engine.progress.as_dict()["duplicates_dropped"] == 2
+    assert DROPPED_LISTINGS.value(board=engine.board_name, reason="duplicate") - dropped_before == 2
@@ -0,0 +1,40 @@
+import asyncio
+import json
+
+import pytest
+
+from job_engine.export import ExportUnavailableException, check_export, stream_export
+from job_engine.metrics import SearchTiming
+
+
+async def _records():
+    for title in ("Analyst", "Engineer"):
+        yield {"title": title}
+
+
+def test_ndjson_can_end_with_the_search_report():
+    async def run():
+        report = lambda: {"failures": {"total": 1}}
+        return b"".join([chunk async for chunk in stream_export(_records(), ["title"], {}, "ndjson", report=report)])
+
+    lines = [json.loads(line) for line in asyncio.run(run()).splitlines()]
+    assert [line.get("title") for line in lines[:-1]] == ["Analyst", "Engineer"]
+    assert lines[-1] == {"report": {"failures": {"total": 1}}}
+
+
+def test_the_report_is_made_once_every_row_is_rendered():
+    timing = SearchTiming()
+
+    async def run():
+        report = lambda: {"timing": timing.as_dict()}
+        return b"".join([chunk async for chunk in stream_export(_records(), ["title"], {}, "ndjson", timing=timing, report=report)])
+
+    report = json.loads(asyncio.run(run()).splitlines()[-1])["report"]
+    assert report["timing"]["render"]["count"] == 2
+    assert report["timing"]["total"]["seconds"] >= report["timing"]["render"]["seconds"]
+
+
+def test_only_ndjson_takes_a_report():
+    check_export("ndjson", report=True)
+    with pytest.raises(ExportUnavailableException):
+        check_export("csv", report=True)
@@ -0,0 +1,102 @@
+import os
+from string import Template
+
+import pytest
+from bs4 import BeautifulSoup
+
+from job_engine import AdzunaEngine, IndeedEngine, SeekEngine
+from job_engine.extraction import Attribute, Extractor, MissingFieldException, Rule, Strainer, stripped_text
+from job_engine.parsing import PARSER_BACKENDS, parse_document
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks", "fixtures")
+
+PAGE = """<html><body>
+<h1 class="title">  Developer </h1>
+<ul><li data-code="1">One</li><li data-code="2">Two</li></ul>
+</body></html>"""
+
+
+def _fixture(board, name, **values):
+    with open(os.path.join(FIXTURE_DIR, board, name)) as file:
+        return Template(file.read()).safe_substitute(**values)
+
+
+def _search_page(board):
+    results = "\n".join(_fixture(board, "search_item.html", code=1000 + n, n=n) for n in range(3))
+    return _fixture(board, "search.html", count="1,234", results=results, redux_data="{}")
+
+
+def test_rules_read_the_first_match_or_every_match():
+    extractor = Extractor({
+        'title': Rule('h1.title'),
+        'codes': Rule('li', read=Attribute('data-code'), many=True),
+        'items': Rule('li', read=lambda li: li.get_text().upper(), many=True),
+        'first': Rule('li', read=stripped_text),
+    })
+
+    assert extractor.extract(BeautifulSoup(PAGE, "html.parser")) == {
+        'title': 'Developer', 'codes': ['1', '2'], 'items': ['ONE', 'TWO'], 'first': 'One'}
+
+
+def test_a_missing_field_is_its_default_unless_required():
+    soup = BeautifulSoup(PAGE, "html.parser")
+
+    fields = Extractor({'salary': Rule('.salary', default='n/a'), 'tags': Rule('.tag', many=True)}).extract(soup)
+    assert fields == {'salary': 'n/a', 'tags': []}
+
+    with pytest.raises(MissingFieldException, match="salary"):
+        Extractor({'title': Rule('h1'), 'salary': Rule('.salary', required=True)}).extract(soup)
+    with pytest.raises(MissingFieldException):
+        Extractor({'salary': Rule('.salary', required=True)}).extract(soup)
+
+
+@pytest.mark.parametrize("engine, board, page", [
+    (AdzunaEngine(), "adzuna", "search"), (AdzunaEngine(), "adzuna", "detail"),
+    (IndeedEngine(), "indeed", "search"), (IndeedEngine(), "indeed", "detail"),
+    (SeekEngine("python"), "seek", "search"), (SeekEngine("python"), "seek", "detail"),
+])
+@pytest.mark.parametrize("backend", PARSER_BACKENDS)
+def test_strained_pages_read_the_same_as_full_ones(engine, board, page, backend):
+    text = _search_page(board) if page == "search" else _fixture(board, "detail.html", code="1234")
+    extractors = [engine.count_extractor, engine.listing_extractor] if page == "search" else [engine.detail_extractor]
+
+    for extractor in extractors:
+        full = extractor.extract(BeautifulSoup(text, backend))
+        assert extractor.extract(BeautifulSoup(text, backend, parse_only=extractor.parse_only)) == full
+        assert all(value not in (None, [], ()) for value in full.values())
+
+
+def test_a_page_the_strainer_misses_is_parsed_in_full():
+    engine = IndeedEngine()
+    text = _fixture("indeed", "detail.html", code="1234").replace(
+        'class="jobsearch-jobDescriptionText"', 'class="jobsearch-JobDescription-renamed"')
+    strained = BeautifulSoup(text, "html.parser", parse_only=engine.detail_extractor.parse_only)
+    with pytest.raises(MissingFieldException):
+        engine.detail_extractor.extract(strained)
+
+    record = parse_document(engine.read_job_listing, text, "html.parser", 200, "1234",
+                            parse_only=engine.detail_extractor.parse_only)
+
+    assert record['description'].strip()
+    assert record['title']
+
+
+def test_adzuna_reads_only_the_first_table():
+    engine = AdzunaEngine()
+    text = _fixture("adzuna", "detail.html", code="1234").replace(
+        "</body>", "<table><tr><th>Similar job:</th><td>Another listing</td></tr></table></body>")
+
+    record = parse_document(engine.read_job_listing, text, "html.parser", 200, "1234",
+                            parse_only=engine.detail_extractor.parse_only)
+
+    assert record['Other details'] is None or "Similar job" not in record['Other details']
+    assert record['Company']
+
+
+def test_strainers_are_built_when_first_used():
+    strainer = Strainer('div', class_='results')
+    extractor = Extractor({'results': Rule('div.results')}, parse_only=strainer)
+
+    assert extractor._parse_only is strainer
+    soup = BeautifulSoup('<p>Skip</p><div class="results">Keep</div>', "html.parser", parse_only=extractor.parse_only)
+    assert soup.get_text() == "Keep"
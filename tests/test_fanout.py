@@ -0,0 +1,60 @@
+import asyncio
+
+from job_engine import AdzunaEngine, HostLimits, IndeedEngine, RequestScheduler
+from job_engine.fanout import FanOutSearch
+
+
+def test_a_rate_limited_board_doesnt_hold_the_shared_budget():
+    async def run():
+        scheduler = RequestScheduler()
+        budget = asyncio.Semaphore(2)
+        slow, fast = AdzunaEngine(), IndeedEngine()
+        for engine in (slow, fast):
+            engine.scheduler = scheduler
+            engine.concurrency_budget = budget
+        scheduler.configure("www.adzuna.com.au", HostLimits(max_concurrency=4, requests_per_second=10))
+        scheduler.configure("au.indeed.com", HostLimits(max_concurrency=4))
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        finished = {}
+
+        async def request(engine, url, name):
+            async with engine.request_slot(url):
+                await asyncio.sleep(0.01)
+            finished[name] = loop.time() - start
+
+        slow_requests = [request(slow, "https://www.adzuna.com.au/details/1", f"slow{i}") for i in range(4)]
+        fast_requests = [request(fast, "https://au.indeed.com/viewjob?jk=1", f"fast{i}") for i in range(4)]
+        await asyncio.gather(*slow_requests, *fast_requests)
+        return finished
+
+    finished = asyncio.run(run())
+    # The slow board only gets a token every 0.1s, the fast one shouldn't wait on it
+    assert max(finished[f"fast{i}"] for i in range(4)) < 0.1
+    assert max(finished[f"slow{i}"] for i in range(4)) >= 0.3
+
+
+def test_disconnect_releases_every_engine():
+    async def records(engine, n_pages):
+        try:
+            for n in range(1000):
+                yield {"title": f"{engine.board_name} {n}"}
+                await asyncio.sleep(0)
+        finally:
+            closed.append(engine.board_name)
+
+    closed = []
+
+    async def run():
+        search = FanOutSearch([(AdzunaEngine(), 1), (IndeedEngine(), 1)], records)
+        iterator = search.iter_data()
+        await iterator.__anext__()
+        # Both engines fill the queue while the client is away
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(iterator.aclose(), 5)
+        await asyncio.sleep(0.01)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    pending = asyncio.run(run())
+    assert pending == []
+    assert sorted(closed) == ["Adzuna", "Indeed"]
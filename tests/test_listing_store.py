@@ -0,0 +1,93 @@
+import asyncio
+
+from job_engine import AdzunaEngine, ListingStore
+
+
+def board(pages, fetched, what="data"):
+    """An Adzuna engine whose listing pages hold pages[page_n], and whose
+    detail pages are recorded in fetched.
+    """
+    engine = AdzunaEngine()
+    engine.query_contents["q"] = what
+
+    async def process_listing_page(page_n, query_option, query_contents=None):
+        return list(pages.get(page_n, []))
+
+    async def process_job_listing(listing_code):
+        fetched.append(listing_code)
+        return {"listing_code": listing_code}
+
+    engine.process_listing_page = process_listing_page
+    engine.process_job_listing = process_job_listing
+    return engine
+
+
+def search(engine, store, number_pages, snapshot=False):
+    async def run():
+        return [record["listing_code"] async for record in engine.iter_new_data(number_pages, store, snapshot=snapshot)]
+    return asyncio.run(run())
+
+
+def test_new_mode_returns_only_listings_the_search_hasnt_returned(tmp_path):
+    store = ListingStore(str(tmp_path / "listings.sqlite"))
+    fetched = []
+    pages = {1: ["a", "b"], 2: ["c", "d"]}
+    assert sorted(search(board(pages, fetched), store, 2)) == ["a", "b", "c", "d"]
+
+    pages[1] = ["e", "a"]
+    pages[2] = ["b", "c"]
+    assert search(board(pages, fetched), store, 2) == ["e"]
+    assert fetched == ["a", "b", "c", "d", "e"]
+    store.close()
+
+
+def test_paging_stops_at_the_first_page_with_nothing_new(tmp_path):
+    store = ListingStore(str(tmp_path / "listings.sqlite"))
+    pages = {1: ["a"], 2: ["b"], 3: ["c"]}
+    search(board(pages, []), store, 3)
+
+    pages.update({1: ["x"], 2: ["a"], 3: ["y"]})
+    fetched = []
+    # Page 2 holds nothing new, page 3 isn't read
+    assert search(board(pages, fetched), store, 3) == ["x"]
+    assert fetched == ["x"]
+    store.close()
+
+
+def test_snapshot_adds_every_listing_returned_before(tmp_path):
+    store = ListingStore(str(tmp_path / "listings.sqlite"))
+    pages = {1: ["a", "b"]}
+    search(board(pages, []), store, 1)
+
+    pages[1] = ["c", "a"]
+    fetched = []
+    records = search(board(pages, fetched), store, 1, snapshot=True)
+    assert records[0] == "c"
+    assert sorted(records) == ["a", "b", "c"]
+    assert fetched == ["c"]
+    store.close()
+
+
+def test_listing_another_search_stored_is_still_new_to_this_one(tmp_path):
+    store = ListingStore(str(tmp_path / "listings.sqlite"))
+    search(board({1: ["a", "b"]}, [], "data"), store, 1)
+
+    fetched = []
+    pages = {1: ["b", "c"]}
+    assert sorted(search(board(pages, fetched, "python"), store, 1)) == ["b", "c"]
+    # Read from the store rather than fetched again
+    assert fetched == ["c"]
+    assert search(board(pages, fetched, "python"), store, 1) == []
+    store.close()
+
+
+def test_store_files_from_before_content_hash_was_dropped_still_work(tmp_path):
+    path = str(tmp_path / "listings.sqlite")
+    store = ListingStore(path)
+    store._db.execute("DROP TABLE listings")
+    store._db.execute("""CREATE TABLE listings (
+        board TEXT, listing_code TEXT, first_seen REAL, last_seen REAL, content_hash TEXT, record TEXT,
+        PRIMARY KEY (board, listing_code))""")
+    store.seen("search", "Adzuna", "a", {"listing_code": "a"})
+    assert store.records("Adzuna", ["a"]) == {"a": {"listing_code": "a"}}
+    store.close()
@@ -0,0 +1,126 @@
+import asyncio
+
+from job_engine.partition import Choice, Partition, Range, plan_partitions
+
+
+class _Board:
+    """Counts jobs matching a query, as a board's search would. A salary
+    band matches low <= salary < high, with None as an open end.
+    """
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.counted = []
+
+    def matches(self, job, query):
+        if query.get("contract") is not None and job.get("contract") != query["contract"]:
+            return False
+        low, high = query.get("salary_min"), query.get("salary_max")
+        if low is None and high is None:
+            return True
+        salary = job.get("salary")
+        if salary is None:
+            return False
+        return (low is None or salary >= low) and (high is None or salary < high)
+
+    async def count_jobs(self, query):
+        self.counted.append(query)
+        return sum(self.matches(job, query) for job in self.jobs)
+
+
+CONTRACT = Choice("contract", ["permanent", "contract"])
+SALARY = Range("salary_min", "salary_max", [None, 50_000, 100_000, None], step=10_000)
+
+
+def _plan(board, query, dimensions, max_jobs):
+    n_jobs = asyncio.run(board.count_jobs(query))
+    return asyncio.run(plan_partitions(board.count_jobs, query, n_jobs, dimensions, max_jobs))
+
+
+def test_choice_splits_on_each_value_and_skips_a_field_already_set():
+    assert CONTRACT.split({"what": "python"}) == [{"contract": "permanent"}, {"contract": "contract"}]
+    assert CONTRACT.split({"contract": "permanent"}) == []
+    assert not CONTRACT.repeatable()
+
+
+def test_range_splits_on_its_edges_then_halves_down_to_step():
+    assert SALARY.split({}) == [
+        {"salary_min": None, "salary_max": 50_000},
+        {"salary_min": 50_000, "salary_max": 100_000},
+        {"salary_min": 100_000, "salary_max": None},
+    ]
+    assert SALARY.split({"salary_min": 50_000, "salary_max": 100_000}) == [
+        {"salary_min": 50_000, "salary_max": 70_000},
+        {"salary_min": 70_000, "salary_max": 100_000},
+    ]
+    assert SALARY.split({"salary_min": 50_000, "salary_max": 60_000}) == []
+    # An open-ended band can't be halved
+    assert SALARY.split({"salary_min": 100_000, "salary_max": None}) == []
+    assert SALARY.repeatable()
+
+
+def test_a_search_under_the_limit_is_not_split():
+    board = _Board([{"contract": "permanent"}] * 5)
+    assert _plan(board, {"what": "python"}, [CONTRACT], 10) == [Partition({"what": "python"}, 5)]
+    assert len(board.counted) == 1
+
+
+def test_partitions_cover_the_search_under_the_limit():
+    jobs = [{"contract": contract, "salary": salary}
+            for contract in ("permanent", "contract")
+            for salary in range(20_000, 100_000, 5_000)]
+    board = _Board(jobs)
+
+    partitions = _plan(board, {"what": "python"}, [CONTRACT, SALARY], 6)
+
+    assert all(partition.n_jobs <= 6 for partition in partitions)
+    assert all(partition.query["what"] == "python" for partition in partitions)
+    # Each job is reachable through exactly one partition
+    for job in jobs:
+        assert sum(board.matches(job, partition.query) for partition in partitions) == 1
+    assert sum(partition.n_jobs for partition in partitions) == len(jobs)
+    assert {partition.fields["contract"] for partition in partitions} == {"permanent", "contract"}
+    assert "contract=permanent&salary_min=50000&salary_max=70000" in [partition.label() for partition in partitions]
+
+
+def test_planning_stops_when_nothing_is_left_to_split_on():
+    # Every job has the same contract and salary, so no split gets under
+    # the limit. Planning ends with the partitions still over it.
+    board = _Board([{"contract": "permanent", "salary": 55_000}] * 20)
+
+    partitions = _plan(board, {}, [CONTRACT, SALARY], 5)
+
+    assert [(partition.fields, partition.n_jobs) for partition in partitions] == [
+        ({"contract": "permanent", "salary_min": 50_000, "salary_max": 60_000}, 20),
+    ]
+    assert _plan(board, {}, [], 5) == [Partition({}, 20)]
+
+
+def test_jobs_missing_a_field_are_planned_on_the_later_dimensions():
+    # Five jobs give no salary, so the salary bands add up to fewer jobs
+    # than the search and the search is planned again without them.
+    jobs = [{"contract": "permanent", "salary": 60_000}] * 4 + [{"contract": "contract"}] * 5
+    board = _Board(jobs)
+
+    partitions = _plan(board, {}, [SALARY, CONTRACT], 5)
+
+    assert sorted((partition.label(), partition.n_jobs) for partition in partitions) == [
+        ("contract=contract", 5),
+        ("contract=permanent", 4),
+        ("salary_min=50000&salary_max=100000", 4),
+    ]
+
+
+def test_a_failed_count_keeps_its_jobs_reachable_through_the_parent():
+    # The sub-queries that counted add up to fewer jobs than the search,
+    # so the search itself is kept as a partition.
+    board = _Board([{"contract": "permanent"}] * 4 + [{"contract": "contract"}] * 4)
+
+    async def count_jobs(query):
+        if query.get("contract") == "contract":
+            raise ConnectionError("count failed")
+        return await board.count_jobs(query)
+
+    partitions = asyncio.run(plan_partitions(count_jobs, {}, 8, [CONTRACT], 5))
+
+    assert [(partition.label(), partition.n_jobs) for partition in partitions] == [("all", 8), ("contract=permanent", 4)]
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from job_engine import IndeedEngine, RequestFailedException, SearchTiming
+from job_engine.politeness import AIMDPolicy, PolitenessController
+from job_engine.resilience import CircuitBreaker
+from job_engine.scheduler import HostLimits, RequestScheduler, host_of
+
+HOST = "board.example"
+
+
+def controller(path=None, **policy):
+    scheduler = RequestScheduler()
+    politeness = PolitenessController(scheduler, path, AIMDPolicy(window=4, **policy))
+    politeness.track(HOST, HostLimits(max_concurrency=2, requests_per_second=4))
+    return scheduler, politeness
+
+
+def test_healthy_windows_raise_the_limits_up_to_the_ceiling():
+    scheduler, politeness = controller(max_factor=2)
+    for _ in range(40):
+        politeness.record_response(HOST, 200, 0.1)
+    assert scheduler.limits(HOST) == HostLimits(max_concurrency=4, requests_per_second=8)
+    assert politeness.info()[HOST]["increases"] == 2
+
+
+def test_overload_halves_the_limits_once_per_round_trip():
+    scheduler, politeness = controller()
+    for _ in range(8):
+        politeness.record_response(HOST, 200, 0.1)
+    assert scheduler.limits(HOST).max_concurrency == 4
+    politeness.record_response(HOST, 429, 0.1)
+    # Sent before the limits came down
+    politeness.record_response(HOST, 503, 10)
+    assert scheduler.limits(HOST) == HostLimits(max_concurrency=2, requests_per_second=4)
+
+
+def test_slow_window_brings_the_limits_down():
+    scheduler, politeness = controller()
+    for _ in range(4):
+        politeness.record_response(HOST, 200, 0.1)
+    for _ in range(4):
+        politeness.record_response(HOST, 200, 1)
+    assert scheduler.limits(HOST).max_concurrency == 1
+
+
+def test_learned_limits_carry_over_to_the_next_run(tmp_path):
+    path = str(tmp_path / "politeness.sqlite")
+    _, politeness = controller(path)
+    for _ in range(4):
+        politeness.record_response(HOST, 200, 0.1)
+    politeness.close()
+    scheduler, politeness = controller(path)
+    assert scheduler.limits(HOST).max_concurrency == 3
+    politeness.close()
+
+
+def test_captcha_slows_down_until_the_floor_has_been_held():
+    scheduler, politeness = controller(captcha_grace=0.05)
+    assert politeness.record_captcha(HOST)
+    assert scheduler.limits(HOST).max_concurrency == 1
+    # Requests already in flight
+    assert politeness.record_captcha(HOST)
+    asyncio.run(asyncio.sleep(0.06))
+    assert not politeness.record_captcha(HOST)
+    assert not politeness.record_captcha("untracked.example")
+
+
+def test_captcha_backs_the_board_off_instead_of_opening_its_circuit():
+    scheduler = RequestScheduler()
+    engine = IndeedEngine()
+    engine.circuit_breaker = CircuitBreaker(captcha_threshold=1)
+    engine.politeness = PolitenessController(scheduler, policy=AIMDPolicy(captcha_grace=0.05))
+    for host in engine.hosts():
+        engine.politeness.track(host, HostLimits(max_concurrency=4))
+    engine.record_captcha()
+    engine.record_captcha()
+    assert engine.circuit_breaker.state == "closed"
+    assert all(scheduler.limits(host).max_concurrency == 1 for host in engine.hosts())
+    asyncio.run(asyncio.sleep(0.06))
+    engine.record_captcha()
+    assert engine.circuit_breaker.state == "open"
+
+
+def test_captcha_opens_the_circuit_without_a_controller():
+    engine = IndeedEngine()
+    engine.circuit_breaker = CircuitBreaker(captcha_threshold=1)
+    engine.record_captcha()
+    assert engine.circuit_breaker.state == "open"
+
+
+def test_new_limits_keep_the_hosts_token_bucket():
+    scheduler, politeness = controller()
+    bucket = scheduler._hosts[HOST].bucket
+
+    async def spend():
+        await bucket.acquire()
+
+    asyncio.run(spend())
+    for _ in range(4):
+        politeness.record_response(HOST, 200, 0.1)
+    assert scheduler._hosts[HOST].bucket is bucket
+    assert bucket.rate == 6
+    # No fresh token came with the new limits
+    assert bucket._tokens == 0
+
+
+class _ErrorPageResponse:
+    status = 200
+    headers = {}
+
+    async def read(self):
+        return b"<h1>Internal server error</h1>"
+
+    async def text(self):
+        return "<h1>Internal server error</h1>"
+
+
+class _ErrorPageSession:
+    async def get(self, url):
+        return _ErrorPageResponse()
+
+
+def test_error_page_served_with_a_200_counts_once_as_an_error():
+    scheduler = RequestScheduler()
+    engine = IndeedEngine()
+    engine.client_session = _ErrorPageSession()
+    engine.scheduler = scheduler
+    engine.circuit_breaker = CircuitBreaker()
+    engine.timing = SearchTiming()
+    engine.politeness = PolitenessController(scheduler)
+    engine.retry_policy.attempts = 1
+    for host in engine.hosts():
+        engine.politeness.track(host, HostLimits(max_concurrency=4))
+
+    with pytest.raises(RequestFailedException):
+        asyncio.run(engine.process_job_listing("1"))
+    control = engine.politeness._hosts[host_of(engine.get_listing_uri("1"))]
+    assert (control.responses, control.errors) == (1, 1)
@@ -0,0 +1,114 @@
+import asyncio
+import csv
+import io
+import json
+import pickle
+
+import pandas as pd
+
+from job_engine import ColumnBuilder, Record
+from job_engine.export import stream_export
+
+from test_adzuna import _collect, _records, read_detail_page
+
+
+def _rows(df):
+    return [{key: None if pd.isna(value) else value for key, value in row.items()} for row in df.to_dict("records")]
+
+
+class _Listing(Record):
+    __slots__ = ()
+    columns = ('title', 'salary', 'url')
+
+
+def test_a_record_reads_like_a_dict():
+    record = _Listing(title='Developer', url='https://example.com/1')
+    record['source'] = 'mock'
+
+    assert record == {'title': 'Developer', 'url': 'https://example.com/1', 'source': 'mock'}
+    assert list(record) == ['title', 'url', 'source']
+    assert len(record) == 3
+    # A column never set reads as missing, not as None
+    assert 'salary' not in record
+    assert record.get('salary', 'n/a') == 'n/a'
+    assert record.get('other') is None
+
+    record['salary'] = None
+    assert 'salary' in record and record['salary'] is None
+    del record['salary'], record['source']
+    assert record.as_dict() == {'title': 'Developer', 'url': 'https://example.com/1'}
+
+
+def test_copies_and_pickles_are_independent():
+    record = _Listing(title='Developer')
+    record['source'] = 'mock'
+
+    copied = record.copy()
+    copied['title'] = 'Analyst'
+    copied['source'] = 'other'
+    unpickled = pickle.loads(pickle.dumps(record))
+
+    # Parsing on a process pool pickles every record, missing columns have to stay missing
+    assert record == unpickled == {'title': 'Developer', 'source': 'mock'}
+    assert type(unpickled) is _Listing
+    assert copied == {'title': 'Analyst', 'source': 'other'}
+
+
+def test_records_round_trip_through_the_columns():
+    records = [
+        _Listing(title='Developer', salary='$100,000', url='https://example.com/1'),
+        # No salary: its column is empty rather than shifting the others
+        _Listing(title='Analyst', url='https://example.com/2'),
+        {'title': 'Tester', 'salary': '$80,000', 'url': 'https://example.com/3'},
+    ]
+    builder = ColumnBuilder(_Listing.columns)
+    builder.extend(records)
+
+    df = builder.to_frame()
+
+    assert len(builder) == 3
+    assert list(df.columns) == list(_Listing.columns)
+    assert _rows(df) == [
+        {'title': 'Developer', 'salary': '$100,000', 'url': 'https://example.com/1'},
+        {'title': 'Analyst', 'salary': None, 'url': 'https://example.com/2'},
+        {'title': 'Tester', 'salary': '$80,000', 'url': 'https://example.com/3'},
+    ]
+
+
+def test_keys_outside_the_columns_are_dropped_as_the_exports_drop_them():
+    record = _Listing(title='Developer', url='https://example.com/1')
+    record['source'] = 'mock'
+    builder = ColumnBuilder(_Listing.columns)
+    builder.extend([record, {'title': 'Analyst', 'source': 'other'}])
+
+    df = builder.to_frame()
+
+    body = asyncio.run(_collect(stream_export(_records(record), list(_Listing.columns), {}, "csv")))
+    assert list(df.columns) == next(csv.reader(io.StringIO(body.decode())))
+    assert df['title'].tolist() == ['Developer', 'Analyst']
+
+
+def test_without_columns_every_key_gets_a_column():
+    builder = ColumnBuilder()
+    builder.extend([{'title': 'Developer'}, {'salary': '$80,000', 'title': 'Analyst'}, {}])
+
+    df = builder.to_frame()
+
+    assert list(df.columns) == ['title', 'salary']
+    assert _rows(df) == [
+        {'title': 'Developer', 'salary': None},
+        {'title': 'Analyst', 'salary': '$80,000'},
+        {'title': None, 'salary': None},
+    ]
+
+
+def test_adzuna_frames_have_the_columns_of_its_exports():
+    engine, record = read_detail_page()
+    builder = ColumnBuilder(engine.columns)
+    builder.append(record)
+
+    df = builder.to_frame()
+
+    assert list(df.columns) == engine.columns
+    assert json.loads(df.loc[0, 'Other details']) == {'Extra row': 'Something Adzuna added'}
+    assert pd.isna(df.loc[0, 'Hours'])
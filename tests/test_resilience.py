@@ -0,0 +1,142 @@
+import asyncio
+import re
+import time
+
+import pytest
+
+from job_engine import AdzunaEngine, CaptchaException, CircuitBreaker, CircuitOpenException, RequestScheduler, RetryPolicy, SearchTiming
+
+
+def half_open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    # As if the reset timeout had passed
+    breaker.opened_at = time.monotonic() - 61
+    assert breaker.state == "half_open"
+    return breaker
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenException):
+        breaker.check()
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = half_open_breaker()
+    assert breaker.check() is True
+    with pytest.raises(CircuitOpenException):
+        breaker.check()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.check() is False
+
+
+def test_failed_trial_reopens():
+    breaker = half_open_breaker()
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_retry_after_is_capped():
+    policy = RetryPolicy(max_delay=5)
+    assert policy.retry_after({"Retry-After": "2"}) == 2
+    assert policy.retry_after({"Retry-After": "120"}) == 5
+    assert policy.retry_after({}) is None
+
+
+class _HangingSession:
+    async def get(self, url):
+        await asyncio.sleep(60)
+
+
+class _BrokenSession:
+    async def get(self, url):
+        raise RuntimeError("not a network error")
+
+
+def _engine(session, breaker) -> AdzunaEngine:
+    engine = AdzunaEngine()
+    engine.client_session = session
+    engine.scheduler = RequestScheduler()
+    engine.timing = SearchTiming()
+    engine.circuit_breaker = breaker
+    return engine
+
+
+def test_cancelled_trial_frees_the_circuit():
+    async def run():
+        breaker = half_open_breaker()
+        engine = _engine(_HangingSession(), breaker)
+        fetch = asyncio.create_task(engine.fetch("https://www.adzuna.com.au/details/1"))
+        await asyncio.sleep(0.01)
+        fetch.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await fetch
+        return breaker
+
+    breaker = asyncio.run(run())
+    # The next request becomes the trial instead of the circuit refusing everything
+    assert breaker.check() is True
+
+
+def test_trial_that_breaks_unexpectedly_frees_the_circuit():
+    async def run():
+        breaker = half_open_breaker()
+        engine = _engine(_BrokenSession(), breaker)
+        with pytest.raises(RuntimeError):
+            await engine.fetch("https://www.adzuna.com.au/details/1")
+        return breaker
+
+    assert asyncio.run(run()).check() is True
+
+
+class _Response:
+    status = 200
+    headers = {}
+
+    def __init__(self, text):
+        self._text = text
+
+    async def read(self):
+        return self._text.encode()
+
+    async def text(self):
+        return self._text
+
+
+class _PageSession:
+    def __init__(self, *texts):
+        self.texts = list(texts)
+
+    async def get(self, url):
+        return _Response(self.texts.pop(0))
+
+
+def test_captchas_served_with_a_200_add_up_to_the_threshold():
+    async def run(*pages):
+        breaker = CircuitBreaker(captcha_threshold=2)
+        engine = _engine(_PageSession(*pages), breaker)
+        engine.captcha_pattern = re.compile("captcha")
+        for _ in pages:
+            _, text = await engine.fetch("https://www.adzuna.com.au/details/1")
+            try:
+                engine.check_raw_text(text)
+            except CaptchaException:
+                pass
+        return breaker
+
+    assert asyncio.run(run("captcha", "captcha")).state == "open"
+    # Only a page that isn't a captcha starts the count again
+    assert asyncio.run(run("captcha", "listing", "captcha")).state == "closed"
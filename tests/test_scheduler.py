@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from job_engine.scheduler import PRIORITY_DETAIL, PRIORITY_LISTING, HostLimits, RequestScheduler, TokenBucket
+
+
+def test_concurrency_is_capped_per_host():
+    async def run():
+        scheduler = RequestScheduler()
+        scheduler.configure("a", HostLimits(max_concurrency=2))
+        in_flight = peak = 0
+
+        async def request():
+            nonlocal in_flight, peak
+            async with scheduler.slot("http://a/"):
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+
+        await asyncio.gather(*(request() for _ in range(6)))
+        return peak, scheduler.stats()["a"]
+
+    peak, stats = asyncio.run(run())
+    assert peak == 2
+    assert stats["requests"] == 6
+    assert stats["in_flight"] == 0
+
+
+def test_listing_pages_overtake_queued_detail_pages():
+    async def run():
+        scheduler = RequestScheduler()
+        scheduler.configure("a", HostLimits(max_concurrency=1))
+        order = []
+
+        async def request(name, priority):
+            async with scheduler.slot("http://a/", priority):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        first = asyncio.create_task(request("first", PRIORITY_DETAIL))
+        await asyncio.sleep(0)
+        detail = asyncio.create_task(request("detail", PRIORITY_DETAIL))
+        await asyncio.sleep(0)
+        listing = asyncio.create_task(request("listing", PRIORITY_LISTING))
+        await asyncio.gather(first, detail, listing)
+        return order
+
+    assert asyncio.run(run()) == ["first", "listing", "detail"]
+
+
+def test_cancelled_waiter_gives_back_its_slot():
+    async def run():
+        scheduler = RequestScheduler()
+        scheduler.configure("a", HostLimits(max_concurrency=1))
+        await scheduler.acquire("a")
+        waiter = asyncio.create_task(scheduler.acquire("a"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        scheduler.release("a")
+        await asyncio.wait_for(scheduler.acquire("a"), 1)
+        return scheduler.stats()["a"]["in_flight"]
+
+    assert asyncio.run(run()) == 1
+
+
+def test_token_bucket_paces_requests():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=1)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(6):
+            await bucket.acquire()
+        return loop.time() - start
+
+    # The first token is there from the start, the other five take 1/50 s each
+    assert asyncio.run(run()) >= 5 / 50 * 0.9
@@ -0,0 +1,31 @@
+from job_engine import SeekEngine
+from job_engine.schema import LIST, parse_date, parse_salary, type_record
+from job_engine.seek import jobs_from_redux_data
+
+JOB = {
+    'id': '1', 'listingDate': '2021-12-14T03:00:00Z', 'title': 'Youth worker', 'teaser': 'Work with young people',
+    'bulletPoints': ['Flexible hours', 'Great team'], 'advertiser': {'description': 'Example Organisation'},
+    'location': 'Sydney', 'area': 'CBD', 'workType': 'Full Time', 'classification': {'description': 'Community'},
+    'subClassification': {'description': 'Youth'}, 'salary': '$80k - $90k + super',
+}
+
+
+def test_seek_bulletpoints_are_typed_as_the_text_they_hold():
+    engine = SeekEngine("youth worker")
+    record = jobs_from_redux_data({'results': {'results': {'jobs': [JOB]}}})['1']
+    typed = type_record(record, engine.columns, engine.column_types)
+    assert typed['bulletpoints'] == 'Flexible hours Great team'
+    assert str(typed['listingDate']) == '2021-12-14'
+    assert (typed['salary_min'], typed['salary_max']) == (80000, 90000)
+
+
+def test_list_columns_keep_their_items():
+    typed = type_record({'points': ['a', 'b'], 'empty': ''}, ['points', 'empty'], {'points': LIST, 'empty': LIST})
+    assert typed == {'points': ['a', 'b'], 'empty': []}
+
+
+def test_parse_date_and_salary():
+    assert str(parse_date('14th December 2021')) == '2021-12-14'
+    assert parse_date('soon') is None
+    assert parse_salary('$85,000 - $95,000 per annum') == (85000, 95000, 'year')
+    assert parse_salary('Up to $40 per hour') == (None, 40, 'hour')
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from job_engine import SeekEngine
+from job_engine.parsing import parse_document
+from job_engine.seek import read_redux_data
+
+DETAIL_PAGE = """<html><body>
+<div data-automation="jobAdDetails"><p>Read off the page.</p></div>
+<script>
+      window.SEEK_REDUX_DATA = %s;
+</script>
+</body></html>"""
+
+
+def _page(payload):
+    return f"<script>\nwindow.SEEK_REDUX_DATA = {payload}"
+
+
+def test_undefined_values_become_null():
+    data = read_redux_data(_page('{"a": undefined, "b": [1, undefined], "c": {"d":undefined}};\n</script>'))
+    assert data == {"a": None, "b": [1, None], "c": {"d": None}}
+
+
+def test_undefined_is_left_alone_inside_strings():
+    data = read_redux_data(_page('{"undefined": "left undefined", "x": undefined, "y": "undefined"};\n'))
+    assert data == {"undefined": "left undefined", "x": None, "y": "undefined"}
+
+
+def test_escaped_quotes_dont_end_a_string():
+    payload = json.dumps({"title": 'He said "undefined" \\', "teaser": "a \\\"b\\\" undefined"})
+    data = read_redux_data(_page(payload[:-1] + ', "salary": undefined}'))
+    assert data == {"title": 'He said "undefined" \\', "teaser": "a \\\"b\\\" undefined", "salary": None}
+
+
+def test_a_page_without_the_payload_has_no_data():
+    assert read_redux_data("<html><script>window.SEEK_APP_CONFIG = {};</script></html>") is None
+
+
+@pytest.mark.parametrize("ending", ["", ";", ";  ", ";</script></body></html>", "</script>"])
+def test_a_payload_without_a_newline_after_it(ending):
+    assert read_redux_data(_page('{"a": undefined, "b": "c"}' + ending)) == {"a": None, "b": "c"}
+
+
+def _read_job_listing(payload):
+    engine = SeekEngine("python")
+    return parse_document(engine.read_job_listing, DETAIL_PAGE % payload, engine.parser_backend, 200, "123")
+
+
+def test_job_listings_are_read_from_the_payload():
+    record = _read_job_listing(json.dumps({"jobdetails": {"result": {"content": "<p>From the payload.</p>"}}}))
+    assert record == {"description": "From the payload.", "url": "https://www.seek.com.au/job/123"}
+
+
+@pytest.mark.parametrize("payload", [
+    '{"jobdetails": {"result": {"content": undefined}}}',
+    '{"jobdetails": {"result": undefined}}',
+    '{"other": {}}',
+])
+def test_job_listings_without_content_are_read_off_the_page(payload):
+    record = _read_job_listing(payload)
+    assert record == {"description": "Read off the page.", "url": "https://www.seek.com.au/job/123"}
+
+
+def test_job_listings_without_a_payload_are_read_off_the_page():
+    engine = SeekEngine("python")
+    text = DETAIL_PAGE.replace("window.SEEK_REDUX_DATA = %s;", "")
+    record = parse_document(engine.read_job_listing, text, engine.parser_backend, 200, "123")
+    assert record["description"] == "Read off the page."
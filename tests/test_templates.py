@@ -0,0 +1,104 @@
+import asyncio
+import json
+import re
+from urllib.parse import parse_qs, urlsplit
+
+from job_engine import SeekEngine
+from job_engine.engine import _templates
+
+JOBS_PER_TERM = 30
+CODES = {"python": range(1000, 1000 + JOBS_PER_TERM), "java": range(2000, 2000 + JOBS_PER_TERM)}
+
+
+class _Response:
+    status = 200
+    headers = {}
+
+    def __init__(self, text):
+        self._text = text
+
+    async def read(self):
+        return self._text.encode()
+
+    async def text(self):
+        return self._text
+
+
+def _job(code, term):
+    return {"id": str(code), "listingDate": "2026-10-01T00:00:00Z", "title": f"{term} developer", "teaser": "",
+            "bulletPoints": [], "advertiser": {"description": "Example"}, "location": "Sydney", "area": None,
+            "workType": "Full time", "classification": {"description": "IT"},
+            "subClassification": {"description": "Developers"}, "salary": ""}
+
+
+class _SeekSession:
+    """Serves a search results page per search term, and the job pages
+    of its listings, yielding to the loop on every request so two
+    searches interleave. On every request it notes any listing of
+    another search held by its engine.
+    """
+    def __init__(self, engine):
+        self.engine = engine
+        self.urls = []
+        self.foreign_listings = set()
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+    async def get(self, url):
+        self.urls.append(url)
+        codes = CODES[self.engine.search_term]
+        self.foreign_listings.update(code for code in self.engine.listing_data if int(code) not in codes)
+        await asyncio.sleep(0)
+        parts = urlsplit(url)
+        if (job := re.search(r"/job/(\d+)", parts.path)) is not None:
+            code = int(job.group(1))
+            term = next(term for term, codes in CODES.items() if code in codes)
+            data = {"jobdetails": {"result": {"content": f"<p>{term} {code}</p>"}}}
+        else:
+            term = parts.path.strip("/").removesuffix("-jobs")
+            page = int(parse_qs(parts.query).get("page", ["1"])[0])
+            codes = CODES[term][(page - 1) * 22:page * 22]
+            data = {"results": {"results": {"jobs": [_job(code, term) for code in codes]}, "totalCount": JOBS_PER_TERM}}
+        return _Response(f"<script>\nwindow.SEEK_REDUX_DATA = {json.dumps(data)};\n</script>")
+
+
+async def _search(engine):
+    async with engine:
+        number_pages = await engine.get_number_of_pages()
+        return [record async for record in engine.iter_data(number_pages)]
+
+
+async def _search_together(*engines):
+    return await asyncio.gather(*[_search(engine) for engine in engines])
+
+
+def test_concurrent_clones_keep_their_searches_apart():
+    python = SeekEngine.from_template(search_term="python")
+    java = SeekEngine.from_template(search_term="java")
+    for engine in (python, java):
+        engine.client_session = _SeekSession(engine)
+        engine.requests_per_second = None
+
+    python_records, java_records = asyncio.run(_search_together(python, java))
+
+    for engine, records, term in ((python, python_records, "python"), (java, java_records, "java")):
+        assert sorted(int(record["url"].rsplit("/", 1)[1]) for record in records) == list(CODES[term])
+        assert all(record["title"] == f"{term} developer" and record["description"] == f"{term} {record['url'].rsplit('/', 1)[1]}"
+                   for record in records)
+        assert engine.progress.listings_done == JOBS_PER_TERM
+        assert all(f"/{term}-jobs?" in url or "/job/" in url for url in engine.client_session.urls)
+        # Every listing's search data was taken up by its own search
+        assert engine.listing_data == {}
+        assert engine.client_session.foreign_listings == set()
+        assert engine.client_session.closed
+
+    assert python.progress is not java.progress
+    assert python.listing_index is not java.listing_index
+    assert python.scheduler is not java.scheduler and python.timing is not java.timing
+    assert python.query_contents is not java.query_contents
+
+    template = _templates[SeekEngine]
+    assert template.listing_data == {} and template.progress is None and template.client_session is None
+    assert template.query_contents == {"page": 1}
@@ -0,0 +1,146 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from job_engine.work_queue import DETAIL_TASK, LISTING_TASK, RedisWorkQueue, SQLiteWorkQueue, WorkQueue
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def work_queue(request, tmp_path):
+    if request.param == "sqlite":
+        queue = SQLiteWorkQueue(str(tmp_path / "work_queue.sqlite"), lease_seconds=0.2, max_attempts=2, retry_delay=0)
+    else:
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        queue = RedisWorkQueue("redis://fake", client=fakeredis.FakeRedis(), lease_seconds=0.2, max_attempts=2, retry_delay=0)
+    yield queue
+    queue.close()
+
+
+def test_put_is_idempotent_and_listing_pages_go_first(work_queue):
+    work_queue.put("search", "detail-1", DETAIL_TASK, {"n": 1})
+    work_queue.put("search", "detail-1", DETAIL_TASK, {"n": 2})
+    work_queue.put("search", "listing-1", LISTING_TASK, {"n": 3})
+    first, second = work_queue.lease(), work_queue.lease()
+    assert (first.kind, second.kind) == (LISTING_TASK, DETAIL_TASK)
+    assert second.payload == {"n": 1}
+    assert work_queue.lease() is None
+
+
+def test_only_the_first_completion_counts(work_queue):
+    work_queue.put("search", "task", DETAIL_TASK, {})
+    task = work_queue.lease()
+    work_queue.complete(task, {"record": 1})
+    work_queue.complete(task, {"record": 2})
+    assert [result.result for result in work_queue.results("search")] == [{"record": 1}]
+
+
+def test_expired_lease_goes_to_another_worker_until_attempts_run_out(work_queue):
+    work_queue.put("search", "task", DETAIL_TASK, {})
+    stale = work_queue.lease()
+    time.sleep(0.25)
+    retried = work_queue.lease()
+    assert (retried.id, retried.attempts) == ("task", 2)
+    # The worker whose lease ran out has no say any more
+    work_queue.fail(stale, RuntimeError("late"))
+    assert not work_queue.extend(stale)
+    time.sleep(0.25)
+    assert work_queue.lease() is None
+    [result] = work_queue.results("search")
+    assert result.failed and result.error_type == "LeaseExpired"
+
+
+def test_failed_task_is_retried_then_reported(work_queue):
+    work_queue.put("search", "task", DETAIL_TASK, {})
+    work_queue.fail(work_queue.lease(), RuntimeError("once"))
+    work_queue.fail(work_queue.lease(), ValueError("twice"))
+    [result] = work_queue.results("search")
+    assert (result.error_type, result.error) == ("ValueError", "twice")
+
+
+def test_results_are_read_after_the_last_seq(work_queue):
+    for n in range(3):
+        work_queue.put("search", f"task-{n}", DETAIL_TASK, {})
+    work_queue.complete(work_queue.lease(), {"n": 0})
+    first = work_queue.results("search")
+    work_queue.complete(work_queue.lease(), {"n": 1})
+    work_queue.complete(work_queue.lease(), {"n": 2})
+    later = work_queue.results("search", first[-1].seq)
+    assert [result.result["n"] for result in first + later] == [0, 1, 2]
+    assert work_queue.results("search", later[-1].seq) == []
+    # Reading again from the start still works
+    assert len(work_queue.results("search")) == 3
+
+
+def test_purge_keeps_searches_still_running_or_collected(work_queue):
+    work_queue.put("running", "running-task", DETAIL_TASK, {})
+    work_queue.put("collected", "collected-task", DETAIL_TASK, {})
+    work_queue.put("abandoned", "abandoned-task", DETAIL_TASK, {})
+    for _ in range(3):
+        task = work_queue.lease()
+        if task.search_id != "running":
+            work_queue.complete(task, {})
+    time.sleep(0.1)
+    work_queue.results("collected")
+    work_queue.purge(0.05)
+    assert len(work_queue.results("collected")) == 1
+    assert work_queue.results("abandoned") == []
+    work_queue.purge(0)
+    assert work_queue.results("collected") == []
+    assert work_queue.stats()["leased"] == 1
+
+
+def test_redis_poll_reads_only_the_new_results():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    client = fakeredis.FakeRedis()
+    work_queue = RedisWorkQueue("redis://fake", client=client)
+    ranges = []
+    lrange = client.lrange
+    client.lrange = lambda key, start, end: ranges.append(start) or lrange(key, start, end)
+    for n in range(3):
+        work_queue.put("search", f"task-{n}", DETAIL_TASK, {})
+    seq = 0
+    for _ in range(3):
+        work_queue.complete(work_queue.lease(), {})
+        seq = work_queue.results("search", seq)[-1].seq
+    assert ranges == [0, 1, 2]
+
+
+def test_both_queues_report_the_same_stats(work_queue):
+    for n in range(3):
+        work_queue.put("search", f"task-{n}", DETAIL_TASK, {})
+    work_queue.complete(work_queue.lease(), {})
+    work_queue.fail(work_queue.lease(), ValueError("gone"), retry=False)
+    assert work_queue.stats() == {"queued": 1, "leased": 0, "done": 1, "failed": 1, "results": 2}
+    work_queue.cancel("search")
+    assert work_queue.stats() == {"queued": 0, "leased": 0, "done": 0, "failed": 0, "results": 0}
+
+
+def test_work_queue_is_abstract():
+    class Incomplete(WorkQueue):
+        def put(self, search_id, task_id, kind, payload):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_sqlite_queue_can_be_shared_by_threads(tmp_path):
+    work_queue = SQLiteWorkQueue(str(tmp_path / "work_queue.sqlite"))
+
+    def worker(n):
+        for i in range(25):
+            work_queue.put("search", f"task-{n}-{i}", DETAIL_TASK, {})
+            task = work_queue.lease()
+            if task is not None:
+                work_queue.complete(task, {})
+            work_queue.results("search")
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(worker, range(8)))
+    while (task := work_queue.lease()) is not None:
+        work_queue.complete(task, {})
+    assert len(work_queue.results("search")) == 200
+    work_queue.close()